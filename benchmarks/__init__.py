@@ -0,0 +1,14 @@
+"""Per-update micro-benchmarks for the feature pipeline.
+
+Run from the repository root::
+
+    python -m benchmarks                  # measure and print
+    python -m benchmarks --save           # ... and store as the baseline
+    python -m benchmarks --check          # ... and fail on a regression
+
+See :mod:`benchmarks.suite`.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,267 @@
+"""Throughput, per-update latency and peak memory of the feature pipeline.
+
+Each component is fed ticks from :class:`~trading.synthetic.SyntheticMarket`
+and timed call by call, so generating the input is not counted. A second
+pass under :mod:`tracemalloc` records the peak memory allocated while
+building the component and running it; that pass draws the input in small
+chunks so the generator's buffers barely register. For the decoders a
+tick is one raw websocket frame, parsed by the same JSON library in both.
+
+Results can be saved as a baseline (``baseline.json`` next to this file)
+and later runs checked against it: a component regresses when its
+throughput drops, or its p99 latency or peak memory grows, by more than
+``--tolerance``. Baselines are only comparable on the machine that wrote
+them.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from trading.synthetic import SyntheticMarket
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TICKS = 20_000
+SYMBOLS = 8
+TOLERANCE = 0.3
+# generator chunk for the memory pass
+_MEMORY_CHUNK = 256
+
+
+class Bench(NamedTuple):
+    update: Callable[[Any], Any]
+    inputs: Iterator[Any]
+    close: Callable[[], None]
+
+
+def _nothing() -> None:
+    pass
+
+
+def _features(market: SyntheticMarket, n: int) -> Bench:
+    from trading.features import FeatureFabric
+
+    fabrics = {symbol: FeatureFabric() for symbol in market.symbols}
+    return Bench(lambda tick: fabrics[tick["symbol"]].update(tick), market.ticks(n), _nothing)
+
+
+def _derived_metrics(market: SyntheticMarket, n: int) -> Bench:
+    from trading.derived_metrics import DerivedMetrics
+
+    root = tempfile.mkdtemp(prefix="bench-metrics-")
+    metrics = DerivedMetrics(store_path=root)
+
+    def close() -> None:
+        metrics.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return Bench(lambda event: metrics.update(*event), market.events(n), close)
+
+
+def _legacy_fabric(market: SyntheticMarket, n: int) -> Bench:
+    from feature_fabric import FeatureFabric
+
+    return Bench(FeatureFabric().update, market.messages(n), _nothing)
+
+
+def _frames(market: SyntheticMarket, n: int) -> Iterator[str]:
+    for message in market.messages(n):
+        yield json.dumps({"type": "message", **message})
+
+
+def _topic_decoder(market: SyntheticMarket, n: int) -> Bench:
+    from trading.decoders import TopicDecoder
+
+    return Bench(TopicDecoder().decode, _frames(market, n), _nothing)
+
+
+def _json_decode(market: SyntheticMarket, n: int) -> Bench:
+    from trading.decoders import loads
+
+    # the parser TopicDecoder uses, so the two differ only by routing and records
+    return Bench(loads, _frames(market, n), _nothing)
+
+
+def _unified_index(market: SyntheticMarket, n: int) -> Bench:
+    from kucoin_stream import UnifiedIndex
+
+    index = UnifiedIndex()
+    return Bench(lambda tick: index.add(tick["ts"]), market.ticks(n), _nothing)
+
+
+def _bars(market: SyntheticMarket, n: int) -> Bench:
+    from trading.bars import BarAggregator
+
+    add = BarAggregator().add
+    return Bench(lambda t: add(t["symbol"], t["ts"], t["price"], t["size"], t["side"]), market.ticks(n), _nothing)
+
+
+# name -> factory building the component and its input stream
+COMPONENTS: Dict[str, Callable[[SyntheticMarket, int], Bench]] = {
+    "features": _features,
+    "bars": _bars,
+    "derived_metrics": _derived_metrics,
+    "legacy_fabric": _legacy_fabric,
+    "unified_index": _unified_index,
+    "topic_decoder": _topic_decoder,
+    "json_decode": _json_decode,
+}
+
+
+class Result(NamedTuple):
+    ticks: int
+    ticks_per_s: float
+    p50_us: float
+    p99_us: float
+    peak_mb: Optional[float]
+
+
+def _latencies(bench: Bench, n: int) -> np.ndarray:
+    out = np.empty(n, dtype=np.int64)
+    clock = time.perf_counter_ns
+    update = bench.update
+    count = 0
+    try:
+        for item in bench.inputs:
+            start = clock()
+            update(item)
+            out[count] = clock() - start
+            count += 1
+    finally:
+        bench.close()
+    return out[:count]
+
+
+def _peak_bytes(factory: Callable[[SyntheticMarket, int], Bench], market: SyntheticMarket, n: int) -> int:
+    tracemalloc.start()
+    try:
+        bench = factory(market, n)
+        try:
+            for item in bench.inputs:
+                bench.update(item)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            bench.close()
+    finally:
+        tracemalloc.stop()
+
+
+def measure(name: str, ticks: int = TICKS, symbols: int = SYMBOLS, seed: int = 0, memory: bool = True) -> Result:
+    factory = COMPONENTS[name]
+    latency = _latencies(factory(SyntheticMarket(symbols, seed), ticks), ticks)
+    peak = None
+    if memory:
+        peak = _peak_bytes(factory, SyntheticMarket(symbols, seed, chunk=_MEMORY_CHUNK), ticks) / 2**20
+    p50, p99 = np.percentile(latency, [50, 99]) / 1e3
+    return Result(len(latency), len(latency) / (latency.sum() / 1e9), float(p50), float(p99), peak)
+
+
+def run(
+    names: Iterable[str],
+    ticks: int = TICKS,
+    symbols: int = SYMBOLS,
+    seed: int = 0,
+    memory: bool = True,
+) -> Dict[str, Result]:
+    """Measure ``names``; a component that cannot be built here is left out with a warning."""
+    results = {}
+    for name in names:
+        try:
+            results[name] = measure(name, ticks, symbols, seed, memory)
+        except Exception as exc:
+            print(f"skipping {name}: {type(exc).__name__}: {exc}".splitlines()[0], file=sys.stderr)
+    return results
+
+
+def regressions(results: Dict[str, Result], baseline: Dict[str, Dict[str, float]], tolerance: float = TOLERANCE) -> List[str]:
+    """Human-readable descriptions of every metric worse than ``baseline`` by more than ``tolerance``."""
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result.ticks_per_s < base["ticks_per_s"] * (1 - tolerance):
+            found.append(f"{name}: {result.ticks_per_s:,.0f} ticks/s, baseline {base['ticks_per_s']:,.0f}")
+        if result.p99_us > base["p99_us"] * (1 + tolerance):
+            found.append(f"{name}: p99 {result.p99_us:.1f} us, baseline {base['p99_us']:.1f}")
+        if result.peak_mb is not None and base.get("peak_mb") is not None:
+            if result.peak_mb > base["peak_mb"] * (1 + tolerance):
+                found.append(f"{name}: peak {result.peak_mb:.1f} MB, baseline {base['peak_mb']:.1f}")
+    return found
+
+
+def _machine() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(path: str, results: Dict[str, Result], ticks: int, symbols: int, seed: int) -> None:
+    data = {
+        "ticks": ticks,
+        "symbols": symbols,
+        "seed": seed,
+        "machine": _machine(),
+        "results": {name: result._asdict() for name, result in results.items()},
+    }
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=2)
+        fh.write("\n")
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def report(results: Dict[str, Result]) -> str:
+    lines = [f"{'component':<18}{'ticks':>10}{'ticks/s':>12}{'p50 us':>10}{'p99 us':>10}{'peak MB':>10}"]
+    for name, r in results.items():
+        peak = "-" if r.peak_mb is None else f"{r.peak_mb:.1f}"
+        lines.append(f"{name:<18}{r.ticks:>10,}{r.ticks_per_s:>12,.0f}{r.p50_us:>10.1f}{r.p99_us:>10.1f}{peak:>10}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("components", nargs="*", help=f"any of {', '.join(COMPONENTS)} (default: all)")
+    parser.add_argument("--ticks", type=int, help=f"ticks per component (default {TICKS:,}, or the baseline's)")
+    parser.add_argument("--symbols", type=int, help=f"symbols in the synthetic market (default {SYMBOLS})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if anything regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+    unknown = set(args.components) - set(COMPONENTS)
+    if unknown:
+        parser.error(f"unknown components: {', '.join(sorted(unknown))}")
+
+    baseline = load(args.baseline) if args.check else {}
+    ticks = args.ticks or baseline.get("ticks", TICKS)
+    symbols = args.symbols or baseline.get("symbols", SYMBOLS)
+    names = args.components or list(COMPONENTS)
+    results = run(names, ticks, symbols, args.seed, not args.no_memory)
+    print(report(results))
+    if args.save:
+        save(args.baseline, results, ticks, symbols, args.seed)
+    if args.check:
+        if (ticks, symbols) != (baseline["ticks"], baseline["symbols"]):
+            print("warning: baseline was measured at a different scale", file=sys.stderr)
+        found = regressions(results, baseline["results"], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
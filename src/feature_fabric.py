@@ -1,32 +1,145 @@
+import asyncio
+import hashlib
 import logging
-from collections import deque
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, Optional
 
 import numpy as np
-import pandas as pd
-from nltk.sentiment import SentimentIntensityAnalyzer
+
+from trading.orderbook import OrderBook
+from trading.rolling import EwmMoments, RollingMoments
 
 LOGGER = logging.getLogger(__name__)
 
+VADER_LEXICON = "sentiment/vader_lexicon.zip"
+_ANALYZERS: Dict[Optional[str], Any] = {}
+_ANALYZER_LOCK = threading.Lock()
 
-class FeatureFabric:
-    """Compute derived market features."""
+# funding-rate horizons in updates, at one update a minute
+FUNDING_HORIZONS: Dict[str, int] = {"1h": 60, "8h": 480, "24h": 1440, "7d": 10080}
+
+
+def load_analyzer(lexicon_dir: Optional[str] = None, download: bool = True):
+    """Shared VADER analyzer, built once per process and ``lexicon_dir``.
 
-    def __init__(self, window: int = 1440):
-        self.funding_rates = deque(maxlen=window)
-        try:
+    The lexicon is looked up in ``lexicon_dir`` and then nltk's usual data
+    path, and only downloaded (into ``lexicon_dir``) when none of them has
+    it.
+    """
+    with _ANALYZER_LOCK:
+        analyzer = _ANALYZERS.get(lexicon_dir)
+        if analyzer is None:
             import nltk
-            nltk.download("vader_lexicon", quiet=True)
-        except Exception as exc:  # pragma: no cover - network issues
-            LOGGER.warning("NLTK download failed: %s", exc)
-        self.sentiment = SentimentIntensityAnalyzer()
+            from nltk.sentiment import SentimentIntensityAnalyzer
+
+            if lexicon_dir is not None and lexicon_dir not in nltk.data.path:
+                nltk.data.path.insert(0, lexicon_dir)
+            try:
+                nltk.data.find(VADER_LEXICON)
+            except LookupError:
+                if not download:
+                    raise
+                nltk.download("vader_lexicon", download_dir=lexicon_dir, quiet=True)
+            analyzer = _ANALYZERS[lexicon_dir] = SentimentIntensityAnalyzer()
+        return analyzer
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def _zscore(x: float, mean: float, var: float) -> float:
+    if var != var:
+        return 0.0
+    return (x - mean) / (np.sqrt(var) + 1e-8)
+
+
+class FeatureFabric:
+    """Compute derived market features.
+
+    Every funding update refreshes the rate's z-score over the last
+    ``window`` updates and, for each of ``funding_horizons`` (name ->
+    updates), its rolling z-score and exponentially weighted mean and
+    volatility. All of them cost O(1) per update.
+
+    Level2 messages are either whole books or KuCoin ``change`` deltas.
+    Deltas are applied to a local :class:`~trading.orderbook.OrderBook`
+    with ``book_tick`` price steps, seeded by whole books that carry a
+    ``sequence``; the depth-weighted mid then uses its best ``book_depth``
+    levels, and is left out while the book is out of sync.
+
+    The sentiment analyzer is loaded on the first text (see
+    :func:`load_analyzer`). Compound scores of the last ``sentiment_cache``
+    distinct texts are kept by hash, so repeated headlines and reposts are
+    scored once. The ``*_async`` methods score in a worker thread.
+    """
+
+    def __init__(
+        self,
+        window: int = 1440,
+        funding_horizons: Optional[Mapping[str, int]] = None,
+        lexicon_dir: Optional[str] = None,
+        sentiment_cache: int = 4096,
+        analyzer: Any = None,
+        book_tick: float = 0.01,
+        book_depth: int = 20,
+    ):
+        self.window = window
+        self.funding_horizons = dict(FUNDING_HORIZONS if funding_horizons is None else funding_horizons)
+        # horizons of the same length share one window
+        lengths = {window, *self.funding_horizons.values()}
+        self._funding_moments = {n: RollingMoments(n, min_periods=1) for n in sorted(lengths)}
+        self._funding_ewm = {name: EwmMoments(n) for name, n in self.funding_horizons.items()}
+        self.lexicon_dir = lexicon_dir
+        self.sentiment_cache = sentiment_cache
+        self._analyzer = analyzer
+        self._scores: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.book_tick = book_tick
+        self.book_depth = book_depth
+        self.book: Optional[OrderBook] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __getstate__(self) -> Dict:
+        # the analyzer is shared per process and the worker thread per fabric
+        state = dict(self.__dict__)
+        for key in ("_analyzer", "_lock", "_executor"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._analyzer = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def sentiment(self):
+        if self._analyzer is None:
+            self._analyzer = load_analyzer(self.lexicon_dir)
+        return self._analyzer
+
+    def funding_features(self, rate: float) -> Dict[str, float]:
+        """Fold ``rate`` into the funding statistics and return them all."""
+        moments = {}
+        for n, acc in self._funding_moments.items():
+            moments[n] = acc.peek(rate)
+            acc.push(rate)
+        m = moments[self.window]
+        features = {"funding_rate_zscore": _zscore(rate, m.mean, m.var)}
+        for name, n in self.funding_horizons.items():
+            m = moments[n]
+            ewm = self._funding_ewm[name]
+            ewm.push(rate)
+            features[f"funding_zscore_{name}"] = _zscore(rate, m.mean, m.var)
+            features[f"funding_ewm_{name}"] = ewm.mean
+            features[f"funding_ewm_vol_{name}"] = float(np.sqrt(ewm.var))
+        return features
 
     def funding_rate_zscore(self, rate: float) -> float:
-        self.funding_rates.append(rate)
-        series = pd.Series(self.funding_rates)
-        if len(series) < 2:
-            return 0.0
-        return (series.iloc[-1] - series.mean()) / (series.std() + 1e-8)
+        return self.funding_features(rate)["funding_rate_zscore"]
 
     @staticmethod
     def depth_weighted_mid_price(
@@ -38,25 +151,89 @@ class FeatureFabric:
         wa = np.average(ask_prices, weights=ask_sizes)
         return (wb + wa) / 2
 
+    def _book(self) -> OrderBook:
+        if self.book is None:
+            self.book = OrderBook(self.book_tick)
+        return self.book
+
+    def sentiment_scores(self, texts: Iterable[str]) -> List[float]:
+        """Compound score of every text, scoring each distinct uncached text once."""
+        keys = []
+        missing: Dict[bytes, str] = {}
+        scores: Dict[bytes, float] = {}
+        with self._lock:
+            for text in texts:
+                key = _digest(text)
+                keys.append(key)
+                if key in scores or key in missing:
+                    continue
+                score = self._scores.get(key)
+                if score is None:
+                    missing[key] = text
+                else:
+                    self._scores.move_to_end(key)
+                    scores[key] = score
+        if missing:
+            analyzer = self.sentiment
+            fresh = {key: analyzer.polarity_scores(text)["compound"] for key, text in missing.items()}
+            scores.update(fresh)
+            with self._lock:
+                self._scores.update(fresh)
+                while len(self._scores) > self.sentiment_cache:
+                    self._scores.popitem(last=False)
+        return [scores[key] for key in keys]
+
     def sentiment_score(self, texts: List[str]) -> float:
-        scores = [self.sentiment.polarity_scores(t)["compound"] for t in texts]
+        scores = self.sentiment_scores(texts)
         if not scores:
             return 0.0
         return float(np.mean(scores))
 
+    async def sentiment_score_async(self, texts: List[str]) -> float:
+        """:meth:`sentiment_score` in this fabric's worker thread."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.sentiment_score, list(texts))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
     def update(self, data: Dict) -> Dict:
         """Update fabric with a new data point and return features."""
         features = {}
         if data.get("topic", "").startswith("/contractMarket/fundingRate"):
             rate = float(data["data"]["fundingRate"])
-            features["funding_rate_zscore"] = self.funding_rate_zscore(rate)
+            features.update(self.funding_features(rate))
         if data.get("topic", "").startswith("/contractMarket/level2"):
             depth = data["data"]
-            features["depth_weighted_mid"] = self.depth_weighted_mid_price(
-                depth["bids"], depth["asks"]
-            )
+            change = depth.get("change")
+            if change is None:
+                if "sequence" in depth:
+                    self._book().load_snapshot(int(depth["sequence"]), depth["bids"], depth["asks"])
+                features["depth_weighted_mid"] = self.depth_weighted_mid_price(
+                    depth["bids"], depth["asks"]
+                )
+            else:
+                price, side, size = change.split(",")
+                book = self._book()
+                if book.apply(int(depth["sequence"]), float(price), side, float(size)):
+                    levels = book.levels(self.book_depth)
+                    if len(levels["bids"]) and len(levels["asks"]):
+                        features["depth_weighted_mid"] = self.depth_weighted_mid_price(
+                            levels["bids"], levels["asks"]
+                        )
         if data.get("sentiment_texts"):
             features["sentiment_score"] = self.sentiment_score(
                 data["sentiment_texts"]
             )
         return features
+
+    async def update_async(self, data: Dict) -> Dict:
+        """:meth:`update` with sentiment scored off the event loop."""
+        texts = data.get("sentiment_texts")
+        features = self.update({**data, "sentiment_texts": None})
+        if texts:
+            features["sentiment_score"] = await self.sentiment_score_async(texts)
+        return features
@@ -1,54 +1,155 @@
 import asyncio
 import json
 import logging
-import time
-from collections import deque
-from typing import AsyncIterator, Dict, List
+from typing import AsyncIterator, Dict, Iterable, List, Optional
 
 import aiohttp
+import numpy as np
 import pandas as pd
-import websockets
+
+from trading.bars import RESOLUTIONS, BarAggregator
+from trading.connection import ConnectionManager
+from trading.decoders import Candle, TopicDecoder, Trade
+from trading.recorder import TickRecorder
 
 LOGGER = logging.getLogger(__name__)
 
 
 class UnifiedIndex:
-    """Maintain a unified event-time index with gap handling."""
-
-    def __init__(self) -> None:
-        self.index = deque()
-        self.last_ts: pd.Timestamp | None = None
+    """Maintain a unified event-time index with gap handling.
+
+    Every added timestamp gets a slot, and the whole seconds missing since
+    the previous one are filled in, or a NaT marker is inserted when that
+    gap exceeds 60 seconds. Slots are epoch-ns int64 in a ring of
+    ``capacity``, written twice like :class:`trading.columnar.RingTable` so
+    the live window is always one contiguous view. Views share storage:
+    they are overwritten once ``capacity`` newer slots have been added.
+    """
+
+    GAP_NS = 60 * 10**9
+    NAT = np.iinfo(np.int64).min
+
+    def __init__(self, capacity: int = 86_400) -> None:
+        if capacity < 60:
+            raise ValueError("capacity must hold a whole 60s gap")
+        self.capacity = capacity
+        self._values = np.empty(2 * capacity, dtype=np.int64)
+        # running maximum of the values, sorted even with markers and late ticks
+        self._keys = np.empty(2 * capacity, dtype=np.int64)
+        self._head = 0
+        self._size = 0
+        self._last: Optional[int] = None
+        self._key = self.NAT
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _span(self) -> slice:
+        stop = self._head + self.capacity
+        return slice(stop - self._size, stop)
+
+    def _append(self, value: int) -> None:
+        pos = self._head
+        cap = self.capacity
+        self._values[pos] = self._values[pos + cap] = value
+        self._keys[pos] = self._keys[pos + cap] = self._key
+        self._head = (pos + 1) % cap
+        self._size = min(self._size + 1, cap)
+
+    def _fill(self, first: int, n: int) -> None:
+        values = first + 10**9 * np.arange(n, dtype=np.int64)
+        keys = np.maximum(values, self._key)
+        self._key = int(keys[-1])
+        pos = (self._head + np.arange(n)) % self.capacity
+        self._values[pos] = self._values[pos + self.capacity] = values
+        self._keys[pos] = self._keys[pos + self.capacity] = keys
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    @staticmethod
+    def _ns(ts: float) -> int:
+        if isinstance(ts, (int, np.integer)):
+            return int(ts) * 1_000_000
+        return int(round(ts * 1e6))
+
+    def push(self, ts: float) -> int:
+        """Add ``ts`` (epoch ms) and return it in epoch ns, allocation-free."""
+        ns = self._ns(ts)
+        last = self._last
+        if last is not None:
+            delta = ns - last
+            if delta > self.GAP_NS:
+                self._append(self.NAT)
+            elif delta >= 2 * 10**9:
+                self._fill(last + 10**9, delta // 10**9 - 1)
+        if ns > self._key:
+            self._key = ns
+        self._append(ns)
+        self._last = ns
+        return ns
 
     def add(self, ts: float) -> pd.Timestamp:
-        timestamp = pd.to_datetime(ts, unit="ms")
-        if self.last_ts is None:
-            self.index.append(timestamp)
-            self.last_ts = timestamp
-            return timestamp
-
-        delta = (timestamp - self.last_ts).total_seconds()
-        if delta > 60:
-            self.index.append(pd.NaT)
-            self.index.append(timestamp)
-        else:
-            start = self.last_ts + pd.Timedelta(seconds=1)
-            missing = pd.date_range(start, timestamp, freq="s")
-            for t in missing[:-1]:
-                self.index.append(t)
-            self.index.append(timestamp)
-        self.last_ts = timestamp
-        return timestamp
+        return pd.Timestamp(self.push(ts))
+
+    @property
+    def last_ts(self) -> Optional[pd.Timestamp]:
+        return None if self._last is None else pd.Timestamp(self._last)
+
+    def timestamps(self) -> np.ndarray:
+        """Zero-copy epoch-ns view of the live window, NaT markers included."""
+        return self._values[self._span()]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.timestamps().view("M8[ns]"), copy=False)
+
+    def locate(self, ts: float) -> int:
+        """Window position of the slot stamped ``ts`` (epoch ms), or -1.
+
+        A binary search; ticks that arrived out of order are not found.
+        """
+        ns = self._ns(ts)
+        span = self._span()
+        pos = int(np.searchsorted(self._keys[span], ns))
+        if pos < self._size and self._values[span][pos] == ns:
+            return pos
+        return -1
 
 
 class KucoinDataStream:
-    """Ingests market data from KuCoin Futures."""
+    """Ingests market data from KuCoin Futures.
+
+    With ``record_dir`` raw messages are captured by a ``TickRecorder``;
+    assign a ``LogReplayer`` to ``websocket`` to replay them. Topics are
+    spread over ``connections`` self-healing sockets of a
+    ``ConnectionManager``.
+
+    Trades from :meth:`events` are aggregated into ``bars`` at
+    ``resolutions``; subscribe feature engines to it. Exchange candles are
+    subscribed at the same resolutions, by default the 1s, 5s and 1min
+    candles :meth:`messages` has always carried, and with ``reconcile``
+    :meth:`events` checks the bars against them.
+    """
 
     BASE_HTTP = "https://api-futures.kucoin.com"
 
-    def __init__(self, symbols: List[str]):
+    def __init__(
+        self,
+        symbols: List[str],
+        record_dir: Optional[str] = None,
+        connections: int = 1,
+        resolutions: Iterable[str] = RESOLUTIONS,
+        reconcile: bool = True,
+    ):
         self.symbols = symbols
+        self.bars = BarAggregator(resolutions)
+        self.reconcile = reconcile
+        # set by events(), whose topics it decodes
+        self.decoder: Optional[TopicDecoder] = None
+        self.connections = connections
         self.websocket = None
         self.index = UnifiedIndex()
+        self.recorder = None if record_dir is None else TickRecorder(record_dir)
 
     async def _get_ws_endpoint(self) -> str:
         async with aiohttp.ClientSession() as session:
@@ -61,36 +162,34 @@ class KucoinDataStream:
         return f"{server['endpoint']}?token={token}"  # nosec
 
     async def connect(self) -> None:
-        url = await self._get_ws_endpoint()
-        self.websocket = await websockets.connect(url, ping_interval=None)
-        await self._subscribe()
+        self.websocket = ConnectionManager(self._get_ws_endpoint, self.topics(), self.connections)
+        self.websocket.start()
+
+    async def disconnect(self) -> None:
+        if isinstance(self.websocket, ConnectionManager):
+            await self.websocket.close()
+        self.websocket = None
 
-    async def _subscribe(self) -> None:
+    def topics(self) -> List[str]:
         topics = []
         for symbol in self.symbols:
+            topics.append(f"/contractMarket/execution:{symbol}")
+            topics.extend(f"/contractMarket/candles:{symbol}_{r}" for r in self.bars.resolutions)
             topics.extend([
-                f"/contractMarket/execution:{symbol}",
-                f"/contractMarket/candles:{symbol}_1s",
-                f"/contractMarket/candles:{symbol}_5s",
-                f"/contractMarket/candles:{symbol}_1min",
                 f"/contractMarket/level2:{symbol}",
                 f"/contractMarket/fundingRate:{symbol}",
                 f"/contractMarket/openInterest:{symbol}",
                 f"/contractMarket/LiquidationOrders:{symbol}",
             ])
-        msg = {
-            "id": int(time.time() * 1000),
-            "type": "subscribe",
-            "topic": topics,
-            "privateChannel": False,
-            "response": True,
-        }
-        await self.websocket.send(json.dumps(msg))
+        return topics
 
     async def messages(self) -> AsyncIterator[Dict]:
         if self.websocket is None:
             await self.connect()
+        recorder = self.recorder
         async for msg in self.websocket:
+            if recorder is not None:
+                recorder.record(msg)
             data = json.loads(msg)
             ts = (
                 data.get("data", {}).get("time")
@@ -100,6 +199,30 @@ class KucoinDataStream:
                 data["event_time"] = self.index.add(ts)
             yield data
 
+    async def events(self, topics: Optional[Iterable[str]] = None) -> AsyncIterator[tuple]:
+        """Typed records of ``topics`` (topic prefixes, default all).
+
+        Unlike :meth:`messages` frames are routed by topic before parsing,
+        so frames of other topics cost almost nothing; the decoder's counts
+        are kept in ``self.decoder``. Trades also go through ``self.bars``
+        and, with ``reconcile``, candles are checked against it.
+        """
+        if self.websocket is None:
+            await self.connect()
+        self.decoder = decoder = TopicDecoder(topics)
+        recorder = self.recorder
+        async for msg in self.websocket:
+            if recorder is not None:
+                recorder.record(msg)
+            event = decoder.decode(msg)
+            if event is None:
+                continue
+            if isinstance(event, Trade):
+                self.bars.add_trade(event)
+            elif self.reconcile and isinstance(event, Candle):
+                self.bars.reconcile(event)
+            yield event
+
 
 async def _example() -> None:
     stream = KucoinDataStream(["BTCUSDTM"])
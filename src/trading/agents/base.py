@@ -5,6 +5,7 @@ from typing import List, Dict, Any
 import asyncio
 import faiss
 import numpy as np
+from ..clock import Clock, WALL_CLOCK
 from ..llm import embed
 
 @dataclass
@@ -21,12 +22,14 @@ class BaseAgent(abc.ABC):
     name: str
     history: List[AgentResult]
     weight: float
+    clock: Clock
     _index: faiss.IndexFlatL2
     _mem_vectors: List[np.ndarray]
 
     def __init__(self):
         self.history = []
         self.weight = 1.0
+        self.clock = WALL_CLOCK
         self._index = faiss.IndexFlatL2(1536)
         self._mem_vectors = []
 
@@ -1,5 +1,4 @@
 from .base import BaseAgent, AgentResult
-from datetime import datetime
 from typing import Dict
 from ..llm import chat
 
@@ -28,7 +27,7 @@ class MacroAgent(BaseAgent):
                 continue
         edge = max(0.0, min(1.0, edge))
         result = AgentResult(
-            ts=datetime.utcnow(),
+            ts=self.clock.now(),
             symbol=market_slice.get("symbol", ""),
             direction=direction,
             edge=edge,
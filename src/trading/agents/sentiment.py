@@ -1,5 +1,4 @@
 from .base import BaseAgent, AgentResult
-from datetime import datetime
 from typing import Dict
 from ..llm import chat, LLMError
 import logging
@@ -19,7 +18,7 @@ class SentimentAgent(BaseAgent):
         except LLMError as exc:
             logging.error("Sentiment LLM failure: %s", exc)
             return AgentResult(
-                ts=datetime.utcnow(),
+                ts=self.clock.now(),
                 symbol=market_slice.get("symbol", ""),
                 direction="FLAT",
                 edge=0.0,
@@ -40,7 +39,7 @@ class SentimentAgent(BaseAgent):
             except ValueError:
                 continue
         result = AgentResult(
-            ts=datetime.utcnow(),
+            ts=self.clock.now(),
             symbol=market_slice.get("symbol", ""),
             direction=direction,
             edge=edge,
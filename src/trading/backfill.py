@@ -0,0 +1,223 @@
+"""Vectorised rebuild of DerivedMetrics bars from historical DataFrames.
+
+Inputs are long-format frames keyed by ``ts`` (epoch ms) and ``symbol``:
+
+* ``ticks``: ``price``, ``size``, ``side``
+* ``orderbooks``: ``bids``, ``asks`` and optionally ``spot_price``
+* ``funding``: ``fundingRate``
+* ``oi``: ``openInterest``, ``longQty``, ``shortQty``, ``marketCap``
+* ``liquidations``: ``side``, ``size`` and optionally ``price``
+
+Each tick sees the latest order book, funding and open interest row at or
+before its timestamp, and every liquidation is delivered with the first tick
+at or after it. :func:`iter_updates` replays exactly that pairing through
+``DerivedMetrics.update`` so the two paths can be compared.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BOOK_FIELDS = ["bids", "asks", "spot_price"]
+FUNDING_FIELDS = ["fundingRate"]
+OI_FIELDS = ["openInterest", "longQty", "longValue", "shortQty", "shortValue", "marketCap"]
+LIQ_FIELDS = ["side", "size", "price"]
+
+
+def _sorted(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.sort_values("ts", kind="mergesort").reset_index(drop=True)
+
+
+def align(
+    ticks: pd.DataFrame,
+    orderbooks: Optional[pd.DataFrame] = None,
+    funding: Optional[pd.DataFrame] = None,
+    oi: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Sort ticks by time and as-of join the latest book, funding and OI rows."""
+    frame = _sorted(ticks)
+    for other, fields in ((orderbooks, BOOK_FIELDS), (funding, FUNDING_FIELDS), (oi, OI_FIELDS)):
+        if other is None or other.empty:
+            continue
+        cols = [c for c in fields if c in other.columns]
+        right = _sorted(other[["ts", "symbol"] + cols])
+        frame = pd.merge_asof(frame, right, on="ts", by="symbol", direction="backward")
+    return frame
+
+
+def assign_liquidations(frame: pd.DataFrame, liquidations: Optional[pd.DataFrame]) -> np.ndarray:
+    """Row of ``frame`` each liquidation is delivered with, -1 if none follows it."""
+    if liquidations is None or liquidations.empty:
+        return np.empty(0, dtype=np.int64)
+    rows = np.full(len(liquidations), -1, dtype=np.int64)
+    symbols = liquidations["symbol"].to_numpy()
+    liq_ts = liquidations["ts"].to_numpy()
+    for symbol, positions in frame.groupby("symbol", sort=False).indices.items():
+        mask = symbols == symbol
+        tick_ts = frame["ts"].to_numpy()[positions]
+        idx = np.searchsorted(tick_ts, liq_ts[mask], side="left")
+        hit = idx < len(positions)
+        rows[np.flatnonzero(mask)[hit]] = positions[idx[hit]]
+    return rows
+
+
+def _present(row: Dict, fields: List[str]) -> Dict:
+    out = {}
+    for key in fields:
+        value = row.get(key)
+        if isinstance(value, float) and value != value:
+            continue
+        if value is not None:
+            out[key] = value
+    return out
+
+
+def iter_updates(
+    ticks: pd.DataFrame,
+    orderbooks: Optional[pd.DataFrame] = None,
+    funding: Optional[pd.DataFrame] = None,
+    oi: Optional[pd.DataFrame] = None,
+    liquidations: Optional[pd.DataFrame] = None,
+) -> Iterator[Tuple[Dict, Dict, Dict, Dict, List[Dict]]]:
+    """Yield ``DerivedMetrics.update`` arguments tick by tick in time order."""
+    frame = align(ticks, orderbooks, funding, oi)
+    delivered: Dict[int, List[Dict]] = {}
+    if liquidations is not None and not liquidations.empty:
+        for row, liq in zip(assign_liquidations(frame, liquidations), liquidations.to_dict("records")):
+            if row >= 0:
+                delivered.setdefault(int(row), []).append(_present(liq, LIQ_FIELDS))
+    for i, row in enumerate(frame.to_dict("records")):
+        raw = _present(row, ["ts", "symbol", "price", "size", "side"])
+        yield (
+            raw,
+            _present(row, BOOK_FIELDS),
+            _present(row, FUNDING_FIELDS),
+            _present(row, OI_FIELDS),
+            delivered.get(i, []),
+        )
+
+
+def _column(frame: pd.DataFrame, name: str, default: float) -> pd.Series:
+    if name in frame.columns:
+        return frame[name].astype(float).fillna(default)
+    return pd.Series(default, index=frame.index, dtype=float)
+
+
+def _levels(frame: pd.DataFrame, name: str) -> pd.Series:
+    if name in frame.columns:
+        return frame[name]
+    return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+
+
+def _top_of_book(levels: pd.Series, price: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    best = price.copy()
+    size = np.zeros(len(price))
+    for i, book in enumerate(levels):
+        if isinstance(book, (list, tuple)) and book:
+            best[i], size[i] = book[0][0], book[0][1]
+    return best, size
+
+
+def build_bars(
+    frame: pd.DataFrame,
+    liquidations: Optional[pd.DataFrame],
+    book_metrics: Callable[[Dict, float], Dict[str, float]],
+) -> Dict[str, pd.DataFrame]:
+    """Aggregate aligned ticks into per-symbol 1-minute bars.
+
+    ``frame`` comes from :func:`align`. Returns the base and order book
+    columns DerivedMetrics keeps per bar, accumulated the same way
+    ``MetricsEngine.update`` does; ``book_metrics`` is applied to the book
+    seen by each bar's last tick.
+    """
+    n = len(frame)
+    price = _column(frame, "price", 0.0).to_numpy()
+    size = _column(frame, "size", 0.0).to_numpy()
+    side_raw = frame["side"] if "side" in frame.columns else pd.Series("buy", index=frame.index)
+    side = np.where(side_raw.fillna("buy").astype(str).str.lower() == "buy", 1.0, -1.0)
+
+    bids = _levels(frame, "bids")
+    asks = _levels(frame, "asks")
+    best_bid, bid_size = _top_of_book(bids, price)
+    best_ask, ask_size = _top_of_book(asks, price)
+    depth = bid_size + ask_size
+    micro = (best_ask * bid_size + best_bid * ask_size) / np.where(depth == 0, 1e-9, depth)
+
+    spot = _column(frame, "spot_price", np.nan).to_numpy()
+    spot = np.where(np.isnan(spot), price, spot)
+    long_oi = _column(frame, "longQty", np.nan).fillna(_column(frame, "longValue", 0.0))
+    short_oi = _column(frame, "shortQty", np.nan).fillna(_column(frame, "shortValue", 0.0))
+
+    liq_buy = np.zeros(n)
+    liq_sell = np.zeros(n)
+    density = np.zeros(n)
+    rows = assign_liquidations(frame, liquidations)
+    if len(rows):
+        keep = rows >= 0
+        rows = rows[keep]
+        liq_side = liquidations["side"].astype(str).str.lower().to_numpy()[keep]
+        liq_size = _column(liquidations, "size", 0.0).to_numpy()[keep]
+        liq_price = _column(liquidations, "price", np.nan).to_numpy()[keep]
+        liq_price = np.where(np.isnan(liq_price), price[rows], liq_price)
+        np.add.at(liq_buy, rows, np.where(liq_side == "buy", liq_size, 0.0))
+        np.add.at(liq_sell, rows, np.where(liq_side == "sell", liq_size, 0.0))
+        count = np.bincount(rows, minlength=n)
+        high = np.full(n, -np.inf)
+        low = np.full(n, np.inf)
+        np.maximum.at(high, rows, liq_price)
+        np.minimum.at(low, rows, liq_price)
+        hit = count > 0
+        density[hit] = count[hit] / (high[hit] - low[hit] + 1e-9)
+
+    ticks = pd.DataFrame({
+        "symbol": frame["symbol"].to_numpy(),
+        "minute": frame["ts"].to_numpy(np.int64) // 60_000 * 60_000 * 1_000_000,
+        "price": price,
+        "notional": price * size,
+        "size": size,
+        "flow": side * size,
+        "adverse": side * (price - micro) * size,
+        "SpotPrice": spot,
+        "FundingRate": _column(frame, "fundingRate", 0.0).to_numpy(),
+        "OpenInterest": _column(frame, "openInterest", 0.0).to_numpy(),
+        "LongOI": long_oi.to_numpy(),
+        "ShortOI": short_oi.to_numpy(),
+        "MarketCap": _column(frame, "marketCap", 0.0).to_numpy(),
+        "liq_buy": liq_buy,
+        "liq_sell": liq_sell,
+        "density": density,
+        "row": np.arange(n),
+    })
+
+    out: Dict[str, pd.DataFrame] = {}
+    for symbol, g in ticks.groupby("symbol", sort=False):
+        by_bar = g.groupby("minute", sort=True)
+        last = by_bar.last()
+        bars = pd.DataFrame({
+            "Open": by_bar["price"].first(),
+            "High": by_bar["price"].max(),
+            "Low": by_bar["price"].min(),
+            "LastPrice": last["price"],
+            "SpotPrice": last["SpotPrice"],
+            "FundingRate": last["FundingRate"],
+            "OpenInterest": last["OpenInterest"],
+            "LongOI": last["LongOI"],
+            "ShortOI": last["ShortOI"],
+            "MarketCap": last["MarketCap"],
+            "VWAP_numerator": g["notional"].cumsum().groupby(g["minute"]).last(),
+            "Volume": g["size"].cumsum().groupby(g["minute"]).last(),
+            "CVD": g["flow"].cumsum().groupby(g["minute"]).last(),
+            "TradeCount": by_bar.size(),
+            "AdverseSelectionCost": by_bar["adverse"].sum(),
+            "LiquidationPressureBuy": by_bar["liq_buy"].sum(),
+            "LiquidationPressureSell": by_bar["liq_sell"].sum(),
+            "LiquidationClusterDensity": last["density"],
+        })
+        snapshots = []
+        for row, px in zip(last["row"].to_numpy(), last["price"].to_numpy()):
+            book = {key: levels.iat[row] for key, levels in (("bids", bids), ("asks", asks))
+                    if isinstance(levels.iat[row], (list, tuple))}
+            snapshots.append(book_metrics(book, px))
+        bars.index = pd.to_datetime(bars.index, utc=True)
+        out[symbol] = pd.concat([bars, pd.DataFrame(snapshots, index=bars.index)], axis=1)
+    return out
@@ -0,0 +1,247 @@
+"""Trade bars at several resolutions from one pass over the trades.
+
+:class:`BarAggregator` folds every trade into the open bar of each
+configured resolution (``"1s"``, ``"5s"``, ``"1min"``, ...) per symbol and
+reports :class:`Bar` records: a bar with ``closed`` set once a trade opens
+the next interval, and the open bar, updated, after every trade.
+Subscribers get the same records, so one aggregator can drive every
+feature engine of a symbol. Intervals without trades produce no bars;
+consumers that want them filled do so themselves.
+
+Bars are stamped on event time: a trade older than the open bar of the
+finest resolution is counted in ``late`` and dropped, which keeps every
+coarse bar the sum of its fine ones.
+
+Exchange :class:`~trading.decoders.Candle` records handed to
+:meth:`BarAggregator.reconcile` are compared with the closed bar of the
+same interval; the ones that differ are counted and logged.
+"""
+import logging
+import math
+import re
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+RESOLUTIONS = ("1s", "5s", "1min")
+# closed bars per symbol and resolution kept for candles that arrive late
+RECENT = 16
+RECONCILE_FIELDS = ("open", "high", "low", "close", "volume")
+
+_UNITS = {
+    "ms": 1, "s": 1000, "sec": 1000, "m": 60_000, "min": 60_000,
+    "h": 3_600_000, "hour": 3_600_000, "d": 86_400_000, "day": 86_400_000,
+}
+
+
+def parse_resolution(label: str) -> int:
+    """Length in ms of a resolution such as ``"5s"``, ``"1min"`` or ``"4hour"``."""
+    match = re.fullmatch(r"(\d+)\s*([a-z]+)", label.strip().lower())
+    if not match or match.group(2) not in _UNITS or not int(match.group(1)):
+        raise ValueError(f"Unknown bar resolution: {label}")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+class Bar(NamedTuple):
+    symbol: str
+    resolution: str
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    turnover: float
+    trades: int
+    delta: float
+    cvd: float
+    closed: bool
+
+    @property
+    def vwap(self) -> float:
+        return self.turnover / self.volume if self.volume else self.close
+
+
+# indices into an open bar's state list
+_START, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _TURNOVER, _TRADES, _DELTA = range(9)
+
+
+class BarAggregator:
+    """Incremental OHLCV, VWAP, trade count and CVD bars per symbol.
+
+    ``delta`` is a bar's buy minus sell volume and ``cvd`` its running sum
+    over the symbol's trades so far; trades whose side is not ``"sell"``
+    count as buys.
+    """
+
+    def __init__(
+        self,
+        resolutions: Iterable[str] = RESOLUTIONS,
+        rel_tol: float = 1e-9,
+        history: int = 100,
+    ):
+        lengths = {parse_resolution(r): r for r in resolutions}
+        if not lengths:
+            raise ValueError("at least one resolution is required")
+        self.lengths = sorted(lengths)
+        self.resolutions = [lengths[n] for n in self.lengths]
+        self.rel_tol = rel_tol
+        self.late = 0
+        self.reconciled = 0
+        self.mismatches = 0
+        # (symbol, resolution, start, {field: (ours, theirs)}) of recent mismatches
+        self.mismatched: Deque[Tuple[str, str, int, Dict[str, Tuple[float, float]]]] = deque(maxlen=history)
+        self._open: Dict[str, List[List[float]]] = {}
+        self._cvd: Dict[str, float] = {}
+        # exchange candles waiting for our bar to close, and our recent closed bars
+        self._candles: Dict[Tuple[str, int], Dict[int, Any]] = {}
+        self._recent: Dict[Tuple[str, int], Deque[Bar]] = {}
+        self._subscribers: List[Tuple[Callable[[Bar], Any], Optional[str], Optional[str], bool]] = []
+
+    def subscribe(
+        self,
+        callback: Callable[[Bar], Any],
+        symbol: Optional[str] = None,
+        resolution: Optional[str] = None,
+        closed_only: bool = False,
+    ) -> None:
+        """Call ``callback`` with every bar, or those of ``symbol``/``resolution``."""
+        if resolution is not None:
+            resolution = self.resolutions[self.lengths.index(parse_resolution(resolution))]
+        self._subscribers.append((callback, symbol, resolution, closed_only))
+
+    def unsubscribe(self, callback: Callable[[Bar], Any]) -> None:
+        self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def _bar(self, symbol: str, i: int, state: List[float], closed: bool) -> Bar:
+        return Bar(
+            symbol, self.resolutions[i], int(state[_START]), state[_OPEN], state[_HIGH], state[_LOW], state[_CLOSE],
+            state[_VOLUME], state[_TURNOVER], int(state[_TRADES]), state[_DELTA], self._cvd[symbol], closed,
+        )
+
+    def add(self, symbol: str, ts: float, price: float, size: float, side: str = "buy") -> List[Bar]:
+        """Fold one trade in; the bars it closed, then every open bar.
+
+        Empty for a late trade.
+        """
+        states = self._open.get(symbol)
+        ts = int(ts)
+        if states is not None and ts < states[0][_START]:
+            self.late += 1
+            return []
+        signed = -size if side == "sell" else size
+        closed = []
+        if states is None:
+            states = self._open[symbol] = [None] * len(self.lengths)
+            self._cvd[symbol] = 0.0
+        cvd = self._cvd[symbol]
+        for i, length in enumerate(self.lengths):
+            start = ts - ts % length
+            state = states[i]
+            if state is None or start > state[_START]:
+                if state is not None:
+                    bar = self._bar(symbol, i, state, True)
+                    self._closed_bar(bar, length)
+                    closed.append(bar)
+                states[i] = [start, price, price, price, price, size, price * size, 1, signed]
+                continue
+            if price > state[_HIGH]:
+                state[_HIGH] = price
+            elif price < state[_LOW]:
+                state[_LOW] = price
+            state[_CLOSE] = price
+            state[_VOLUME] += size
+            state[_TURNOVER] += price * size
+            state[_TRADES] += 1
+            state[_DELTA] += signed
+        # closed bars were stamped with the cvd before this trade
+        self._cvd[symbol] = cvd + signed
+        bars = closed + [self._bar(symbol, i, state, False) for i, state in enumerate(states)]
+        if self._subscribers:
+            self._publish(bars)
+        return bars
+
+    def add_trade(self, trade) -> List[Bar]:
+        """:meth:`add` for a :class:`~trading.decoders.Trade`."""
+        return self.add(trade.symbol, trade.ts, trade.price, trade.size, trade.side)
+
+    def _publish(self, bars: List[Bar]) -> None:
+        for callback, symbol, resolution, closed_only in self._subscribers:
+            for bar in bars:
+                if (
+                    (symbol is None or bar.symbol == symbol)
+                    and (resolution is None or bar.resolution == resolution)
+                    and (bar.closed or not closed_only)
+                ):
+                    callback(bar)
+
+    def bar(self, symbol: str, resolution: str) -> Optional[Bar]:
+        """The open bar of ``symbol`` at ``resolution``, None before its first trade."""
+        states = self._open.get(symbol)
+        if states is None:
+            return None
+        i = self.lengths.index(parse_resolution(resolution))
+        return self._bar(symbol, i, states[i], False)
+
+    def reconcile(self, candle) -> Optional[Dict[str, Tuple[float, float]]]:
+        """Check a :class:`~trading.decoders.Candle` against our bar for its interval.
+
+        A candle of one of the last ``RECENT`` intervals we closed is
+        compared at once and the differing fields returned as
+        ``(ours, theirs)``. Candles of open or later intervals are kept,
+        the latest per interval as the exchange revises them, and compared
+        when our bar closes. Returns None when
+        nothing was compared.
+        """
+        try:
+            length = parse_resolution(candle.interval)
+        except ValueError:
+            return None
+        if length not in self.lengths:
+            return None
+        key = (candle.symbol, length)
+        recent = self._recent.get(key)
+        if recent and candle.ts <= recent[-1].start:
+            for bar in recent:
+                if bar.start == candle.ts:
+                    return self._compare(bar, candle)
+            return None
+        self._candles.setdefault(key, {})[candle.ts] = candle
+        return None
+
+    def _closed_bar(self, bar: Bar, length: int) -> None:
+        key = (bar.symbol, length)
+        recent = self._recent.get(key)
+        if recent is None:
+            recent = self._recent[key] = deque(maxlen=RECENT)
+        recent.append(bar)
+        pending = self._candles.get(key)
+        if pending:
+            candle = pending.pop(bar.start, None)
+            for start in [t for t in pending if t < bar.start]:
+                del pending[start]
+            if candle is not None:
+                self._compare(bar, candle)
+
+    def _compare(self, bar: Bar, candle) -> Dict[str, Tuple[float, float]]:
+        self.reconciled += 1
+        diffs = {}
+        for name in RECONCILE_FIELDS:
+            ours, theirs = getattr(bar, name), float(getattr(candle, name))
+            if not math.isclose(ours, theirs, rel_tol=self.rel_tol, abs_tol=1e-12):
+                diffs[name] = (ours, theirs)
+        if diffs:
+            self.mismatches += 1
+            self.mismatched.append((bar.symbol, bar.resolution, bar.start, diffs))
+            LOGGER.warning("%s %s bar at %d differs from the exchange candle: %s",
+                           bar.symbol, bar.resolution, bar.start, diffs)
+        return diffs
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "symbols": len(self._open),
+            "late": self.late,
+            "reconciled": self.reconciled,
+            "mismatches": self.mismatches,
+        }
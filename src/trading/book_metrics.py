@@ -0,0 +1,131 @@
+"""Order book microstructure metrics in one pass over the book levels.
+
+Bids are expected best (highest) first and asks best (lowest) first, as
+exchanges send them; levels are any ``(price, size)`` pairs, lists or numpy
+rows. Each side's cumulative size is built once, only as deep as the widest
+depth band or the largest slippage order reaches. Depth within each band is
+then a binary search for the band edge, and the slippage of each notional a
+binary search for the level that completes the fill.
+"""
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+DEPTH_PCTS = (0.001, 0.005)
+SLIPPAGE_USD = (1000.0,)
+IMBALANCE_PCT = 0.01
+
+
+def depth_column(pct: float) -> str:
+    """Column name for depth within ``pct`` of the mid, e.g. ``DepthAt0_1pct``."""
+    return "DepthAt" + f"{pct * 100:g}".replace(".", "_") + "pct"
+
+
+def slippage_column(usd: float) -> str:
+    """Column name for the slippage of a ``usd`` buy, e.g. ``SlippageCost1kUSD``."""
+    return "SlippageCost" + f"{usd / 1000:g}".replace(".", "_") + "kUSD"
+
+
+_price = itemgetter(0)
+_size = itemgetter(1)
+
+
+def _neg_price(level) -> float:
+    return -level[0]
+
+
+def depth_within(bids: Sequence, asks: Sequence, mid: float, pcts: Sequence[float]) -> List[Tuple[float, float]]:
+    """``(bid_size, ask_size)`` within ``mid * pct`` of the mid for each ascending pct."""
+    edges = [mid * pct for pct in pcts]
+    n_bid = [bisect_right(bids, -(mid - th), key=_neg_price) for th in edges]
+    n_ask = [bisect_right(asks, mid + th, key=_price) for th in edges]
+    bid_cum = list(accumulate(map(_size, islice(bids, n_bid[-1])), initial=0.0))
+    ask_cum = list(accumulate(map(_size, islice(asks, n_ask[-1])), initial=0.0))
+    return [(bid_cum[b], ask_cum[a]) for b, a in zip(n_bid, n_ask)]
+
+
+def slippage(asks: Sequence, notionals: Sequence[float]) -> List[float]:
+    """Relative cost over the best ask of buying each ascending notional.
+
+    Quantity past the end of the book is assumed to fill at the last level.
+    """
+    best = asks[0][0]
+    qtys = [usd / best for usd in notionals]
+    # Cumulative size and cost, extended in growing chunks until they cover
+    # the largest order, so a deep book is only walked as far as needed.
+    cum_qty = [0.0]
+    cum_cost = [0.0]
+    depth, step = 0, 16
+    while cum_qty[-1] < qtys[-1] and depth < len(asks):
+        chunk = asks[depth : depth + step]
+        cum_qty += islice(accumulate(map(_size, chunk), initial=cum_qty[-1]), 1, None)
+        cum_cost += islice(accumulate((level[0] * level[1] for level in chunk), initial=cum_cost[-1]), 1, None)
+        depth += len(chunk)
+        step *= 4
+    out = []
+    for qty in qtys:
+        k = bisect_left(cum_qty, qty, 1) - 1
+        fill = asks[min(k, len(asks) - 1)][0]
+        out.append(((cum_cost[k] + (qty - cum_qty[k]) * fill) / qty - best) / best)
+    return out
+
+
+class BookMetrics:
+    """Per-snapshot book columns for a fixed set of depth bands and order sizes.
+
+    ``depth_pcts`` are distances from the mid (0.001 = 0.1%) and
+    ``slippage_usd`` buy notionals; the defaults ``DEPTH_PCTS`` and
+    ``SLIPPAGE_USD`` are always included since ``LiquiditySlope`` and the
+    standard columns rest on them.
+    """
+
+    def __init__(self, depth_pcts: Iterable[float] = DEPTH_PCTS, slippage_usd: Iterable[float] = SLIPPAGE_USD):
+        self.depth_pcts = sorted(set(depth_pcts) | set(DEPTH_PCTS))
+        self.slippage_usd = sorted(set(slippage_usd) | set(SLIPPAGE_USD))
+        self._bands = sorted(set(self.depth_pcts) | {IMBALANCE_PCT})
+        self._depth_at = [(depth_column(p), self._bands.index(p)) for p in self.depth_pcts]
+        self._imbalance = self._bands.index(IMBALANCE_PCT)
+        self._slope = [self._bands.index(p) for p in DEPTH_PCTS]
+        self._slippage = [slippage_column(u) for u in self.slippage_usd]
+        self.columns = (
+            ["OrderBookImbalance"]
+            + [name for name, _ in self._depth_at]
+            + ["LiquiditySlope", "BidAskSpread", "QuotedSpread", "MicroPrice"]
+            + self._slippage
+        )
+
+    def __call__(self, orderbook: Dict, price: float) -> Dict[str, float]:
+        """Every column for one snapshot.
+
+        A missing side is priced at ``price`` with no size; depth, imbalance
+        and slippage are then zero.
+        """
+        bids = orderbook.get("bids")
+        asks = orderbook.get("asks")
+        has_bids = bids is not None and len(bids) > 0
+        has_asks = asks is not None and len(asks) > 0
+        best_bid, bid_size = (bids[0][0], bids[0][1]) if has_bids else (price, 0.0)
+        best_ask, ask_size = (asks[0][0], asks[0][1]) if has_asks else (price, 0.0)
+        mid = (best_bid + best_ask) / 2
+        spread = best_ask - best_bid
+
+        if has_bids and has_asks:
+            sides = depth_within(bids, asks, mid, self._bands)
+        else:
+            sides = [(0.0, 0.0)] * len(self._bands)
+        depth = [b + a for b, a in sides]
+        bid_depth, ask_depth = sides[self._imbalance]
+        total = bid_depth + ask_depth
+
+        out = {"OrderBookImbalance": (bid_depth - ask_depth) / total if total else 0.0}
+        for name, i in self._depth_at:
+            out[name] = depth[i]
+        lo, hi = self._slope
+        out["LiquiditySlope"] = (depth[hi] - depth[lo]) / (mid * 0.004 + 1e-9)
+        out["BidAskSpread"] = spread
+        out["QuotedSpread"] = spread / (mid + 1e-9)
+        out["MicroPrice"] = (best_ask * bid_size + best_bid * ask_size) / (bid_size + ask_size or 1e-9)
+        costs = slippage(asks, self.slippage_usd) if has_asks else [0.0] * len(self._slippage)
+        out.update(zip(self._slippage, costs))
+        return out
@@ -0,0 +1,130 @@
+"""Warm-start snapshots of streaming state.
+
+A :class:`Checkpointer` keeps one pickle per key (usually a symbol) under
+``root``::
+
+    <root>/<key>.ckpt
+
+Snapshots are only worth taking of state that is expensive to rebuild,
+such as the rolling windows behind :class:`~trading.metrics_engine.MetricsEngine`
+or :class:`~trading.features.FeatureFabric`. Whatever happened after the
+snapshot is replayed from the caller's own history (for DerivedMetrics,
+its :class:`~trading.metrics_store.ColumnStore`).
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when a snapshotted class changes shape; older files are ignored.
+FORMAT = 1
+_SUFFIX = ".ckpt"
+
+
+class Checkpointer:
+    """Snapshots under ``root``, one file per key, at most every ``interval`` seconds.
+
+    :meth:`save` pickles on the calling thread, so the snapshot matches the
+    state at that moment, and leaves the write to a daemon thread; a newer
+    snapshot of a key replaces one not yet written. Files are replaced
+    atomically, so a crash mid-write keeps the previous snapshot.
+    """
+
+    def __init__(self, root: str, interval: float = 300.0):
+        self.root = root
+        self.interval = interval
+        self.saved = 0
+        self.errors = 0
+        self._start = time.monotonic() + interval
+        self._next: Dict[str, float] = {}
+        self._blobs: Dict[str, bytes] = {}
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+        self._thread.start()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + _SUFFIX)
+
+    def due(self, key: str) -> bool:
+        """Whether ``interval`` seconds have passed since ``key`` was last saved."""
+        return time.monotonic() >= self._next.get(key, self._start)
+
+    def save(self, key: str, state: Any) -> None:
+        blob = pickle.dumps({"format": FORMAT, "saved": time.time(), "state": state}, pickle.HIGHEST_PROTOCOL)
+        self._next[key] = time.monotonic() + self.interval
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("checkpointer is closed")
+            self._blobs[key] = blob
+            self._cond.notify_all()
+
+    def load(self, key: str) -> Optional[Any]:
+        """The last snapshot written for ``key``; None if there is no usable one."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                saved = pickle.load(fh)
+        except Exception:
+            LOGGER.exception("Unreadable checkpoint %s", path)
+            return None
+        if saved.get("format") != FORMAT:
+            LOGGER.warning("Ignoring checkpoint %s in format %s", path, saved.get("format"))
+            return None
+        return saved["state"]
+
+    def keys(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[: -len(_SUFFIX)] for name in os.listdir(self.root) if name.endswith(_SUFFIX))
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._blobs), "saved": self.saved, "errors": self.errors}
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._blobs or self._closed)
+                if not self._blobs:
+                    return
+                blobs, self._blobs = self._blobs, {}
+                self._busy = True
+            for key, blob in blobs.items():
+                self._write(key, blob)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _write(self, key: str, blob: bytes) -> None:
+        path = self._path(key)
+        tmp = path + ".tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(tmp, "wb") as fh:
+                fh.write(blob)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, path)
+            self.saved += 1
+        except OSError:
+            self.errors += 1
+            LOGGER.exception("Checkpoint write failed for %s", key)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every snapshot saved so far is on disk."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._blobs and not self._busy, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write what is queued and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
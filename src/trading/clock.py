@@ -0,0 +1,78 @@
+"""Time sources for live trading and replay.
+
+Components read the time from a :class:`Clock` instead of
+``datetime.utcnow()``. Live trading uses the wall clock; a backtest uses a
+:class:`SimulatedClock` that the replayed ticks drive, so time-of-day
+logic and timestamps follow event time whatever the replay speed.
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+MAX_SPEED = math.inf
+
+
+class Clock:
+    """Wall clock. ``now()`` is naive UTC, like ``datetime.utcnow()``."""
+
+    def time(self) -> float:
+        """Epoch seconds."""
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time(), timezone.utc).replace(tzinfo=None)
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+WALL_CLOCK = Clock()
+
+
+class SimulatedClock(Clock):
+    """Event-time clock advanced by replayed ticks.
+
+    :meth:`advance` moves the clock to a tick's timestamp (epoch ms) and
+    waits out the gap divided by ``speed``: 1 replays in real time, 10 ten
+    times faster, :data:`MAX_SPEED` without waiting at all. The clock never
+    runs backwards, so out-of-order ticks don't rewind it.
+    """
+
+    def __init__(self, speed: float = MAX_SPEED, start_ms: Optional[int] = None):
+        if not speed > 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.ms = start_ms
+
+    def time(self) -> float:
+        if self.ms is None:
+            raise RuntimeError("simulated clock read before the first event")
+        return self.ms / 1000
+
+    async def advance(self, ts_ms: int) -> None:
+        prev = self.ms
+        if prev is not None and ts_ms <= prev:
+            return
+        self.ms = int(ts_ms)
+        if prev is not None and self.speed != MAX_SPEED:
+            await asyncio.sleep((ts_ms - prev) / 1000 / self.speed)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.advance((self.ms or 0) + int(seconds * 1000))
+
+
+def parse_speed(value: Union[None, str, float]) -> float:
+    """Replay speed from config: a number, ``"10x"``, or ``"max"``/``None``."""
+    if value is None:
+        return MAX_SPEED
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("max", "inf"):
+            return MAX_SPEED
+        value = value.rstrip("x")
+    speed = float(value)
+    if not speed > 0:
+        raise ValueError(f"replay speed must be positive, got {value!r}")
+    return speed
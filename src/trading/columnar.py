@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class RingTable:
+    """Fixed-capacity typed columnar table on a circular time axis.
+
+    Columns are grouped by dtype into preallocated 2-D blocks. Every row is
+    written twice, at ``p`` and ``p + capacity``, so the live window is
+    always one contiguous slice and :meth:`frame` can hand out zero-copy
+    views no matter where the head is. Memory is fixed at
+    ``2 * capacity`` rows, reported by :attr:`nbytes`: twice what a single
+    buffer would take, the price of never copying on read.
+
+    Views share storage with the table: rows handed out are overwritten once
+    ``capacity`` newer rows have been appended, so copy anything kept longer.
+    """
+
+    def __init__(self, schema: Mapping[str, object], capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.schema = {col: np.dtype(dtype) for col, dtype in schema.items()}
+        self.columns: List[str] = list(self.schema)
+        self.capacity = capacity
+        self._index = np.zeros(2 * capacity, dtype=np.int64)
+        self._blocks: Dict[np.dtype, np.ndarray] = {}
+        self._block_cols: Dict[np.dtype, List[str]] = {}
+        self._slot: Dict[str, tuple] = {}
+        for col, dtype in self.schema.items():
+            self._block_cols.setdefault(dtype, []).append(col)
+        for dtype, cols in self._block_cols.items():
+            self._blocks[dtype] = np.full((len(cols), 2 * capacity), self._fill(dtype), dtype=dtype)
+            for i, col in enumerate(cols):
+                self._slot[col] = (dtype, i)
+        self._head = 0
+        self._size = 0
+
+    @staticmethod
+    def _fill(dtype: np.dtype):
+        return np.nan if dtype.kind == "f" else 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, ts: int) -> bool:
+        return self.locate(ts) >= 0
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the index and column blocks."""
+        return self._index.nbytes + sum(block.nbytes for block in self._blocks.values())
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        if not self._size:
+            return None
+        return int(self._index[self._head - 1 + self.capacity])
+
+    def _span(self) -> slice:
+        stop = self._head + self.capacity
+        return slice(stop - self._size, stop)
+
+    def _write(self, pos: int, values: Mapping[str, float]) -> None:
+        for dtype, cols in self._block_cols.items():
+            fill = self._fill(dtype)
+            row = [values.get(col, fill) for col in cols]
+            block = self._blocks[dtype]
+            block[:, pos] = row
+            block[:, pos + self.capacity] = row
+
+    def append(self, ts: int, values: Mapping[str, float]) -> None:
+        """Append a row stamped ``ts`` (epoch ns), evicting the oldest when full."""
+        pos = self._head
+        self._index[pos] = self._index[pos + self.capacity] = ts
+        self._write(pos, values)
+        self._head = (pos + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, stamps: np.ndarray, frame: pd.DataFrame) -> None:
+        """Append many rows at once; only the last ``capacity`` are kept."""
+        stamps = np.asarray(stamps, dtype=np.int64)[-self.capacity:]
+        n = len(stamps)
+        if not n:
+            return
+        pos = (self._head + np.arange(n)) % self.capacity
+        self._index[pos] = self._index[pos + self.capacity] = stamps
+        for dtype, cols in self._block_cols.items():
+            fill = self._fill(dtype)
+            block = self._blocks[dtype]
+            for i, col in enumerate(cols):
+                values = frame[col].to_numpy()[-n:] if col in frame.columns else fill
+                block[i, pos] = block[i, pos + self.capacity] = values
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def upsert(self, ts: int, values: Mapping[str, float]) -> None:
+        """Overwrite the last row if it carries ``ts``, otherwise append."""
+        if self._size and self.last_ts == ts:
+            self._write((self._head - 1) % self.capacity, values)
+        else:
+            self.append(ts, values)
+
+    def set(self, col: str, value: float, pos: int = -1) -> None:
+        """Set one cell; ``pos`` indexes the live window like a list."""
+        dtype, i = self._slot[col]
+        raw = (self._span().start + (pos % self._size)) % self.capacity
+        block = self._blocks[dtype]
+        block[i, raw] = block[i, raw + self.capacity] = value
+
+    def locate(self, ts: int) -> int:
+        """Window position of the row stamped ``ts``, or -1."""
+        stamps = self.timestamps()
+        pos = int(np.searchsorted(stamps, ts))
+        if pos < len(stamps) and stamps[pos] == ts:
+            return pos
+        return -1
+
+    def timestamps(self) -> np.ndarray:
+        return self._index[self._span()]
+
+    def column(self, col: str) -> np.ndarray:
+        """Zero-copy view of one column, oldest row first."""
+        dtype, i = self._slot[col]
+        return self._blocks[dtype][i, self._span()]
+
+    def value(self, col: str, pos: int = -1):
+        return self.column(col)[pos]
+
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.timestamps().view("M8[ns]")).tz_localize("UTC")
+
+    def frame(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Zero-copy DataFrame view of the live window."""
+        cols = self.columns if columns is None else list(columns)
+        return pd.DataFrame({col: self.column(col) for col in cols}, index=self.index(), copy=False)
+
+    def row(self, pos: int = -1) -> pd.Series:
+        if not self._size:
+            raise IndexError("row from empty table")
+        ts = pd.Timestamp(int(self.timestamps()[pos]), tz="UTC")
+        return pd.Series({col: self.column(col)[pos] for col in self.columns}, name=ts)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional, Union
 import os
 import yaml
 from dotenv import load_dotenv
@@ -11,6 +12,18 @@ class Config:
     risk: dict
     pairs: list
     kucoin: dict
+    # worker processes for per-symbol features; 0 keeps them on the event loop
+    feature_workers: int = 0
+    # directory for warm-start snapshots of feature state; None disables them
+    checkpoint_dir: Optional[str] = None
+    # websocket connections the market-data topics are spread over
+    ws_connections: int = 1
+    # directory to record raw feed messages to; None disables recording
+    record_dir: Optional[str] = None
+    # tick file replayed in backtest mode
+    data_path: Optional[str] = None
+    # backtest replay speed: 1 real time, 10 or "10x" ten times faster, "max" no waiting
+    replay_speed: Union[float, str] = "max"
 
 
 def load_config(config_path: str | None = None) -> Config:
@@ -38,4 +51,15 @@ def load_config(config_path: str | None = None) -> Config:
         "base_url": os.getenv("KUCOIN_BASE_URL", "https://api-futures.kucoin.com"),
     }
     os.environ.setdefault("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", ""))
-    return Config(mode=mode, risk=data.get("risk", {}), pairs=data.get("pairs", []), kucoin=kucoin)
+    return Config(
+        mode=mode,
+        risk=data.get("risk", {}),
+        pairs=data.get("pairs", []),
+        kucoin=kucoin,
+        feature_workers=int(data.get("feature_workers", 0)),
+        checkpoint_dir=data.get("checkpoint_dir"),
+        ws_connections=int(data.get("ws_connections", 1)),
+        record_dir=data.get("record_dir"),
+        data_path=data.get("data_path"),
+        replay_speed=data.get("replay_speed", "max"),
+    )
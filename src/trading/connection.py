@@ -0,0 +1,284 @@
+"""Resilient websocket connections for KuCoin market data.
+
+:class:`ConnectionManager` spreads the topics over ``connections`` sockets,
+keeping every symbol's topics on one socket so their relative order holds.
+Each socket:
+
+* fetches a fresh URL (and token) and resubscribes on every connect,
+* sends KuCoin ``ping`` frames every ``ping_interval`` seconds and treats
+  a socket that stays silent ``ping_timeout`` seconds after a ping as
+  stalled; time spent waiting for room in a full queue is not silence,
+  as the socket is not being read then,
+* reconnects after a drop or stall with jittered exponential backoff.
+
+Data frames from all sockets are merged, raw, into one bounded queue that
+``async for`` drains; control frames (welcome, ack, pong) are consumed
+here. :meth:`ConnectionManager.stats` reports per-socket state, ping
+round-trip latency and message rate.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import websockets
+
+from .decoders import peek_topic
+
+LOGGER = logging.getLogger(__name__)
+
+# KuCoin accepts at most this many symbols in one subscribe frame
+MAX_SYMBOLS_PER_SUBSCRIBE = 100
+# queued by close() to end the consumers' iteration
+_CLOSED = object()
+
+
+def topic_symbol(topic: str) -> str:
+    """The symbol a topic is about; candle topics' ``_<interval>`` suffix is dropped."""
+    prefix, _, symbol = topic.partition(":")
+    if not symbol:
+        return topic
+    if prefix.endswith("/candles"):
+        symbol = symbol.rpartition("_")[0] or symbol
+    return symbol
+
+
+def shard_topics(topics: List[str], connections: int) -> List[List[str]]:
+    """Split ``topics`` into ``connections`` groups, all of a symbol's topics together."""
+    symbols: Dict[str, int] = {}
+    shards: List[List[str]] = [[] for _ in range(connections)]
+    for topic in topics:
+        symbol = topic_symbol(topic)
+        shard = symbols.setdefault(symbol, len(symbols) % connections)
+        shards[shard].append(topic)
+    return [s for s in shards if s]
+
+
+def subscriptions(topics: List[str]) -> List[str]:
+    """Topic strings to subscribe, symbols of one prefix joined by commas."""
+    by_prefix: Dict[str, List[str]] = {}
+    for topic in topics:
+        prefix, sep, symbol = topic.partition(":")
+        by_prefix.setdefault(prefix if sep else topic, []).append(symbol)
+    out = []
+    for prefix, symbols in by_prefix.items():
+        if symbols == [""]:
+            out.append(prefix)
+            continue
+        for i in range(0, len(symbols), MAX_SYMBOLS_PER_SUBSCRIBE):
+            out.append(f"{prefix}:{','.join(symbols[i:i + MAX_SYMBOLS_PER_SUBSCRIBE])}")
+    return out
+
+
+class _Connection:
+    """One socket of a :class:`ConnectionManager` and its counters."""
+
+    def __init__(self, manager: "ConnectionManager", shard: int, topics: List[str]):
+        self.manager = manager
+        self.shard = shard
+        self.topics = topics
+        self.ws = None
+        self.connected = False
+        self.connects = 0
+        self.stalls = 0
+        self.messages = 0
+        self.latency_ms = float("nan")
+        self.last_recv = 0.0
+        # when the reader last waited on a full queue, and whether it still is
+        self._released = 0.0
+        self._blocked = False
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._gap = 0.0
+        self._pings: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+
+    def stats(self) -> Dict[str, float]:
+        now = time.monotonic()
+        return {
+            "shard": self.shard,
+            "topics": len(self.topics),
+            "connected": self.connected,
+            "connects": self.connects,
+            "stalls": self.stalls,
+            "messages": self.messages,
+            "rate": 1.0 / self._gap if self._gap > 0 else 0.0,
+            "latency_ms": self.latency_ms,
+            "idle_s": now - self.last_recv if self.last_recv else float("nan"),
+        }
+
+    async def run(self) -> None:
+        manager = self.manager
+        delay = manager.backoff
+        while not manager.closed:
+            try:
+                url = await manager.url_factory()
+                async with websockets.connect(url, ping_interval=None, close_timeout=1) as ws:
+                    self.ws = ws
+                    self.connected = True
+                    self.connects += 1
+                    self.last_recv = time.monotonic()
+                    await self._subscribe(ws)
+                    delay = manager.backoff
+                    self._heartbeat = asyncio.create_task(self._beat(ws))
+                    self._heartbeat.add_done_callback(self._beat_done)
+                    try:
+                        async for raw in ws:
+                            await self._received(raw)
+                    finally:
+                        self._heartbeat.cancel()
+                        self._heartbeat = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                LOGGER.warning("connection %d failed: %s", self.shard, exc)
+            self.connected = False
+            self.ws = None
+            if manager.closed:
+                break
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, manager.max_backoff)
+
+    async def _subscribe(self, ws) -> None:
+        for topic in subscriptions(self.topics):
+            msg = {
+                "id": str(next(self._ids)),
+                "type": "subscribe",
+                "topic": topic,
+                "privateChannel": False,
+                "response": True,
+            }
+            await ws.send(json.dumps(msg))
+
+    async def _received(self, raw) -> None:
+        now = time.monotonic()
+        gap = now - self.last_recv
+        self.last_recv = now
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        if peek_topic(raw) is None:
+            self._control(json.loads(raw), now)
+            return
+        self.messages += 1
+        # EWMA of the gap between messages, about the last 100 messages
+        self._gap = gap if self.messages == 1 else self._gap + 0.02 * (gap - self._gap)
+        queue = self.manager.queue
+        if queue.full():
+            self._blocked = True
+            try:
+                await queue.put(raw)
+            finally:
+                self._blocked = False
+                self._released = time.monotonic()
+        else:
+            queue.put_nowait(raw)
+
+    def _control(self, msg: Dict, now: float) -> None:
+        kind = msg.get("type")
+        if kind == "pong":
+            sent = self._pings.pop(str(msg.get("id")), None)
+            if sent is not None:
+                self.latency_ms = (now - sent) * 1e3
+        elif kind == "error":
+            LOGGER.warning("connection %d error: %s", self.shard, msg)
+
+    def _beat_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if isinstance(exc, websockets.ConnectionClosed):
+            LOGGER.debug("connection %d heartbeat stopped: %s", self.shard, exc)
+        elif exc is not None:
+            LOGGER.warning("connection %d heartbeat failed: %r", self.shard, exc)
+
+    async def _beat(self, ws) -> None:
+        manager = self.manager
+        while True:
+            await asyncio.sleep(manager.ping_interval)
+            ping_id = str(next(self._ids))
+            sent = time.monotonic()
+            self._pings = {ping_id: sent}
+            await ws.send(json.dumps({"id": ping_id, "type": "ping"}))
+            await asyncio.sleep(manager.ping_timeout)
+            if max(self.last_recv, self._released) < sent and not self._blocked:
+                LOGGER.warning("connection %d stalled, reconnecting", self.shard)
+                self.stalls += 1
+                await ws.close()
+                return
+
+
+class ConnectionManager:
+    """Sharded, self-healing KuCoin websocket subscriptions.
+
+    ``url_factory`` returns a connectable URL, token included; it is
+    awaited on every (re)connect. Iterating the manager starts the sockets
+    and yields the raw text of every data frame; iteration ends once
+    :meth:`close` has run.
+    """
+
+    def __init__(
+        self,
+        url_factory: Callable[[], Awaitable[str]],
+        topics: List[str],
+        connections: int = 1,
+        ping_interval: float = 18.0,
+        ping_timeout: float = 10.0,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        queue_size: int = 10_000,
+    ):
+        if connections < 1:
+            raise ValueError("connections must be positive")
+        self.url_factory = url_factory
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.connections = [_Connection(self, i, t) for i, t in enumerate(shard_topics(topics, connections))]
+        self.closed = False
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(c.run()) for c in self.connections]
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        self.start()
+        while not self.closed:
+            raw = await self.queue.get()
+            if raw is _CLOSED:
+                # leave it for the other consumers
+                self.queue.put_nowait(_CLOSED)
+                return
+            yield raw
+
+    async def close(self) -> None:
+        self.closed = True
+        for task in self._tasks:
+            task.cancel()
+        for conn in self.connections:
+            if conn._heartbeat is not None:
+                conn._heartbeat.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # a consumer blocked in get() only wakes on a queued item
+        try:
+            self.queue.put_nowait(_CLOSED)
+        except asyncio.QueueFull:
+            pass
+
+    def stats(self) -> List[Dict[str, float]]:
+        return [c.stats() for c in self.connections]
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every socket is connected; False on timeout."""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(c.connected for c in self.connections):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
@@ -1,15 +1,16 @@
 import asyncio
-from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from .agents.base import BaseAgent, AgentResult
+from .clock import Clock, WALL_CLOCK
 from .consensus import compute_weights, weighted_consensus
 
 class MultiAgentCoordinator:
     """Run agents concurrently and return consensus results."""
 
-    def __init__(self, agents: List[BaseAgent]):
+    def __init__(self, agents: List[BaseAgent], clock: Optional[Clock] = None):
         self.agents = agents
+        self.clock = WALL_CLOCK if clock is None else clock
         self.transcripts: List[Dict[str, Any]] = []
 
     async def gather(self, market_slice: Dict) -> List[AgentResult]:
@@ -24,7 +25,7 @@ class MultiAgentCoordinator:
         weights = compute_weights(self.agents)
         consensus = await weighted_consensus(self.agents, results, weights)
         self.transcripts.append({
-            "ts": datetime.utcnow().isoformat(),
+            "ts": self.clock.now().isoformat(),
             "agents": {a.name: r.evidence for a, r in zip(self.agents, results)}
         })
         return consensus
@@ -0,0 +1,267 @@
+"""Rolling covariance, correlation and beta across every tracked symbol.
+
+Returns are aligned on a shared bar clock: the open row collects each
+symbol's return for the newest bar and is committed when any symbol moves
+to a later bar. Statistics are pairwise complete (a row only counts for a
+pair when both symbols have a value) and include the open row, the same
+way the per-symbol metrics include the open bar.
+
+Per tick only the symbol's open value changes, and a lookup reads one
+cell of each running-sum matrix. Committing a bar updates the N x N sums
+with a few numpy outer products.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .metrics_engine import SPAN_60D
+from .rolling import NAN
+
+_SUMS = ("n", "sx", "sxx", "sxy")
+
+
+class _PairSums:
+    """Pairwise-complete running sums over the committed rows of one window.
+
+    ``sx[i, j]`` is the sum of series ``i`` over rows where ``j`` is also
+    present (likewise ``sxx``), ``sxy`` the sum of products and ``n`` the
+    number of such rows. Rows are kept in a ring of ``window - 1`` slots;
+    empty slots hold NaN and contribute nothing, so :meth:`resync` is a
+    plain masked matrix product.
+    """
+
+    def __init__(self, window: int, size: int = 0):
+        self.window = window
+        self.rows = np.full((max(window - 1, 0), size), NAN)
+        self.head = 0
+        self.count = 0
+        self._pushes = 0
+        for name in _SUMS:
+            setattr(self, name, np.zeros((size, size)))
+
+    def grow(self, size: int) -> None:
+        extra = size - self.rows.shape[1]
+        self.rows = np.pad(self.rows, ((0, 0), (0, extra)), constant_values=NAN)
+        for name in _SUMS:
+            setattr(self, name, np.pad(getattr(self, name), ((0, extra), (0, extra))))
+
+    def _apply(self, x: np.ndarray, sign: float) -> None:
+        valid = ~np.isnan(x)
+        v = valid.astype(float)
+        x0 = np.where(valid, x, 0.0)
+        self.n += sign * np.outer(v, v)
+        self.sx += sign * np.outer(x0, v)
+        self.sxx += sign * np.outer(x0 * x0, v)
+        self.sxy += sign * np.outer(x0, x0)
+
+    def push(self, x: np.ndarray) -> None:
+        cap = len(self.rows)
+        if not cap:
+            return
+        if self.count == cap:
+            self._apply(self.rows[self.head], -1.0)
+        else:
+            self.count += 1
+        self.rows[self.head] = x
+        self._apply(x, 1.0)
+        self.head = (self.head + 1) % cap
+        self._pushes += 1
+        if self._pushes >= cap:
+            self._pushes = 0
+            self.resync()
+
+    def _column(self, i: int, a: float, row: np.ndarray, sign: float) -> None:
+        """Add (or remove) value ``a`` of series ``i`` in a row holding ``row``."""
+        valid = ~np.isnan(row)
+        valid[i] = False
+        v = valid.astype(float)
+        x0 = np.where(valid, row, 0.0)
+        self.n[i] += sign * v
+        self.n[:, i] += sign * v
+        self.n[i, i] += sign
+        self.sx[i] += sign * a * v
+        self.sx[:, i] += sign * x0
+        self.sx[i, i] += sign * a
+        self.sxx[i] += sign * a * a * v
+        self.sxx[:, i] += sign * x0 * x0
+        self.sxx[i, i] += sign * a * a
+        self.sxy[i] += sign * a * x0
+        self.sxy[:, i] += sign * a * x0
+        self.sxy[i, i] += sign * a * a
+
+    def revise(self, i: int, value: float) -> None:
+        """Replace series ``i`` in the newest committed row, O(N)."""
+        if not self.count:
+            return
+        row = self.rows[(self.head - 1) % len(self.rows)]
+        old = row[i]
+        if old == old:
+            self._column(i, old, row, -1.0)
+        if value == value:
+            self._column(i, value, row, 1.0)
+        row[i] = value
+
+    def resync(self) -> None:
+        valid = ~np.isnan(self.rows)
+        v = valid.astype(float)
+        x0 = np.where(valid, self.rows, 0.0)
+        self.n = v.T @ v
+        self.sx = x0.T @ v
+        self.sxx = (x0 * x0).T @ v
+        self.sxy = x0.T @ x0
+
+    def pair(self, i: int, j: int, a: float, b: float) -> Tuple[float, float, float]:
+        """Sample covariance and the two variances, with the open values."""
+        n = self.n[i, j]
+        sxi, sxj = self.sx[i, j], self.sx[j, i]
+        sxxi, sxxj = self.sxx[i, j], self.sxx[j, i]
+        sxy = self.sxy[i, j]
+        if a == a and b == b:
+            n += 1
+            sxi += a
+            sxj += b
+            sxxi += a * a
+            sxxj += b * b
+            sxy += a * b
+        if n < 2:
+            return NAN, NAN, NAN
+        cov = (sxy - sxi * sxj / n) / (n - 1)
+        var_i = max(sxxi - sxi * sxi / n, 0.0) / (n - 1)
+        var_j = max(sxxj - sxj * sxj / n, 0.0) / (n - 1)
+        return cov, var_i, var_j
+
+    def matrices(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Covariance matrix and per-pair variances of the row and column series."""
+        valid = ~np.isnan(x)
+        v = valid.astype(float)
+        x0 = np.where(valid, x, 0.0)
+        n = self.n + np.outer(v, v)
+        sx = self.sx + np.outer(x0, v)
+        sxx = self.sxx + np.outer(x0 * x0, v)
+        sxy = self.sxy + np.outer(x0, x0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denom = np.where(n >= 2, n - 1, np.nan)
+            cov = (sxy - sx * sx.T / n) / denom
+            var = np.maximum(sxx - sx * sx / n, 0.0) / denom
+        return cov, var, var.T
+
+
+class CrossAsset:
+    """Rolling cross-symbol statistics over one or more bar windows.
+
+    ``windows`` are bar counts on the shared clock, by default the 60 days
+    the beta has always been taken over; lookups default to the first. ``update`` takes epoch-ns bar stamps as used by the ring tables.
+    """
+
+    def __init__(self, windows: Iterable[int] = (SPAN_60D,)):
+        self.windows = tuple(windows)
+        if not self.windows:
+            raise ValueError("at least one window is required")
+        self.symbols: Dict[str, int] = {}
+        self.ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.open = np.empty(0)
+        self._sums = {w: _PairSums(w) for w in self.windows}
+
+    def _index(self, symbol: str) -> int:
+        i = self.symbols.get(symbol)
+        if i is None:
+            i = self.symbols[symbol] = len(self.symbols)
+            self.open = np.append(self.open, NAN)
+            for sums in self._sums.values():
+                sums.grow(len(self.symbols))
+        return i
+
+    def update(self, symbol: str, ts: int, value: float) -> None:
+        """Set ``symbol``'s return for the bar stamped ``ts``.
+
+        A later stamp commits the open row first. A value for the newest
+        committed bar revises it; anything older is ignored.
+        """
+        i = self._index(symbol)
+        if self.ts is None or ts > self.ts:
+            if self.ts is not None:
+                for sums in self._sums.values():
+                    sums.push(self.open)
+                self.last_ts = self.ts
+            self.open = np.full(len(self.symbols), NAN)
+            self.ts = ts
+        if ts == self.ts:
+            self.open[i] = value
+        elif ts == self.last_ts:
+            for sums in self._sums.values():
+                sums.revise(i, value)
+
+    def _pair(self, a: str, b: str, window: Optional[int]) -> Tuple[float, float, float]:
+        i = self.symbols.get(a)
+        j = self.symbols.get(b)
+        if i is None or j is None:
+            return NAN, NAN, NAN
+        sums = self._sums[window or self.windows[0]]
+        return sums.pair(i, j, self.open[i], self.open[j])
+
+    def covariance(self, a: str, b: str, window: Optional[int] = None) -> float:
+        return self._pair(a, b, window)[0]
+
+    def correlation(self, a: str, b: str, window: Optional[int] = None) -> float:
+        cov, var_a, var_b = self._pair(a, b, window)
+        denom = np.sqrt(var_a * var_b)
+        return cov / denom if denom > 0 else NAN
+
+    def beta(self, symbol: str, reference: str, window: Optional[int] = None) -> float:
+        """Slope of ``symbol``'s returns on ``reference``'s returns."""
+        cov, _, var_ref = self._pair(symbol, reference, window)
+        return cov / (var_ref + 1e-9)
+
+    def matrix(self, kind: str = "correlation", window: Optional[int] = None) -> pd.DataFrame:
+        """All pairs at once: ``"covariance"``, ``"correlation"`` or ``"beta"``.
+
+        For ``"beta"`` rows are the symbol and columns the reference.
+        """
+        cov, var_row, var_col = self._sums[window or self.windows[0]].matrices(self.open)
+        if kind == "covariance":
+            out = cov
+        elif kind == "correlation":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = cov / np.sqrt(var_row * var_col)
+        elif kind == "beta":
+            out = cov / (var_col + 1e-9)
+        else:
+            raise ValueError(f"Unknown matrix kind: {kind}")
+        names = list(self.symbols)
+        return pd.DataFrame(out, index=names, columns=names)
+
+    def seed(self, returns: pd.DataFrame) -> None:
+        """Reset from a frame of returns (rows are bars, columns symbols).
+
+        The last row becomes the open row.
+        """
+        self.symbols = {sym: i for i, sym in enumerate(returns.columns)}
+        stamps = returns.index.as_unit("ns").asi8
+        values = returns.to_numpy(float)
+        self.ts = int(stamps[-1]) if len(stamps) else None
+        self.last_ts = int(stamps[-2]) if len(stamps) > 1 else None
+        self.open = values[-1].copy() if len(values) else np.empty(len(self.symbols))
+        for w in self.windows:
+            sums = self._sums[w] = _PairSums(w, len(self.symbols))
+            cap = len(sums.rows)
+            committed = values[:-1][-cap:] if cap else values[:0]
+            sums.count = len(committed)
+            sums.rows[: sums.count] = committed
+            sums.head = sums.count % cap if cap else 0
+            sums.resync()
+
+
+def rolling_betas(
+    returns: pd.DataFrame, reference: str, window: int = SPAN_60D, min_periods: int = 2
+) -> pd.DataFrame:
+    """Vectorised :meth:`CrossAsset.beta` for every row of ``returns``."""
+    ref = returns[reference]
+    out: Dict[str, pd.Series] = {}
+    for sym in returns.columns:
+        own = returns[sym]
+        cov = own.rolling(window, min_periods=min_periods).cov(ref)
+        var = ref.where(own.notna()).rolling(window, min_periods=min_periods).var()
+        out[sym] = cov / (var + 1e-9)
+    return pd.DataFrame(out, index=returns.index)
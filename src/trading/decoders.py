@@ -0,0 +1,202 @@
+"""Topic-routed decoding of KuCoin futures websocket frames.
+
+:class:`TopicDecoder` reads a frame's topic straight from the raw text,
+drops frames whose topic nobody asked for without parsing them, and turns
+the rest into compact records: named tuples with epoch-ms ``ts``, and
+order books as ``(levels, 2)`` float arrays. Routed frames are still
+parsed whole, with :func:`loads`: ``orjson`` (a declared dependency), or
+:func:`json.loads` where it is missing. Skipping unwanted topics is what
+the routing saves; a routed frame costs a parse plus building its record.
+"""
+import json
+from itertools import chain
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Union
+
+import numpy as np
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - fallback for minimal installs
+    loads = json.loads
+
+
+class Trade(NamedTuple):
+    symbol: str
+    ts: int
+    price: float
+    size: float
+    side: str
+    trade_id: str
+
+
+class Candle(NamedTuple):
+    symbol: str
+    interval: str
+    ts: int
+    open: float
+    close: float
+    high: float
+    low: float
+    volume: float
+    turnover: float
+
+
+class BookChange(NamedTuple):
+    symbol: str
+    ts: int
+    sequence: int
+    price: float
+    side: str
+    size: float
+
+
+class BookSnapshot(NamedTuple):
+    symbol: str
+    ts: int
+    bids: np.ndarray
+    asks: np.ndarray
+
+
+class Funding(NamedTuple):
+    symbol: str
+    ts: int
+    rate: float
+
+
+class OpenInterest(NamedTuple):
+    symbol: str
+    ts: int
+    value: float
+
+
+class Liquidation(NamedTuple):
+    symbol: str
+    ts: int
+    price: float
+    size: float
+    side: str
+
+
+def _ms(data: Dict, *keys: str) -> int:
+    """First present timestamp among ``keys`` in epoch ms; ns and us are scaled down."""
+    for key in keys:
+        value = data.get(key)
+        if value is not None:
+            value = int(value)
+            if value > 10**17:
+                return value // 10**6
+            if value > 10**14:
+                return value // 10**3
+            return value
+    return 0
+
+
+def _levels(levels) -> np.ndarray:
+    return np.fromiter(chain.from_iterable(levels), dtype=np.float64, count=2 * len(levels)).reshape(-1, 2)
+
+
+def decode_execution(symbol: str, data: Dict) -> Trade:
+    return Trade(
+        symbol, _ms(data, "ts", "time"), float(data["price"]), float(data["size"]),
+        data.get("side", ""), str(data.get("tradeId", "")),
+    )
+
+
+def decode_candles(symbol: str, data: Dict) -> Candle:
+    symbol, _, interval = symbol.rpartition("_")
+    start, o, c, h, low, volume, turnover = data["candles"][:7]
+    return Candle(
+        symbol, interval, int(start) * 1000, float(o), float(c), float(h), float(low), float(volume), float(turnover)
+    )
+
+
+def decode_level2(symbol: str, data: Dict) -> Union[BookChange, BookSnapshot]:
+    """Incremental ``change`` updates, or whole books with ``bids``/``asks``."""
+    change = data.get("change")
+    if change is not None:
+        price, side, size = change.split(",")
+        return BookChange(symbol, _ms(data, "timestamp", "ts"), int(data.get("sequence", 0)), float(price), side, float(size))
+    return BookSnapshot(symbol, _ms(data, "timestamp", "ts"), _levels(data["bids"]), _levels(data["asks"]))
+
+
+def decode_funding(symbol: str, data: Dict) -> Funding:
+    return Funding(symbol, _ms(data, "timestamp", "ts"), float(data["fundingRate"]))
+
+
+def decode_open_interest(symbol: str, data: Dict) -> OpenInterest:
+    return OpenInterest(symbol, _ms(data, "timestamp", "ts"), float(data["openInterest"]))
+
+
+def decode_liquidation(symbol: str, data: Dict) -> Liquidation:
+    return Liquidation(
+        symbol, _ms(data, "ts", "timestamp"), float(data.get("price", "nan")), float(data.get("size", 0.0)),
+        data.get("side", ""),
+    )
+
+
+# topic prefix -> decoder taking the topic's symbol and the frame's data
+DECODERS: Dict[str, Callable[[str, Dict], tuple]] = {
+    "/contractMarket/execution": decode_execution,
+    "/contractMarket/candles": decode_candles,
+    "/contractMarket/level2": decode_level2,
+    "/contractMarket/fundingRate": decode_funding,
+    "/contractMarket/openInterest": decode_open_interest,
+    "/contractMarket/LiquidationOrders": decode_liquidation,
+}
+
+
+def peek_topic(raw: str) -> Optional[str]:
+    """The frame's topic read from the text, or None for control frames.
+
+    KuCoin puts ``topic`` ahead of ``data``, so the first ``"topic"`` key
+    is the frame's own.
+    """
+    i = raw.find('"topic"')
+    if i < 0:
+        return None
+    start = raw.find('"', raw.find(":", i + 7) + 1) + 1
+    end = raw.find('"', start)
+    if start <= 0 or end < 0:
+        return None
+    return raw[start:end]
+
+
+class TopicDecoder:
+    """Decode the frames of ``topics`` (prefixes of :data:`DECODERS`, default all).
+
+    Control frames and frames of other topics are counted in ``dropped``
+    and never parsed.
+    """
+
+    def __init__(self, topics: Optional[Iterable[str]] = None):
+        topics = list(DECODERS if topics is None else topics)
+        unknown = set(topics) - set(DECODERS)
+        if unknown:
+            raise ValueError(f"no decoder for topics: {', '.join(sorted(unknown))}")
+        self.routes = {topic: DECODERS[topic] for topic in topics}
+        self.decoded = 0
+        self.dropped = 0
+
+    def register(self, prefix: str, decoder: Callable[[str, Dict], tuple]) -> None:
+        """Route ``prefix`` to a custom decoder."""
+        self.routes[prefix] = decoder
+
+    def decode(self, raw: Union[str, bytes]) -> Optional[tuple]:
+        if not isinstance(raw, str):
+            raw = raw.decode()
+        topic = peek_topic(raw)
+        route = None
+        if topic is not None:
+            prefix, _, symbol = topic.partition(":")
+            route = self.routes.get(prefix)
+        if route is None:
+            self.dropped += 1
+            return None
+        record = route(symbol, loads(raw)["data"])
+        self.decoded += 1
+        return record
+
+    def stats(self) -> Dict[str, int]:
+        return {"decoded": self.decoded, "dropped": self.dropped}
@@ -1,79 +1,472 @@
+import logging
+
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Callable, Any
+from typing import Dict, Iterable, List, Callable, Any, Optional, Set
+
+from .backfill import align, build_bars
+from .book_metrics import DEPTH_PCTS, SLIPPAGE_USD, BookMetrics
+from .checkpoint import Checkpointer
+from .columnar import RingTable
+from .cross_asset import CrossAsset, rolling_betas
+from .fanout import Subscription
+from .metrics_engine import SPAN_20D, SPAN_24H, SPAN_60D, MetricsEngine
+from .metrics_store import BackgroundWriter, ColumnStore
+from .tail_risk import TailRisk
+
+LOGGER = logging.getLogger(__name__)
+
+REFERENCE_SYMBOL = "BTCUSDTM"
+
+BASE_COLUMNS = [
+    "Open",
+    "High",
+    "Low",
+    "LastPrice",
+    "SpotPrice",
+    "FundingRate",
+    "OpenInterest",
+    "LongOI",
+    "ShortOI",
+    "MarketCap",
+    "VWAP_numerator",
+    "Volume",
+    "CVD",
+    "TradeCount",
+    "AdverseSelectionCost",
+    "LiquidationPressureBuy",
+    "LiquidationPressureSell",
+    "LiquidationClusterDensity",
+]
+
+# Order book snapshot taken at the last tick of each bar.
+BOOK_COLUMNS = BookMetrics().columns
+
+# Columns that depend on another symbol's table.
+CROSS_COLUMNS = ["BetaBTC", "CrossExchangeBasis"]
+
+COLUMNS = BASE_COLUMNS + [
+    "VWAP",
+    "VWAPDeviation",
+    "BasisPremium",
+    "FundingRateΔ_1h",
+    "FundingRateΔ_24h",
+    "AnnualizedFunding",
+    "PredictedFunding",
+    "BasisMomentum_1m",
+    "BasisMomentum_5m",
+    "BasisMomentum_1h",
+    "OIΔ_1m",
+    "OIΔ_5m",
+    "OIΔ_1h",
+    "OpenInterestUSD",
+    "LeverageRatio",
+    "LongShortRatio",
+    "NetOIFlow",
+    "OrderBookImbalance",
+    "Return",
+    "RealizedVolatility_5m",
+    "RealizedVolatility_1h",
+    "RealizedVolatility_24h",
+    "VolatilityImpulse",
+    "VolOfVol",
+    "BetaBTC",
+    "CrossExchangeBasis",
+    "ValueAtRisk_95",
+    "ExpectedShortfall_95",
+    "MaxAdverseExcursion",
+    "KellyFraction",
+    "MomentumScore",
+    "ZScoreReturns",
+    "BollingerBandwidth",
+    "ATRBandsWidth",
+    "KeltnerChannelWidth",
+    "DepthAt0_1pct",
+    "DepthAt0_5pct",
+    "LiquiditySlope",
+    "BidAskSpread",
+    "QuotedSpread",
+    "MicroPrice",
+    "SlippageCost1kUSD",
+    "CumulativeFunding",
+    "CumulativeFundingAbsolute",
+    "FundingVolatility",
+    "FundingLeverageCompositeIndex",
+    "RSI",
+    "StochasticRSI",
+    "OBV",
+    "TRIX",
+    "ChaikinMoneyFlow",
+    "MoneyFlowIndex",
+    "TWAP",
+    "TWAPDeviation",
+    "HV10d",
+    "HV20d",
+    "WinLossRatio",
+    "RollingSharpeRatio",
+    "RollingSortinoRatio",
+    "UlcerIndex",
+    "AggressorVolumeDelta",
+    "NetAggressorVolumeFlow",
+    "FlowImbalance",
+    "MeanTradeSize",
+    "TradeIntensity",
+    "LiquidationVolumeBuy",
+    "LiquidationVolumeSell",
+    "PendingLiquidationPressure",
+    "LiquidityStressIndex",
+]
+
+
+# Bounded-range indicators are stored as float32, counters as int32 and
+# everything else (prices, cumulative sums, returns) as float64.
+_FLOAT32_COLUMNS = {
+    "OrderBookImbalance",
+    "LongShortRatio",
+    "KellyFraction",
+    "MomentumScore",
+    "ZScoreReturns",
+    "BollingerBandwidth",
+    "ATRBandsWidth",
+    "KeltnerChannelWidth",
+    "RSI",
+    "StochasticRSI",
+    "ChaikinMoneyFlow",
+    "MoneyFlowIndex",
+    "WinLossRatio",
+    "RollingSharpeRatio",
+    "RollingSortinoRatio",
+    "UlcerIndex",
+    "LiquidityStressIndex",
+}
+_INT32_COLUMNS = {"TradeCount", "TradeIntensity"}
+
+SCHEMA = {
+    col: np.int32 if col in _INT32_COLUMNS else np.float32 if col in _FLOAT32_COLUMNS else np.float64
+    for col in dict.fromkeys(COLUMNS)
+}
+
+
+def _tail_risk(returns: pd.Series, window: int, mode: str) -> np.ndarray:
+    """VaR, expected shortfall and max adverse excursion for every bar."""
+    tail = TailRisk(window, q=0.05, mode=mode)
+    out = np.empty((len(returns), 3))
+    for i, r in enumerate(returns.to_numpy(float)):
+        out[i] = tail.peek(r)
+        tail.push(r)
+    return out
+
+
+def batch_metrics(bars: pd.DataFrame, tail_window: int = SPAN_24H, tail_mode: str = "exact") -> pd.DataFrame:
+    """Compute every per-symbol column over a whole table of 1-minute bars.
+
+    ``bars`` must hold ``BASE_COLUMNS`` and ``BOOK_COLUMNS``. This is the
+    reference the streaming engine is checked against and the per-symbol
+    pass of :meth:`DerivedMetrics.backfill`; cross-symbol columns are left
+    as NaN.
+    """
+    df = bars[BASE_COLUMNS + BOOK_COLUMNS].astype(float)
+    df["VWAP"] = df["VWAP_numerator"] / df["Volume"].replace(0, np.nan)
+    df["VWAPDeviation"] = (df["LastPrice"] - df["VWAP"]) / df["VWAP"]
+    df["BasisPremium"] = (df["LastPrice"] - df["SpotPrice"]) / df["SpotPrice"]
+    df["FundingRateΔ_1h"] = df["FundingRate"].diff(60)
+    df["FundingRateΔ_24h"] = df["FundingRate"].diff(60 * 24)
+    df["AnnualizedFunding"] = df["FundingRate"] * 3 * 365
+    df["PredictedFunding"] = df["FundingRate"].rolling(8).mean()
+    df["BasisMomentum_1m"] = df["BasisPremium"].diff(1)
+    df["BasisMomentum_5m"] = df["BasisPremium"].diff(5)
+    df["BasisMomentum_1h"] = df["BasisPremium"].diff(60)
+    df["OIΔ_1m"] = df["OpenInterest"].diff(1)
+    df["OIΔ_5m"] = df["OpenInterest"].diff(5)
+    df["OIΔ_1h"] = df["OpenInterest"].diff(60)
+    df["OpenInterestUSD"] = df["OpenInterest"] * df["LastPrice"]
+    df["LeverageRatio"] = df["OpenInterest"] / (df["MarketCap"] + 1e-9)
+    df["LongShortRatio"] = df["LongOI"] / (df["ShortOI"] + 1e-9)
+    df["NetOIFlow"] = df["LongOI"].diff().fillna(0) - df["ShortOI"].diff().fillna(0)
+    df["Return"] = df["LastPrice"].pct_change().fillna(0)
+    df["RealizedVolatility_5m"] = df["Return"].rolling(5).std() * np.sqrt(5)
+    df["RealizedVolatility_1h"] = df["Return"].rolling(60).std() * np.sqrt(60)
+    df["RealizedVolatility_24h"] = df["Return"].rolling(60 * 24).std() * np.sqrt(60 * 24)
+    df["VolatilityImpulse"] = df["RealizedVolatility_5m"].diff()
+    df["VolOfVol"] = df["RealizedVolatility_5m"].rolling(20).std()
+    var_window = df["Return"].rolling(60 * 24)
+    tail = _tail_risk(df["Return"], tail_window, tail_mode)
+    df["ValueAtRisk_95"] = tail[:, 0]
+    df["ExpectedShortfall_95"] = tail[:, 1]
+    df["MaxAdverseExcursion"] = tail[:, 2]
+    mean_r = var_window.mean()
+    var_r = var_window.var() + 1e-9
+    df["KellyFraction"] = mean_r / var_r
+    sharpe_24h = (df["Return"].rolling(60 * 24).mean()) / (df["Return"].rolling(60 * 24).std() + 1e-9)
+    momentum = np.sign(df["Return"].rolling(60).sum())
+    df["MomentumScore"] = sharpe_24h * momentum
+    df["ZScoreReturns"] = (df["Return"] - df["Return"].rolling(60).mean()) / (
+        df["Return"].rolling(60).std() + 1e-9
+    )
+
+    ma20 = df["LastPrice"].rolling(20).mean()
+    std20 = df["LastPrice"].rolling(20).std()
+    upper = ma20 + 2 * std20
+    lower = ma20 - 2 * std20
+    df["BollingerBandwidth"] = (upper - lower) / (ma20 + 1e-9)
+
+    ema20 = df["LastPrice"].ewm(span=20, adjust=False).mean()
+    high_low = df["High"] - df["Low"]
+    tr1 = high_low
+    tr2 = (df["High"] - df["LastPrice"].shift(1)).abs()
+    tr3 = (df["Low"] - df["LastPrice"].shift(1)).abs()
+    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+    atr14 = tr.rolling(14).mean()
+    df["ATRBandsWidth"] = (2 * atr14) / (df["LastPrice"] + 1e-9)
+    df["KeltnerChannelWidth"] = (4 * atr14) / (ema20 + 1e-9)
+
+    df["CumulativeFunding"] = df["FundingRate"].cumsum()
+    df["CumulativeFundingAbsolute"] = df["FundingRate"].abs().cumsum()
+    df["FundingVolatility"] = df["FundingRate"].rolling(60 * 24).std()
+    df["FundingLeverageCompositeIndex"] = df["FundingRate"] * df["LeverageRatio"]
+
+    delta = df["LastPrice"].diff()
+    up = delta.clip(lower=0)
+    down = -delta.clip(upper=0)
+    roll_up = up.rolling(14).mean()
+    roll_down = down.rolling(14).mean()
+    rs = roll_up / (roll_down + 1e-9)
+    rsi = 100 - 100 / (1 + rs)
+    df["RSI"] = rsi
+
+    min_rsi = rsi.rolling(14).min()
+    max_rsi = rsi.rolling(14).max()
+    df["StochasticRSI"] = (rsi - min_rsi) / (max_rsi - min_rsi + 1e-9)
+
+    direction = np.sign(delta.fillna(0))
+    df["OBV"] = (direction * df["Volume"]).cumsum()
+
+    ema1 = df["LastPrice"].ewm(span=9, adjust=False).mean()
+    ema2 = ema1.ewm(span=9, adjust=False).mean()
+    ema3 = ema2.ewm(span=9, adjust=False).mean()
+    df["TRIX"] = ema3.pct_change() * 100
+
+    mf_mul = ((df["LastPrice"] - df["Low"]) - (df["High"] - df["LastPrice"])) / (df["High"] - df["Low"] + 1e-9)
+    mf_vol = mf_mul * df["Volume"]
+    df["ChaikinMoneyFlow"] = mf_vol.rolling(20).sum() / df["Volume"].rolling(20).sum().replace(0, np.nan)
+
+    typical_price = (df["High"] + df["Low"] + df["LastPrice"]) / 3
+    money_flow = typical_price * df["Volume"]
+    pos_mf = money_flow.where(typical_price > typical_price.shift(1), 0.0)
+    neg_mf = money_flow.where(typical_price < typical_price.shift(1), 0.0)
+    mf_ratio = pos_mf.rolling(14).sum() / (neg_mf.rolling(14).sum().abs() + 1e-9)
+    df["MoneyFlowIndex"] = 100 - (100 / (1 + mf_ratio))
+
+    df["TWAP"] = df["LastPrice"].rolling(20).mean()
+    df["TWAPDeviation"] = (df["LastPrice"] - df["TWAP"]) / (df["TWAP"] + 1e-9)
+
+    span_10d = 60 * 24 * 10
+    span_20d = 60 * 24 * 20
+    df["HV10d"] = df["Return"].rolling(span_10d).std() * np.sqrt(span_10d)
+    df["HV20d"] = df["Return"].rolling(span_20d).std() * np.sqrt(span_20d)
+    wins = (df["Return"] > 0).astype(float).rolling(60).sum()
+    losses = (df["Return"] < 0).astype(float).rolling(60).sum()
+    df["WinLossRatio"] = wins / (losses + 1e-9)
+    df["RollingSharpeRatio"] = (
+        df["Return"].rolling(60 * 24).mean()
+        / (df["Return"].rolling(60 * 24).std() + 1e-9)
+    )
+    downside = np.sqrt(np.square(np.minimum(0, df["Return"])).rolling(60 * 24).mean())
+    df["RollingSortinoRatio"] = (
+        df["Return"].rolling(60 * 24).mean() / (downside + 1e-9)
+    )
+    drawdown = (df["LastPrice"] / df["LastPrice"].cummax()) - 1
+    df["UlcerIndex"] = np.sqrt((drawdown.pow(2)).rolling(14).mean())
+
+    df["AggressorVolumeDelta"] = df["CVD"].diff().fillna(0)
+    df["NetAggressorVolumeFlow"] = df["AggressorVolumeDelta"].rolling(5).sum()
+    vol_delta = df["Volume"].diff().replace(0, np.nan)
+    df["FlowImbalance"] = df["AggressorVolumeDelta"] / vol_delta
+    df["MeanTradeSize"] = vol_delta / df["TradeCount"].replace(0, np.nan)
+    df["TradeIntensity"] = df["TradeCount"]
+    df["LiquidationVolumeBuy"] = df["LiquidationPressureBuy"]
+    df["LiquidationVolumeSell"] = df["LiquidationPressureSell"]
+    df["PendingLiquidationPressure"] = df["LiquidationPressureBuy"].diff().fillna(0) - df["LiquidationPressureSell"].diff().fillna(0)
+    df["LiquidityStressIndex"] = (
+        df["QuotedSpread"].rolling(5).mean()
+        / (df["DepthAt0_5pct"].rolling(5).mean() + 1e-9)
+    )
+    return df.reindex(columns=COLUMNS)
 
 
 class DerivedMetrics:
-    """Compute high level analytics from futures market data."""
+    """Compute high level analytics from futures market data.
+
+    Finished bars are handed to a :class:`BackgroundWriter` that appends
+    them to a :class:`ColumnStore` under ``store_path``; ticks never wait on
+    disk. Subscribers are fed the same way through per-subscriber queues
+    (:mod:`trading.fanout`). Call :meth:`close` to deliver and write out
+    what is still queued.
+
+    Each symbol keeps its last ``capacity`` bars in memory in a
+    :class:`RingTable`, which holds every row twice: with the standard
+    columns that is about 36 MB per symbol at the 20-day default. Lower
+    ``capacity`` for large universes; older bars stay readable from the
+    store.
+
+    :attr:`master` is materialised on first access after a change and only
+    the symbols updated since the last access are copied again; use
+    :meth:`latest` or :meth:`between` when the whole universe isn't needed.
+
+    With ``columns`` only those metrics, what they depend on, and whatever
+    consumers later declare through :meth:`require` or :meth:`subscribe`
+    are computed; other columns stay NaN. ``columns=None`` computes all.
 
-    def __init__(self, store_path: str = "metrics.h5"):
+    ``BetaBTC`` and ``CrossExchangeBasis`` are taken against ``reference``.
+    Betas come from :attr:`cross`, a :class:`CrossAsset` over
+    ``cross_windows`` (the first, 60 days by default, is used for
+    ``BetaBTC``) that other components can query for any pair of tracked
+    symbols. Backfill and :meth:`restore` seed it from the last
+    ``capacity`` rows only; it fills up to the full window as bars stream in.
+
+    Order book columns come from :attr:`book`, a :class:`BookMetrics` for
+    ``depth_pcts`` and ``slippage_usd``; bands and sizes beyond the
+    standard ``DepthAt0_1pct``, ``DepthAt0_5pct`` and ``SlippageCost1kUSD``
+    add columns such as ``DepthAt1pct`` or ``SlippageCost10kUSD``.
+
+    With ``checkpoint_dir`` a symbol's engine is snapshotted there at the
+    first bar change after every ``checkpoint_interval`` seconds and on
+    :meth:`close`; :meth:`restore` warm starts from those snapshots and
+    the store.
+    """
+
+    def __init__(
+        self,
+        store_path: str = "metrics_store",
+        capacity: int = SPAN_20D,
+        tail_window: int = SPAN_24H,
+        tail_mode: str = "exact",
+        flush_interval: float = 1.0,
+        flush_rows: int = 1024,
+        max_rows: int = 10_000,
+        fsync: str = "flush",
+        columns: Optional[Iterable[str]] = None,
+        reference: str = REFERENCE_SYMBOL,
+        cross_windows: Iterable[int] = (SPAN_60D,),
+        depth_pcts: Iterable[float] = DEPTH_PCTS,
+        slippage_usd: Iterable[float] = SLIPPAGE_USD,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: float = 300.0,
+    ):
+        self.book = BookMetrics(depth_pcts, slippage_usd)
+        self.schema = {**SCHEMA, **{col: np.float64 for col in self.book.columns if col not in SCHEMA}}
         self.store_path = store_path
-        self.tables: Dict[str, pd.DataFrame] = {}
-        self.subscribers: List[Callable[[str, pd.Series], Any]] = []
-        self.master = pd.DataFrame()
+        self.store = ColumnStore(store_path, self.schema)
+        self.writer = BackgroundWriter(self.store, flush_interval, flush_rows, max_rows, fsync)
+        self.checkpointer = None if checkpoint_dir is None else Checkpointer(checkpoint_dir, checkpoint_interval)
+        self.capacity = capacity
+        self.tail_window = tail_window
+        self.tail_mode = tail_mode
+        self.columns: Optional[Set[str]] = None if columns is None else set(columns)
+        self.reference = reference
+        self.cross = CrossAsset(cross_windows)
+        self.tables: Dict[str, RingTable] = {}
+        self.engines: Dict[str, MetricsEngine] = {}
+        self.subscribers: List[Subscription] = []
+        self._parts: Dict[str, pd.DataFrame] = {}
+        self._stale: Set[str] = set()
+        self._master: Optional[pd.DataFrame] = None
+        # last stored bar per restored symbol, so it isn't persisted twice
+        self._stored: Dict[str, int] = {}
 
-    def subscribe(self, callback: Callable[[str, pd.Series], Any]) -> None:
-        self.subscribers.append(callback)
+    def require(self, columns: Iterable[str]) -> None:
+        """Declare columns a consumer reads so they are computed from now on."""
+        columns = set(columns)
+        unknown = columns - set(self.schema)
+        if unknown:
+            raise KeyError(f"Unknown metric columns: {sorted(unknown)}")
+        if self.columns is None:
+            return
+        self.columns |= columns
+        for engine in self.engines.values():
+            engine.require(columns)
 
-    def _persist(self, symbol: str) -> None:
-        df = self.tables[symbol]
-        try:
-            df.to_hdf(self.store_path, key=symbol, mode="a")
-        except Exception as exc:  # pragma: no cover - IO errors shouldn't crash
-            print(f"Persist failed for {symbol}: {exc}")
+    def subscribe(
+        self,
+        callback: Callable[..., Any],
+        columns: Optional[Iterable[str]] = None,
+        policy: str = "all",
+        max_queue: int = 10_000,
+        batch_ms: float = 100.0,
+    ) -> Subscription:
+        """Deliver every updated row to ``callback`` on its own thread.
+
+        ``callback(symbol, row)`` is called for the ``"all"`` and
+        ``"latest"`` policies and ``callback([(symbol, row), ...])`` for
+        ``"batch"``; see :mod:`trading.fanout`. With ``columns`` the row is
+        cut down to them and they are declared via :meth:`require`.
+        """
+        if columns is not None:
+            columns = list(columns)
+            self.require(columns)
+        sub = Subscription(callback, columns, policy, max_queue, batch_ms)
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        """Stop delivering to ``sub`` once its queued rows are out."""
+        self.subscribers.remove(sub)
+        sub.close()
+
+    def subscriber_stats(self) -> List[Dict[str, float]]:
+        """Queue depth, lag and delivered/dropped counts per subscriber."""
+        return [dict(sub.stats(), name=sub.name) for sub in self.subscribers]
+
+    def _engine(self) -> MetricsEngine:
+        return MetricsEngine(self.tail_window, self.tail_mode, self.columns)
+
+    def _persist(self, symbol: str, rows: pd.DataFrame) -> None:
+        self.writer.submit(symbol, rows)
+
+    def persistence_stats(self) -> Dict[str, int]:
+        """Writer queue depth and written/dropped row counts."""
+        return self.writer.stats()
+
+    def close(self) -> None:
+        for sub in self.subscribers:
+            sub.close()
+        self.writer.close()
+        if self.checkpointer is not None:
+            self.checkpoint()
+            self.checkpointer.close()
+
+    def checkpoint(self, symbols: Optional[Iterable[str]] = None) -> None:
+        """Snapshot the engines of ``symbols`` (every symbol by default) now."""
+        if self.checkpointer is None:
+            raise RuntimeError("DerivedMetrics has no checkpoint_dir")
+        for symbol in self._symbols(symbols):
+            self.checkpointer.save(symbol, self.engines[symbol].snapshot())
 
     def _broadcast(self, symbol: str, row: pd.Series) -> None:
-        for cb in self.subscribers:
-            cb(symbol, row)
-
-    def _orderbook_imbalance(self, orderbook: Dict, pct: float = 0.01) -> float:
-        bids = orderbook.get("bids", [])
-        asks = orderbook.get("asks", [])
-        if not bids or not asks:
-            return 0.0
-        mid = (bids[0][0] + asks[0][0]) / 2
-        threshold = mid * pct
-        bid_depth = sum(size for price, size in bids if price >= mid - threshold)
-        ask_depth = sum(size for price, size in asks if price <= mid + threshold)
-        total = bid_depth + ask_depth
-        if total == 0:
-            return 0.0
-        return (bid_depth - ask_depth) / total
-
-    def _max_adverse_excursion(self, returns: pd.Series) -> float:
-        cum = (1 + returns).cumprod()
-        cum_max = cum.cummax()
-        drawdown = (cum - cum_max) / cum_max
-        return float(drawdown.min())
-
-    def _depth_at_pct(self, orderbook: Dict, pct: float) -> tuple[float, float]:
-        bids = orderbook.get("bids", [])
-        asks = orderbook.get("asks", [])
-        if not bids or not asks:
-            return 0.0, 0.0
-        mid = (bids[0][0] + asks[0][0]) / 2
-        th = mid * pct
-        bid_d = sum(size for price, size in bids if price >= mid - th)
-        ask_d = sum(size for price, size in asks if price <= mid + th)
-        return bid_d, ask_d
-
-    def _slippage_cost(self, orderbook: Dict, usd: float) -> float:
-        asks = orderbook.get("asks", [])
-        if not asks:
-            return 0.0
-        qty = usd / asks[0][0]
-        remain = qty
-        cost = 0.0
-        for price, size in asks:
-            take = min(size, remain)
-            cost += take * price
-            remain -= take
-            if remain <= 0:
-                break
-        if remain > 0:
-            cost += remain * asks[-1][0]
-        avg_price = cost / qty
-        return (avg_price - asks[0][0]) / asks[0][0]
+        for sub in self.subscribers:
+            sub.offer(symbol, row)
+
+    def _cross_asset(self, symbol: str, row: Dict[str, float]) -> None:
+        table = self.tables[symbol]
+        outputs = self.engines[symbol].outputs
+        beta = "BetaBTC" in outputs
+        basis = "CrossExchangeBasis" in outputs
+        if "Return" in outputs:
+            self.cross.update(symbol, table.last_ts, row["Return"])
+        if symbol == self.reference:
+            if beta:
+                table.set("BetaBTC", 1.0)
+            if basis:
+                table.set("CrossExchangeBasis", 0.0)
+            return
+        ref = self.tables.get(self.reference)
+        if ref is None or not (beta or basis):
+            return
+        if beta:
+            table.set("BetaBTC", self.cross.beta(symbol, self.reference))
+        pos = ref.locate(table.last_ts)
+        if basis and pos >= 0:
+            table.set("CrossExchangeBasis", table.value("BasisPremium") - ref.value("BasisPremium", pos))
 
     def update(
         self,
@@ -82,84 +475,16 @@ class DerivedMetrics:
         funding: Dict,
         oi: Dict,
         liquidations: List[Dict],
-    ) -> pd.DataFrame:
-        """Update metrics using a new tick and return the full master table."""
+    ) -> pd.Series:
+        """Update metrics using a new tick and return the symbol's latest row.
+
+        Only the open bar is recomputed; see :class:`MetricsEngine`.
+        """
         symbol = raw_tick.get("symbol")
         ts = pd.to_datetime(raw_tick.get("ts") or raw_tick.get("time"), unit="ms", utc=True).floor("1min")
         price = float(raw_tick.get("price") or raw_tick.get("lastPrice") or 0.0)
-        size = float(raw_tick.get("size") or 0.0)
-        side = str(raw_tick.get("side", "buy")).lower()
-        spot_price = float(orderbook.get("spot_price", price))
-        funding_rate = float(funding.get("fundingRate", 0.0))
-        open_interest = float(oi.get("openInterest", 0.0))
-        long_oi = float(oi.get("longQty", oi.get("longValue", 0.0)))
-        short_oi = float(oi.get("shortQty", oi.get("shortValue", 0.0)))
-        market_cap = float(oi.get("marketCap", 0.0))
-
-        base_cols = [
-            "Open",
-            "High",
-            "Low",
-            "LastPrice",
-            "SpotPrice",
-            "FundingRate",
-            "OpenInterest",
-            "LongOI",
-            "ShortOI",
-            "MarketCap",
-            "VWAP_numerator",
-            "Volume",
-            "CVD",
-            "TradeCount",
-            "AdverseSelectionCost",
-            "LiquidationPressureBuy",
-            "LiquidationPressureSell",
-            "LiquidationClusterDensity",
-        ]
-        df = self.tables.setdefault(symbol, pd.DataFrame(columns=base_cols))
-        if ts not in df.index:
-            prev_num = df["VWAP_numerator"].iloc[-1] if len(df) else 0.0
-            prev_vol = df["Volume"].iloc[-1] if len(df) else 0.0
-            prev_cvd = df["CVD"].iloc[-1] if len(df) else 0.0
-            df.loc[ts, "Open"] = price
-            df.loc[ts, "High"] = price
-            df.loc[ts, "Low"] = price
-            df.loc[ts, "VWAP_numerator"] = prev_num
-            df.loc[ts, "Volume"] = prev_vol
-            df.loc[ts, "CVD"] = prev_cvd
-            df.loc[ts, "TradeCount"] = 0
-            df.loc[ts, "AdverseSelectionCost"] = 0.0
-            df.loc[ts, "LiquidationPressureBuy"] = 0.0
-            df.loc[ts, "LiquidationPressureSell"] = 0.0
-            df.loc[ts, "LiquidationClusterDensity"] = 0.0
-
-        df.loc[ts, "LastPrice"] = price
-        if ts in df.index:
-            df.loc[ts, "High"] = max(df.loc[ts, "High"], price)
-            df.loc[ts, "Low"] = min(df.loc[ts, "Low"], price)
-        df.loc[ts, "Open"] = df.loc[ts, "Open"] if pd.notna(df.loc[ts, "Open"]) else price
-        df.loc[ts, "SpotPrice"] = spot_price
-        df.loc[ts, "FundingRate"] = funding_rate
-        df.loc[ts, "OpenInterest"] = open_interest
-        df.loc[ts, "LongOI"] = long_oi
-        df.loc[ts, "ShortOI"] = short_oi
-        df.loc[ts, "MarketCap"] = market_cap
-
-        df.loc[ts, "VWAP_numerator"] += price * size
-        df.loc[ts, "Volume"] += size
-        df.loc[ts, "TradeCount"] += 1
-        best_bid = orderbook.get("bids", [[price, 0]])[0][0]
-        best_ask = orderbook.get("asks", [[price, 0]])[0][0]
-        mp = (
-            best_bid * orderbook.get("asks", [[0, 0]])[0][1]
-            + best_ask * orderbook.get("bids", [[0, 0]])[0][1]
-        ) / (orderbook.get("asks", [[0, 1e-9]])[0][1] + orderbook.get("bids", [[0, 1e-9]])[0][1])
-        if side == "buy":
-            df.loc[ts, "CVD"] += size
-            df.loc[ts, "AdverseSelectionCost"] += (price - mp) * size
-        else:
-            df.loc[ts, "CVD"] -= size
-            df.loc[ts, "AdverseSelectionCost"] += (mp - price) * size
+        side = 1.0 if str(raw_tick.get("side", "buy")).lower() == "buy" else -1.0
+        book = self.book(orderbook, price)
 
         liq_buy = sum(l.get("size", 0.0) for l in liquidations if str(l.get("side", "")).lower() == "buy")
         liq_sell = sum(l.get("size", 0.0) for l in liquidations if str(l.get("side", "")).lower() == "sell")
@@ -168,180 +493,206 @@ class DerivedMetrics:
             density = len(prices) / (max(prices) - min(prices) + 1e-9)
         else:
             density = 0.0
-        df.loc[ts, "LiquidationPressureBuy"] += liq_buy
-        df.loc[ts, "LiquidationPressureSell"] += liq_sell
-        df.loc[ts, "LiquidationClusterDensity"] = density
-
-        df.sort_index(inplace=True)
-        df["VWAP"] = df["VWAP_numerator"] / df["Volume"].replace(0, np.nan)
-        df["VWAPDeviation"] = (df["LastPrice"] - df["VWAP"]) / df["VWAP"]
-        df["BasisPremium"] = (df["LastPrice"] - df["SpotPrice"]) / df["SpotPrice"]
-        df["FundingRateΔ_1h"] = df["FundingRate"].diff(60)
-        df["FundingRateΔ_24h"] = df["FundingRate"].diff(60 * 24)
-        df["AnnualizedFunding"] = df["FundingRate"] * 3 * 365
-        df["PredictedFunding"] = df["FundingRate"].rolling(8).mean()
-        df["BasisMomentum_1m"] = df["BasisPremium"].diff(1)
-        df["BasisMomentum_5m"] = df["BasisPremium"].diff(5)
-        df["BasisMomentum_1h"] = df["BasisPremium"].diff(60)
-        df["OIΔ_1m"] = df["OpenInterest"].diff(1)
-        df["OIΔ_5m"] = df["OpenInterest"].diff(5)
-        df["OIΔ_1h"] = df["OpenInterest"].diff(60)
-        df["OpenInterestUSD"] = df["OpenInterest"] * df["LastPrice"]
-        df["LeverageRatio"] = df["OpenInterest"] / (df["MarketCap"] + 1e-9)
-        df["LongShortRatio"] = df["LongOI"] / (df["ShortOI"] + 1e-9)
-        df["NetOIFlow"] = df["LongOI"].diff().fillna(0) - df["ShortOI"].diff().fillna(0)
-        df["OrderBookImbalance"] = self._orderbook_imbalance(orderbook)
-        df["Return"] = df["LastPrice"].pct_change().fillna(0)
-        df["RealizedVolatility_5m"] = df["Return"].rolling(5).std() * np.sqrt(5)
-        df["RealizedVolatility_1h"] = df["Return"].rolling(60).std() * np.sqrt(60)
-        df["RealizedVolatility_24h"] = df["Return"].rolling(60 * 24).std() * np.sqrt(60 * 24)
-        df["VolatilityImpulse"] = df["RealizedVolatility_5m"].diff()
-        df["VolOfVol"] = df["RealizedVolatility_5m"].rolling(20).std()
-        if "BTCUSDTM" in self.tables and symbol != "BTCUSDTM":
-            btc_ret = self.tables["BTCUSDTM"]["Return"].dropna()
-            own_ret = df["Return"].dropna()
-            r1, r2 = own_ret.align(btc_ret, join="inner")
-            if len(r1) >= 2:
-                span = 60 * 24 * 60  # 60 days
-                cov = np.cov(r1[-span:], r2[-span:])[0, 1]
-                var = np.var(r2[-span:]) + 1e-9
-                df.loc[ts, "BetaBTC"] = cov / var
-        if "BTCUSDTM" in self.tables:
-            other_basis = self.tables["BTCUSDTM"]["BasisPremium"].reindex(df.index)
-            df["CrossExchangeBasis"] = df["BasisPremium"] - other_basis
-        elif symbol == "BTCUSDTM":
-            df.loc[ts, "BetaBTC"] = 1.0
-        var_window = df["Return"].rolling(60 * 24)
-        df["ValueAtRisk_95"] = var_window.quantile(0.05)
-        df["ExpectedShortfall_95"] = var_window.apply(lambda x: x[x <= x.quantile(0.05)].mean(), raw=False)
-        df["MaxAdverseExcursion"] = var_window.apply(self._max_adverse_excursion)
-        mean_r = var_window.mean()
-        var_r = var_window.var() + 1e-9
-        df["KellyFraction"] = mean_r / var_r
-        sharpe_24h = (df["Return"].rolling(60 * 24).mean()) / (df["Return"].rolling(60 * 24).std() + 1e-9)
-        momentum = np.sign(df["Return"].rolling(60).sum())
-        df["MomentumScore"] = sharpe_24h * momentum
-        df["ZScoreReturns"] = (df["Return"] - df["Return"].rolling(60).mean()) / (
-            df["Return"].rolling(60).std() + 1e-9
-        )
 
-        ma20 = df["LastPrice"].rolling(20).mean()
-        std20 = df["LastPrice"].rolling(20).std()
-        upper = ma20 + 2 * std20
-        lower = ma20 - 2 * std20
-        df["BollingerBandwidth"] = (upper - lower) / (ma20 + 1e-9)
-
-        ema20 = df["LastPrice"].ewm(span=20, adjust=False).mean()
-        high_low = df["High"] - df["Low"]
-        tr1 = high_low
-        tr2 = (df["High"] - df["LastPrice"].shift(1)).abs()
-        tr3 = (df["Low"] - df["LastPrice"].shift(1)).abs()
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr14 = tr.rolling(14).mean()
-        df["ATRBandsWidth"] = (2 * atr14) / (df["LastPrice"] + 1e-9)
-        df["KeltnerChannelWidth"] = (4 * atr14) / (ema20 + 1e-9)
-        depth01 = self._depth_at_pct(orderbook, 0.001)
-        depth05 = self._depth_at_pct(orderbook, 0.005)
-        mid = (orderbook.get("bids", [[price, 0]])[0][0] + orderbook.get("asks", [[price, 0]])[0][0]) / 2
-        spread = orderbook.get("asks", [[price, 0]])[0][0] - orderbook.get("bids", [[price, 0]])[0][0]
-        df.loc[ts, "DepthAt0_1pct"] = sum(depth01)
-        df.loc[ts, "DepthAt0_5pct"] = sum(depth05)
-        df.loc[ts, "LiquiditySlope"] = (df.loc[ts, "DepthAt0_5pct"] - df.loc[ts, "DepthAt0_1pct"]) / (mid * 0.004 + 1e-9)
-        df.loc[ts, "BidAskSpread"] = spread
-        df.loc[ts, "QuotedSpread"] = spread / (mid + 1e-9)
-        df.loc[ts, "MicroPrice"] = (
-            orderbook.get("asks", [[price, 0]])[0][0] * orderbook.get("bids", [[0, 0]])[0][1]
-            + orderbook.get("bids", [[price, 0]])[0][0] * orderbook.get("asks", [[0, 0]])[0][1]
-        ) / (orderbook.get("bids", [[0, 1e-9]])[0][1] + orderbook.get("asks", [[0, 1e-9]])[0][1])
-        df.loc[ts, "SlippageCost1kUSD"] = self._slippage_cost(orderbook, 1000)
-
-        df["CumulativeFunding"] = df["FundingRate"].cumsum()
-        df["CumulativeFundingAbsolute"] = df["FundingRate"].abs().cumsum()
-        df["FundingVolatility"] = df["FundingRate"].rolling(60 * 24).std()
-        df["FundingLeverageCompositeIndex"] = df["FundingRate"] * df["LeverageRatio"]
-
-        delta = df["LastPrice"].diff()
-        up = delta.clip(lower=0)
-        down = -delta.clip(upper=0)
-        roll_up = up.rolling(14).mean()
-        roll_down = down.rolling(14).mean()
-        rs = roll_up / (roll_down + 1e-9)
-        rsi = 100 - 100 / (1 + rs)
-        df["RSI"] = rsi
-
-        min_rsi = rsi.rolling(14).min()
-        max_rsi = rsi.rolling(14).max()
-        df["StochasticRSI"] = (rsi - min_rsi) / (max_rsi - min_rsi + 1e-9)
-
-        direction = np.sign(delta.fillna(0))
-        df["OBV"] = (direction * df["Volume"]).cumsum()
-
-        ema1 = df["LastPrice"].ewm(span=9, adjust=False).mean()
-        ema2 = ema1.ewm(span=9, adjust=False).mean()
-        ema3 = ema2.ewm(span=9, adjust=False).mean()
-        df["TRIX"] = ema3.pct_change() * 100
-
-        mf_mul = ((df["LastPrice"] - df["Low"]) - (df["High"] - df["LastPrice"])) / (df["High"] - df["Low"] + 1e-9)
-        mf_vol = mf_mul * df["Volume"]
-        df["ChaikinMoneyFlow"] = mf_vol.rolling(20).sum() / df["Volume"].rolling(20).sum().replace(0, np.nan)
-
-        typical_price = (df["High"] + df["Low"] + df["LastPrice"]) / 3
-        money_flow = typical_price * df["Volume"]
-        pos_mf = money_flow.where(typical_price > typical_price.shift(1), 0.0)
-        neg_mf = money_flow.where(typical_price < typical_price.shift(1), 0.0)
-        mf_ratio = pos_mf.rolling(14).sum() / (neg_mf.rolling(14).sum().abs() + 1e-9)
-        df["MoneyFlowIndex"] = 100 - (100 / (1 + mf_ratio))
-
-        df["TWAP"] = df["LastPrice"].rolling(20).mean()
-        df["TWAPDeviation"] = (df["LastPrice"] - df["TWAP"]) / (df["TWAP"] + 1e-9)
-
-        span_10d = 60 * 24 * 10
-        span_20d = 60 * 24 * 20
-        df["HV10d"] = df["Return"].rolling(span_10d).std() * np.sqrt(span_10d)
-        df["HV20d"] = df["Return"].rolling(span_20d).std() * np.sqrt(span_20d)
-        wins = df["Return"].rolling(60).apply(lambda x: np.sum(x > 0), raw=True)
-        losses = df["Return"].rolling(60).apply(lambda x: np.sum(x < 0), raw=True)
-        df["WinLossRatio"] = wins / (losses + 1e-9)
-        df["RollingSharpeRatio"] = (
-            df["Return"].rolling(60 * 24).mean()
-            / (df["Return"].rolling(60 * 24).std() + 1e-9)
-        )
-        downside = df["Return"].rolling(60 * 24).apply(
-            lambda x: np.sqrt(np.mean(np.square(np.minimum(0, x)))), raw=True
-        )
-        df["RollingSortinoRatio"] = (
-            df["Return"].rolling(60 * 24).mean() / (downside + 1e-9)
-        )
-        drawdown = (df["LastPrice"] / df["LastPrice"].cummax()) - 1
-        df["UlcerIndex"] = np.sqrt((drawdown.pow(2)).rolling(14).mean())
-
-        df["AggressorVolumeDelta"] = df["CVD"].diff().fillna(0)
-        df["NetAggressorVolumeFlow"] = df["AggressorVolumeDelta"].rolling(5).sum()
-        vol_delta = df["Volume"].diff().replace(0, np.nan)
-        df["FlowImbalance"] = df["AggressorVolumeDelta"] / vol_delta
-        df["MeanTradeSize"] = vol_delta / df["TradeCount"].replace(0, np.nan)
-        df["TradeIntensity"] = df["TradeCount"]
-        df["LiquidationVolumeBuy"] = df["LiquidationPressureBuy"]
-        df["LiquidationVolumeSell"] = df["LiquidationPressureSell"]
-        df["PendingLiquidationPressure"] = df["LiquidationPressureBuy"].diff().fillna(0) - df["LiquidationPressureSell"].diff().fillna(0)
-        df["LiquidityStressIndex"] = (
-            df["QuotedSpread"].rolling(5).mean()
-            / (df["DepthAt0_5pct"].rolling(5).mean() + 1e-9)
-        )
+        tick = {
+            "price": price,
+            "size": float(raw_tick.get("size") or 0.0),
+            "side": side,
+            "micro": book["MicroPrice"],
+            "SpotPrice": float(orderbook.get("spot_price", price)),
+            "FundingRate": float(funding.get("fundingRate", 0.0)),
+            "OpenInterest": float(oi.get("openInterest", 0.0)),
+            "LongOI": float(oi.get("longQty", oi.get("longValue", 0.0))),
+            "ShortOI": float(oi.get("shortQty", oi.get("shortValue", 0.0))),
+            "MarketCap": float(oi.get("marketCap", 0.0)),
+            "liq_buy": float(liq_buy),
+            "liq_sell": float(liq_sell),
+            "liq_density": density,
+        }
+        engine = self.engines.get(symbol)
+        if engine is None:
+            engine = self.engines[symbol] = self._engine()
+        row = engine.update(ts, tick, book)
 
-        self.tables[symbol] = df
-        self._persist(symbol)
-        self._broadcast(symbol, df.loc[ts])
-        self.master = self._assemble_master()
-        return self.master
+        table = self.tables.get(symbol)
+        if table is None:
+            table = self.tables[symbol] = RingTable(self.schema, self.capacity)
+        if len(table) and table.last_ts != engine.ts.value:
+            if table.last_ts != self._stored.pop(symbol, None):
+                self._persist(symbol, table.frame().iloc[-1:].copy())
+            if self.checkpointer is not None and self.checkpointer.due(symbol):
+                self.checkpointer.save(symbol, engine.snapshot())
+        table.upsert(engine.ts.value, row)
+        self._cross_asset(symbol, row)
+        self._invalidate(symbol)
+        latest = table.row()
+        self._broadcast(symbol, latest)
+        return latest
+
+    def _cross_asset_frames(self, results: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        returns = pd.DataFrame({symbol: df["Return"] for symbol, df in results.items()}).sort_index()
+        ref = results.get(self.reference)
+        betas = None if ref is None else rolling_betas(returns, self.reference, self.cross.windows[0])
+        for symbol, df in results.items():
+            if symbol == self.reference:
+                df["BetaBTC"] = 1.0
+                df["CrossExchangeBasis"] = 0.0
+            elif ref is not None:
+                df["BetaBTC"] = betas[symbol].reindex(df.index)
+                df["CrossExchangeBasis"] = df["BasisPremium"] - ref["BasisPremium"].reindex(df.index)
+        return returns
+
+    def backfill(
+        self,
+        ticks: pd.DataFrame,
+        orderbooks: Optional[pd.DataFrame] = None,
+        funding: Optional[pd.DataFrame] = None,
+        oi: Optional[pd.DataFrame] = None,
+        liquidations: Optional[pd.DataFrame] = None,
+        handoff: bool = True,
+    ) -> Dict[str, pd.DataFrame]:
+        """Compute metrics for whole DataFrames of history in one pass.
+
+        Inputs are described in :mod:`trading.backfill`; the per-symbol
+        results match replaying the same data through :meth:`update`.
+        Cross-asset columns are computed against the reference symbol's
+        final bars, so they can differ from a replay in bars where the
+        reference's ticks arrived after the other symbol's.
+
+        With ``handoff`` the symbols' tables and engines and the
+        :attr:`cross` state are replaced so
+        :meth:`update` carries on from the last bar, every finished bar is
+        queued for persistence in one batch and subscribers are not called
+        for backfilled rows.
+        """
+        frame = align(ticks, orderbooks, funding, oi)
+        bars = build_bars(frame, liquidations, self.book)
+        results = {
+            symbol: batch_metrics(b, self.tail_window, self.tail_mode) for symbol, b in bars.items()
+        }
+        extra = [col for col in self.schema if col not in SCHEMA]
+        for symbol, df in results.items():
+            df[extra] = bars[symbol][extra]
+        returns = self._cross_asset_frames(results)
+        if not handoff:
+            return results
+        self.cross.seed(returns)
+        for symbol, df in results.items():
+            table = self.tables[symbol] = RingTable(self.schema, self.capacity)
+            table.extend(df.index.as_unit("ns").asi8, df)
+            engine = self.engines[symbol] = self._engine()
+            engine.seed(bars[symbol], df)
+            self._persist(symbol, df.iloc[:-1].copy())
+            self._invalidate(symbol)
+        return results
+
+    def restore(self) -> Dict[str, int]:
+        """Warm start every stored or checkpointed symbol before the first update.
+
+        A symbol with a snapshot resumes from it and replays only the stored
+        bars from its open bar on. Without one, the engine is seeded from
+        everything stored, as in :meth:`backfill`. Tables are reloaded with
+        the last ``capacity`` stored rows and :attr:`cross` is rebuilt from
+        them. Returns the number of bars replayed per symbol.
+        """
+        symbols = set(self.store.symbols())
+        if self.checkpointer is not None:
+            symbols.update(self.checkpointer.keys())
+        inputs = BASE_COLUMNS + self.book.columns
+        replayed: Dict[str, int] = {}
+        for symbol in sorted(symbols):
+            engine = self._engine()
+            snapshot = None if self.checkpointer is None else self.checkpointer.load(symbol)
+            if snapshot is not None:
+                try:
+                    engine.restore(snapshot)
+                except (KeyError, ValueError) as exc:
+                    LOGGER.warning("Discarding checkpoint for %s: %s", symbol, exc)
+                    engine, snapshot = self._engine(), None
+            start = None
+            if snapshot is not None and engine.ts is not None:
+                start = engine.ts - pd.Timedelta(minutes=self.capacity)
+            stored = self.store.read(symbol, start=start)
+            if snapshot is None and stored.empty:
+                continue
+            if stored.empty:
+                replayed[symbol] = 0
+            elif snapshot is None:
+                engine.seed(stored.reindex(columns=inputs), stored)
+                replayed[symbol] = min(len(stored), max(SPAN_20D, self.tail_window))
+            else:
+                replayed[symbol] = engine.replay(stored.loc[engine.ts:].reindex(columns=inputs))
+            table = self.tables[symbol] = RingTable(self.schema, self.capacity)
+            if not stored.empty:
+                table.extend(stored.index.as_unit("ns").asi8, stored)
+                self._stored[symbol] = table.last_ts
+            if engine.ts is not None and (not len(table) or table.last_ts < engine.ts.value):
+                table.append(engine.ts.value, engine.row)
+            self.engines[symbol] = engine
+            self._invalidate(symbol)
+        if self.tables:
+            returns = pd.DataFrame(
+                {sym: pd.Series(table.column("Return"), index=table.index()) for sym, table in self.tables.items()}
+            ).sort_index()
+            self.cross.seed(returns)
+        return replayed
+
+    def _invalidate(self, symbol: str) -> None:
+        self._stale.add(symbol)
+        self._master = None
+
+    @staticmethod
+    def _keyed(symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        df.index = pd.MultiIndex.from_arrays([[symbol] * len(df), df.index], names=["symbol", None])
+        return df
+
+    @property
+    def master(self) -> pd.DataFrame:
+        """Every symbol's table indexed by ``(symbol, time)``."""
+        if self._master is None:
+            for symbol in self._stale:
+                self._parts[symbol] = self._keyed(symbol, self.tables[symbol].frame().copy())
+            self._stale.clear()
+            self._master = self._assemble_master()
+        return self._master
 
     def _assemble_master(self) -> pd.DataFrame:
+        if not self._parts:
+            return pd.DataFrame()
+        return pd.concat([self._parts[sym] for sym in sorted(self._parts)])
+
+    def _symbols(self, symbols: Optional[Iterable[str]]) -> List[str]:
+        if symbols is None:
+            return sorted(self.tables)
+        return [sym for sym in symbols if sym in self.tables]
+
+    def latest(self, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Last row of each symbol, indexed by symbol with a ``ts`` column."""
+        syms = self._symbols(symbols)
+        df = pd.DataFrame(
+            {col: [self.tables[sym].value(col) for sym in syms] for col in self.schema},
+            index=pd.Index(syms, name="symbol"),
+        )
+        df.insert(0, "ts", pd.to_datetime([self.tables[sym].last_ts for sym in syms], utc=True))
+        return df
+
+    def between(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        symbols: Optional[Iterable[str]] = None,
+    ) -> pd.DataFrame:
+        """Rows with ``start <= time <= end`` in the same layout as :attr:`master`."""
+        lo = None if start is None else pd.Timestamp(start).value
+        hi = None if end is None else pd.Timestamp(end).value
         frames = []
-        for sym, df in self.tables.items():
-            temp = df.copy()
-            temp["symbol"] = sym
-            frames.append(temp)
+        for sym in self._symbols(symbols):
+            table = self.tables[sym]
+            stamps = table.timestamps()
+            i = 0 if lo is None else int(np.searchsorted(stamps, lo, side="left"))
+            j = len(stamps) if hi is None else int(np.searchsorted(stamps, hi, side="right"))
+            if i < j:
+                frames.append(self._keyed(sym, table.frame().iloc[i:j].copy()))
         if not frames:
-            return pd.DataFrame()
-        all_df = pd.concat(frames)
-        return all_df.set_index("symbol", append=True).swaplevel(0, 1).sort_index()
+            return pd.DataFrame(columns=list(self.schema))
+        return pd.concat(frames)
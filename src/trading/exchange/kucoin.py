@@ -28,6 +28,17 @@ class KucoinClient(BaseExchange):
         except aiohttp.ClientError as exc:
             raise ConnectionError(f"Failed to obtain KuCoin token: {exc}") from exc
 
+    async def get_level2_snapshot(self, symbol: str) -> dict:
+        """Full level2 book with its ``sequence``, to resync a local book from."""
+        url = f"{self.base_url}/api/v1/level2/snapshot"
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params={"symbol": symbol}) as resp:
+                    data = await resp.json()
+                    return data["data"]
+        except aiohttp.ClientError as exc:
+            raise ConnectionError(f"Failed to fetch level2 snapshot for {symbol}: {exc}") from exc
+
     async def place_order(self, symbol: str, side: str, size: float, price: Optional[float] = None) -> dict:
         url = f"{self.base_url}/api/v1/orders"
         payload = {
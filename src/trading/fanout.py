@@ -0,0 +1,165 @@
+"""Asynchronous delivery of DerivedMetrics rows to subscribers.
+
+Each :class:`Subscription` owns a bounded mailbox and a daemon thread that
+calls the subscriber, so a slow consumer only falls behind itself:
+:meth:`Subscription.offer` never blocks the tick path. Delivery policies:
+
+* ``"all"``: every row, in order. Rows arriving while ``max_queue`` are
+  waiting are dropped and counted.
+* ``"latest"``: at most one waiting row per symbol; a newer row replaces
+  the one not yet delivered and is counted as ``conflated``.
+* ``"batch"``: rows are collected and handed over as one list of
+  ``(symbol, row)`` pairs every ``batch_ms`` milliseconds.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+DELIVERY_POLICIES = ("all", "latest", "batch")
+
+
+class Subscription:
+    """One subscriber's mailbox, delivery thread and counters.
+
+    ``lag`` is how long the oldest row of the last delivery waited, in
+    seconds, and ``max_lag`` the worst seen. With ``columns`` rows are cut
+    down to them on the delivery thread.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[..., Any],
+        columns: Optional[Sequence[str]] = None,
+        policy: str = "all",
+        max_queue: int = 10_000,
+        batch_ms: float = 100.0,
+        name: Optional[str] = None,
+    ):
+        if policy not in DELIVERY_POLICIES:
+            raise ValueError(f"Unknown delivery policy: {policy}")
+        self.callback = callback
+        self.columns = None if columns is None else list(columns)
+        self.policy = policy
+        self.max_queue = max_queue
+        self.batch_interval = batch_ms / 1000.0
+        self.name = name or getattr(callback, "__name__", "subscriber")
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        # "latest" keeps one entry per symbol; the others a FIFO of rows.
+        self._pending: Any = {} if policy == "latest" else deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._urgent = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"subscriber-{self.name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "errors": self.errors,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+    def offer(self, symbol: str, row: pd.Series) -> bool:
+        """Queue ``row`` for delivery; False if it was dropped."""
+        item = (time.monotonic(), symbol, row)
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            if self.policy == "latest":
+                if symbol in self._pending:
+                    self.conflated += 1
+                elif len(self._pending) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+                self._pending[symbol] = item
+            elif len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                return False
+            else:
+                self._pending.append(item)
+            self._cond.notify_all()
+        return True
+
+    def _take(self) -> List[Tuple[float, str, pd.Series]]:
+        if self.policy == "batch":
+            items = list(self._pending)
+            self._pending.clear()
+            return items
+        if self.policy == "latest":
+            return [self._pending.pop(next(iter(self._pending)))]
+        return [self._pending.popleft()]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self.policy == "batch" and self._pending:
+                    deadline = self._pending[0][0] + self.batch_interval
+                    while not (self._closed or self._urgent):
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            break
+                        self._cond.wait(left)
+                if not self._pending:
+                    return
+                items = self._take()
+                self._busy = True
+            self._deliver(items)
+            with self._cond:
+                self._busy = False
+                if not self._pending:
+                    self._urgent = False
+                self._cond.notify_all()
+
+    def _cut(self, row: pd.Series) -> pd.Series:
+        return row if self.columns is None else row[self.columns]
+
+    def _deliver(self, items: List[Tuple[float, str, pd.Series]]) -> None:
+        lag = time.monotonic() - items[0][0]
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        try:
+            if self.policy == "batch":
+                self.callback([(symbol, self._cut(row)) for _, symbol, row in items])
+            else:
+                _, symbol, row = items[0]
+                self.callback(symbol, self._cut(row))
+        except Exception:
+            self.errors += 1
+            LOGGER.exception("Subscriber %s failed", self.name)
+        self.delivered += len(items)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row offered so far has been delivered."""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Deliver what is queued and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
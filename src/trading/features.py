@@ -1,11 +1,29 @@
+import math
+from bisect import bisect_right
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence
+
 import pandas as pd
 import numpy as np
-from datetime import datetime
 from scipy.stats import entropy
 
+from .bars import Bar, BarAggregator
+from .rolling import NAN, Lagged, RollingMedian, RollingMoments, RollingSum
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+# Seconds of silence forward filled with copies of the last bar.
+MAX_FILL = 60
+HURST_LAGS = range(2, 20)
+# Trailing bars for the streaming estimators.
+HURST_WINDOW = 600
+ENTROPY_WINDOW = 60
+# 1-second returns from -10bp to +10bp in 10 bins; outliers land in the end bins.
+ENTROPY_EDGES = tuple(np.linspace(-1e-3, 1e-3, 11))
+
 
 def hurst_exponent(series: pd.Series) -> float:
-    lags = range(2, 20)
+    series = np.asarray(series, dtype=float)
+    lags = HURST_LAGS
     tau = [np.std(series[lag:] - series[:-lag]) + 1e-9 for lag in lags]
     poly = np.polyfit(np.log(lags), np.log(tau), 1)
     return 2 * poly[0]
@@ -15,78 +33,244 @@ def return_entropy(series: pd.Series, bins: int = 10) -> float:
     hist, _ = np.histogram(series, bins=bins, density=True)
     return entropy(hist + 1e-8)
 
+
+class RollingHurst:
+    """:func:`hurst_exponent` over the last ``window`` values, updated per bar.
+
+    Every lag keeps rolling moments of its lagged differences, so a bar
+    costs one update per lag and the slope is a closed-form fit over the
+    lags. NaN until every lag has a difference.
+    """
+
+    def __init__(self, window: int = HURST_WINDOW, lags: Iterable[int] = HURST_LAGS):
+        self.lags = list(lags)
+        if window <= max(self.lags):
+            raise ValueError("window must be longer than the largest lag")
+        self.window = window
+        self.values = Lagged(max(self.lags))
+        self.diffs = [RollingMoments(window - lag, min_periods=1) for lag in self.lags]
+        logs = np.log(self.lags)
+        centred = logs - logs.mean()
+        self._weights = (centred / (centred ** 2).sum()).tolist()
+
+    def peek(self, x: float) -> float:
+        slope = 0.0
+        for lag, acc, weight in zip(self.lags, self.diffs, self._weights):
+            m = acc.peek(self.values.diff(x, lag))
+            if not m.count:
+                return NAN
+            var = 0.0 if m.count == 1 else m.var * (m.count - 1) / m.count
+            slope += weight * math.log(math.sqrt(var) + 1e-9)
+        return 2 * slope
+
+    def push(self, x: float) -> None:
+        for lag, acc in zip(self.lags, self.diffs):
+            acc.push(self.values.diff(x, lag))
+        self.values.push(x)
+
+
+class RollingEntropy:
+    """:func:`return_entropy` over the last ``window`` values with fixed ``edges``.
+
+    A sliding histogram replaces the per-call ``np.histogram``; values
+    outside the edges count towards the first or last bin.
+    """
+
+    def __init__(self, window: int = ENTROPY_WINDOW, edges: Sequence[float] = ENTROPY_EDGES):
+        self.window = window
+        self.edges = list(edges)
+        self.widths = np.diff(self.edges).tolist()
+        self.counts = [0] * len(self.widths)
+        self.bins: Deque[Optional[int]] = deque()
+
+    def _bin(self, x: float) -> int:
+        i = bisect_right(self.edges, x) - 1
+        return min(max(i, 0), len(self.counts) - 1)
+
+    def peek(self, x: float) -> float:
+        counts = self.counts
+        if x == x:
+            counts = list(counts)
+            counts[self._bin(x)] += 1
+        n = sum(counts)
+        if not n:
+            return NAN
+        density = [c / (n * w) + 1e-8 for c, w in zip(counts, self.widths)]
+        total = sum(density)
+        return -sum(d / total * math.log(d / total) for d in density)
+
+    def push(self, x: float) -> None:
+        if self.window <= 1:
+            return
+        if len(self.bins) == self.window - 1:
+            old = self.bins.popleft()
+            if old is not None:
+                self.counts[old] -= 1
+        b = self._bin(x) if x == x else None
+        if b is not None:
+            self.counts[b] += 1
+        self.bins.append(b)
+
+
+def _sigmoid(x: float) -> float:
+    return 1 / (1 + math.exp(-x))
+
+
+def _pct_change(x: float, prev: float) -> float:
+    """One step of ``pct_change().fillna(0)``."""
+    if prev != prev:
+        return 0.0
+    if prev == 0:
+        return 0.0 if x == 0 or x != x else math.copysign(math.inf, x)
+    return x / prev - 1
+
+
 class FeatureFabric:
-    """Compute derived market features from raw ticks."""
+    """Compute derived market features from raw ticks.
 
-    def __init__(self, vol_window: int = 30):
-        self.df = pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
-        self.last_ts = None
+    Ticks are aggregated into 1-second bars by a :class:`BarAggregator`
+    and silences of up to ``MAX_FILL`` seconds are filled with copies of
+    the last bar. :meth:`on_bar` takes the open 1-second bars of a shared
+    aggregator instead, for a fabric subscribed to one. Rolling
+    features are :mod:`trading.rolling` accumulators over the closed bars,
+    peeked with the open one, so a tick costs the same however long the
+    session runs; ``entropy`` and ``hurst`` come from
+    :class:`RollingEntropy` and :class:`RollingHurst` over trailing windows.
+    Ticks for a second before the open bar are counted in :attr:`late` and
+    otherwise ignored.
+    """
+
+    def __init__(
+        self,
+        vol_window: int = 30,
+        hurst_window: int = HURST_WINDOW,
+        entropy_window: int = ENTROPY_WINDOW,
+        entropy_edges: Sequence[float] = ENTROPY_EDGES,
+    ):
         self.vol_window = vol_window
         self.surf_windows = [10, 30, 60]
+        self.bar: Optional[List[float]] = None
+        self.prev_bar: Optional[List[float]] = None
+        self.bars = 0
+        self.late = 0
+        self.row: Dict[str, float] = {}
+        self._sec: Optional[int] = None
+        self.aggregator = BarAggregator(("1s",))
+        self._pending: List[tuple] = []
+        self._close = Lagged()
+        self._vols = {w: RollingMoments(w, min_periods=1) for w in {vol_window, *self.surf_windows}}
+        self._ma10 = RollingSum(10, min_periods=1)
+        self._ma60 = RollingSum(60, min_periods=1)
+        self._atr = RollingSum(14, min_periods=1)
+        self._trend = RollingSum(5, min_periods=1)
+        self._vol_median = RollingMedian(60, min_periods=1)
+        self._hurst = RollingHurst(hurst_window)
+        self._entropy = RollingEntropy(entropy_window, entropy_edges)
+        # keys of the dict ``update`` returns, in order; ``d_*`` from the second bar
+        self.columns = [
+            *BAR_FIELDS, "return", "vol", "ma10", "ma60", *(f"vol_{w}" for w in self.surf_windows),
+            "tr", "atr", "trend_strength", "volatility_state", "symbol", "entropy", "hurst", "imbalance",
+            *(f"d_{col}" for col in BAR_FIELDS), "depth_mid", "depth", "order_flow_bias", "last_move",
+        ]
 
-    def update(self, tick: dict) -> dict:
-        ts = pd.to_datetime(tick.get("ts") or tick.get("time"), unit="ms", utc=True)
-        price = float(tick.get("price") or tick.get("lastPrice") or tick.get("lastTradePrice") or 0.0)
-        size = float(tick.get("size") or 0.0)
-        ts_sec = ts.floor("1s")
+    @property
+    def last_ts(self) -> Optional[pd.Timestamp]:
+        """Start of the open bar."""
+        return None if self._sec is None else pd.Timestamp(self._sec, unit="s", tz="UTC")
+
+    def _std(self, window: int, ret: float) -> float:
+        std = self._vols[window].peek(ret).std
+        return 0.0 if std != std else std
+
+    def _compute(self) -> Dict[str, float]:
+        """Features of the open bar; what to push is left in ``_pending``."""
+        o, h, l, c, v = self.bar
+        prev = self._close.prev()
+        ret = _pct_change(c, prev)
+        vol = self._std(self.vol_window, ret)
+        ma10 = self._ma10.mean(c)
+        ma60 = self._ma60.mean(c)
+        tr = NAN if prev != prev else max(abs(h - l), abs(h - prev), abs(l - prev))
+        atr = self._atr.mean(tr)
+        ratio = abs(ma10 - ma60) / (atr + 1e-9)
+        median = self._vol_median.peek(vol)
+        state = vol / (median + 1e-9)
+        row = dict(zip(BAR_FIELDS, self.bar))
+        row["return"] = ret
+        row["vol"] = vol
+        row["ma10"] = ma10
+        row["ma60"] = ma60
+        for w in self.surf_windows:
+            row[f"vol_{w}"] = self._std(w, ret)
+        row["tr"] = tr
+        row["atr"] = atr
+        row["trend_strength"] = _sigmoid(self._trend.mean(ratio))
+        row["volatility_state"] = _sigmoid((0.0 if state < 0 else state) - 1)
+        self._pending = [(self._close, c), (self._ma10, c), (self._ma60, c), (self._atr, tr),
+                         (self._trend, ratio), (self._vol_median, vol), (self._entropy, ret), (self._hurst, c)]
+        self._pending += [(acc, ret) for acc in self._vols.values()]
+        return row
+
+    def _roll(self, bar: List[float]) -> None:
+        """Close the open bar and open ``bar``."""
+        for acc, x in self._pending:
+            acc.push(x)
+        self.prev_bar = self.bar
+        self.bar = bar
+        self.bars += 1
+
+    def on_bar(self, bar: Bar) -> None:
+        """Take the open 1-second ``bar`` as the open bar; closed bars are ignored.
 
-        if self.last_ts is not None and ts_sec > self.last_ts:
+        A bar of a later second closes the open one, forward filling the
+        seconds between them up to ``MAX_FILL``.
+        """
+        if bar.closed:
+            return
+        sec = bar.start // 1000
+        values = [bar.open, bar.high, bar.low, bar.close, bar.volume]
+        if self._sec is None:
+            self.bar = values
+            self.bars = 1
+        elif sec > self._sec:
             # forward fill gaps up to 60s
-            while self.last_ts + pd.Timedelta(seconds=1) < ts_sec and (ts_sec - self.last_ts).seconds <= 60:
-                self.last_ts += pd.Timedelta(seconds=1)
-                self.df.loc[self.last_ts] = self.df.iloc[-1]
+            while self._sec + 1 < sec and sec - self._sec <= MAX_FILL:
+                self._sec += 1
+                self._roll(list(self.bar))
+                self._compute()
+            self._roll(values)
+        elif sec == self._sec:
+            self.bar = values
+        else:
+            return
+        self._sec = sec
+        self.row = self._compute()
 
-        if ts_sec not in self.df.index:
-            self.df.loc[ts_sec] = [price, price, price, price, size]
+    def update(self, tick: dict) -> dict:
+        ts = float(tick.get("ts") or tick.get("time"))
+        price = float(tick.get("price") or tick.get("lastPrice") or tick.get("lastTradePrice") or 0.0)
+        size = float(tick.get("size") or 0.0)
+        bars = self.aggregator.add(tick.get("symbol", ""), ts, price, size)
+        if bars:
+            self.on_bar(bars[-1])
         else:
-            row = self.df.loc[ts_sec]
-            row["high"] = max(row["high"], price)
-            row["low"] = min(row["low"], price)
-            row["close"] = price
-            row["volume"] += size
-            self.df.loc[ts_sec] = row
-
-        self.last_ts = ts_sec
-        df = self.df.sort_index()
-        df["return"] = df["close"].pct_change().fillna(0)
-        df["vol"] = df["return"].rolling(self.vol_window, min_periods=1).std().fillna(0)
-        df["ma10"] = df["close"].rolling(10, min_periods=1).mean()
-        df["ma60"] = df["close"].rolling(60, min_periods=1).mean()
-        for w in self.surf_windows:
-            df[f"vol_{w}"] = df["return"].rolling(w, min_periods=1).std().fillna(0)
-        df["tr"] = np.maximum.reduce([
-            (df["high"] - df["low"]).abs(),
-            (df["high"] - df["close"].shift(1)).abs(),
-            (df["low"] - df["close"].shift(1)).abs(),
-        ])
-        df["atr"] = df["tr"].rolling(14, min_periods=1).mean()
-        df["trend_strength"] = (
-            (df["ma10"] - df["ma60"]).abs() / (df["atr"] + 1e-9)
-        ).rolling(5, min_periods=1).mean()
-        df["trend_strength"] = 1 / (1 + np.exp(-df["trend_strength"]))
-        vol_median = df["vol"].rolling(60, min_periods=1).median()
-        df["volatility_state"] = (df["vol"] / (vol_median + 1e-9)).clip(0, None)
-        df["volatility_state"] = 1 / (1 + np.exp(-(df["volatility_state"] - 1)))
-        entropy_val = return_entropy(df["return"].dropna().values[-60:])
-        hurst_val = hurst_exponent(df["close"].dropna())
-        features = df.iloc[-1].to_dict()
+            self.late += 1
+
+        features = dict(self.row)
         features["symbol"] = tick.get("symbol", "")
-        features["entropy"] = float(entropy_val)
-        features["hurst"] = float(hurst_val)
+        features["entropy"] = self._entropy.peek(self.row["return"])
+        features["hurst"] = self._hurst.peek(self.row["close"])
         features["imbalance"] = (
             (float(tick.get("bestBidSize", 0)) - float(tick.get("bestAskSize", 0))) /
             (float(tick.get("bestBidSize", 0)) + float(tick.get("bestAskSize", 1e-9)))
         )
-        if len(df) > 1:
-            prev = df.iloc[-2]
-            for col in ["open", "high", "low", "close", "volume"]:
-                features[f"d_{col}"] = df.iloc[-1][col] - prev[col]
+        if self.bars > 1:
+            for col, now, before in zip(BAR_FIELDS, self.bar, self.prev_bar):
+                features[f"d_{col}"] = now - before
         ob_mid = (float(tick.get("bestBidPrice", price)) + float(tick.get("bestAskPrice", price))) / 2
         depth = float(tick.get("bestBidSize", 0)) + float(tick.get("bestAskSize", 0))
         features["depth_mid"] = ob_mid
         features["depth"] = depth
         features["order_flow_bias"] = features["imbalance"]
         features["last_move"] = features.get("d_close", 0.0)
-        features["trend_strength"] = float(df.iloc[-1]["trend_strength"])
-        features["volatility_state"] = float(df.iloc[-1]["volatility_state"])
         return features
@@ -1,67 +1,161 @@
-import asyncio
 import json
-import websockets
-from typing import AsyncIterator, List
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from .checkpoint import Checkpointer
+from .clock import SimulatedClock
+from .connection import ConnectionManager
 from .exchange import KucoinClient
 from .features import FeatureFabric
+from .recorder import TickRecorder
+from .sharding import ShardedFeatures
+from .tickfile import CHUNKSIZE, read_chunks
 from pathlib import Path
-import pandas as pd
 
 KUCOIN_WS = "wss://ws-api-futures.kucoin.com/?token={token}"
 
 
 class KucoinDataStream:
-    """Stream ticker data for a list of symbols from KuCoin futures."""
+    """Stream ticker data for a list of symbols from KuCoin futures.
 
-    def __init__(self, client: KucoinClient, symbols: List[str]):
+    Every symbol has its own :class:`FeatureFabric`. With ``workers`` the
+    fabrics run in a :class:`ShardedFeatures` process pool instead of on
+    the event loop thread.
+
+    With ``checkpoint_dir`` every fabric is snapshotted there each
+    ``checkpoint_interval`` seconds and resumed from its snapshot after a
+    restart, so rolling features don't start cold.
+
+    With ``record_dir`` every raw message is captured by a
+    :class:`TickRecorder`. Assigning a :class:`~trading.recorder.LogReplayer`
+    to ``ws`` replays such a capture through the same code.
+
+    The feed runs over ``connections`` sockets of a
+    :class:`~trading.connection.ConnectionManager`, which heartbeats,
+    reconnects and resubscribes on its own.
+    """
+
+    def __init__(
+        self,
+        client: KucoinClient,
+        symbols: List[str],
+        workers: int = 0,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: float = 300.0,
+        record_dir: Optional[str] = None,
+        connections: int = 1,
+    ):
         self.client = client
         self.symbols = symbols
+        self.connections = connections
         self.ws = None
-        self._token = None
-        self.features = FeatureFabric()
+        self.features: Dict[str, FeatureFabric] = {}
+        self.sharded = None
+        self.checkpointer = None
+        self.recorder = None if record_dir is None else TickRecorder(record_dir)
+        if workers:
+            self.sharded = ShardedFeatures(
+                symbols, workers, checkpoint_dir=checkpoint_dir, checkpoint_interval=checkpoint_interval
+            )
+        elif checkpoint_dir is not None:
+            self.checkpointer = Checkpointer(checkpoint_dir, checkpoint_interval)
 
-    async def _ensure_token(self):
-        if self._token is None:
-            self._token = await self.client.get_ws_token()
+    async def _url(self) -> str:
+        return KUCOIN_WS.format(token=await self.client.get_ws_token())
 
     async def connect(self):
-        await self._ensure_token()
-        self.ws = await websockets.connect(KUCOIN_WS.format(token=self._token))
-
-    async def subscribe(self):
-        sub = {
-            "id": 1,
-            "type": "subscribe",
-            "topic": f"/contractMarket/tickerV2:{','.join(self.symbols)}",
-            "response": True,
-        }
-        await self.ws.send(json.dumps(sub))
+        topics = [f"/contractMarket/tickerV2:{symbol}" for symbol in self.symbols]
+        self.ws = ConnectionManager(self._url, topics, self.connections)
+        self.ws.start()
 
-    async def stream(self) -> AsyncIterator[dict]:
+    async def disconnect(self) -> None:
+        if isinstance(self.ws, ConnectionManager):
+            await self.ws.close()
+        self.ws = None
+
+    async def ticks(self) -> AsyncIterator[dict]:
         if self.ws is None:
             await self.connect()
-            await self.subscribe()
+        recorder = self.recorder
         async for msg in self.ws:
+            if recorder is not None:
+                recorder.record(msg)
             data = json.loads(msg)
             if data.get("type") == "message":
-                features = self.features.update(data["data"])
+                yield data["data"]
+
+    def _fabric(self, symbol: str) -> FeatureFabric:
+        fabric = None if self.checkpointer is None else self.checkpointer.load(symbol)
+        if not isinstance(fabric, FeatureFabric):
+            fabric = FeatureFabric()
+        self.features[symbol] = fabric
+        return fabric
+
+    async def stream(self) -> AsyncIterator[dict]:
+        if self.sharded is not None:
+            async for features in self.sharded.stream(self.ticks()):
                 yield features
+            return
+        checkpointer = self.checkpointer
+        async for tick in self.ticks():
+            symbol = tick.get("symbol", "")
+            fabric = self.features.get(symbol)
+            if fabric is None:
+                fabric = self._fabric(symbol)
+            features = fabric.update(tick)
+            if checkpointer is not None and checkpointer.due(symbol):
+                checkpointer.save(symbol, fabric)
+            yield features
+
+    def close(self) -> None:
+        """Snapshot the fabrics, stop the feature workers and close the recording."""
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.checkpointer is not None:
+            for symbol, fabric in self.features.items():
+                self.checkpointer.save(symbol, fabric)
+            self.checkpointer.close()
+        if self.sharded is not None:
+            self.sharded.close()
 
 
 class HistoricalDataStream:
-    """Replay historical ticks from a CSV file."""
+    """Replay historical ticks from a CSV file or columnar tick directory.
+
+    The file is read lazily in ``chunksize`` rows (see
+    :mod:`trading.tickfile`), so replay starts immediately and memory does
+    not grow with the file. ``start``/``end`` and ``symbols`` are applied
+    by the reader; on a columnar file the time range costs a binary search.
 
-    def __init__(self, path: str):
+    Each tick advances ``clock``, which paces the replay; the default
+    :class:`SimulatedClock` replays in real time. Every symbol has its own
+    :class:`FeatureFabric`, as in :class:`KucoinDataStream`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunksize: int = CHUNKSIZE,
+        start=None,
+        end=None,
+        symbols: Optional[List[str]] = None,
+        clock: Optional[SimulatedClock] = None,
+    ):
         self.path = Path(path)
-        self.features = FeatureFabric()
-        self.df = pd.read_csv(self.path)
+        self.clock = SimulatedClock(speed=1.0) if clock is None else clock
+        self.features: Dict[str, FeatureFabric] = {}
+        self.chunksize = chunksize
+        self.start = start
+        self.end = end
+        self.symbols = symbols
+
+    def rows(self) -> Iterator[dict]:
+        for chunk in read_chunks(str(self.path), self.chunksize, self.start, self.end, self.symbols):
+            yield from chunk.to_dict("records")
 
     async def stream(self) -> AsyncIterator[dict]:
-        prev_ts = None
-        for row in self.df.to_dict("records"):
-            ts = row.get("ts", 0)
-            if prev_ts is not None:
-                await asyncio.sleep(max(0, (ts - prev_ts) / 1000))
-            prev_ts = ts
-            features = self.features.update(row)
-            yield features
+        for row in self.rows():
+            await self.clock.advance(row.get("ts", 0))
+            symbol = row.get("symbol", "")
+            fabric = self.features.get(symbol)
+            if fabric is None:
+                fabric = self.features[symbol] = FeatureFabric()
+            yield fabric.update(row)
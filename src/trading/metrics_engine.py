@@ -0,0 +1,769 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .metric_registry import REGISTRY, MetricRegistry, compile_plan, metric
+from .rolling import (
+    NAN,
+    Cumulative,
+    Ewm,
+    Lagged,
+    RollingExtrema,
+    RollingMoments,
+    RollingSum,
+)
+from .tail_risk import TailRisk
+
+SPAN_1H = 60
+SPAN_24H = 60 * 24
+SPAN_10D = 60 * 24 * 10
+SPAN_20D = 60 * 24 * 20
+SPAN_60D = 60 * 24 * 60
+
+
+def _div(a: float, b: float) -> float:
+    """Float division with numpy's inf/NaN semantics instead of raising."""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _nz(x: float) -> float:
+    return 0.0 if x != x else x
+
+
+def _sign(x: float) -> float:
+    if x != x:
+        return NAN
+    return float((x > 0) - (x < 0))
+
+
+def _returns(window: int):
+    return lambda engine: RollingMoments(window)
+
+
+def _sums(window: int):
+    return lambda engine: RollingSum(window)
+
+
+def _lags(maxlen: int):
+    return lambda engine: Lagged(maxlen)
+
+
+# Price, basis and funding
+
+@metric("VWAP", "VWAP_numerator", "Volume")
+def vwap(numerator, volume):
+    return numerator / volume if volume != 0 else NAN
+
+
+@metric("VWAPDeviation", "LastPrice", "VWAP")
+def vwap_deviation(last, vwap):
+    return _div(last - vwap, vwap)
+
+
+@metric("BasisPremium", "LastPrice", "SpotPrice")
+def basis_premium(last, spot):
+    return _div(last - spot, spot)
+
+
+@metric("_funding_lags", "FundingRate", state=_lags(SPAN_24H))
+def funding_lags(acc, funding):
+    return acc
+
+
+@metric("FundingRateΔ_1h", "_funding_lags", "FundingRate")
+def funding_delta_1h(lags, funding):
+    return lags.diff(funding, SPAN_1H)
+
+
+@metric("FundingRateΔ_24h", "_funding_lags", "FundingRate")
+def funding_delta_24h(lags, funding):
+    return lags.diff(funding, SPAN_24H)
+
+
+@metric("AnnualizedFunding", "FundingRate")
+def annualized_funding(funding):
+    return funding * 3 * 365
+
+
+@metric("PredictedFunding", "FundingRate", state=_sums(8))
+def predicted_funding(acc, funding):
+    return acc.mean(funding)
+
+
+@metric("_basis_lags", "BasisPremium", state=_lags(SPAN_1H))
+def basis_lags(acc, basis):
+    return acc
+
+
+@metric("BasisMomentum_1m", "_basis_lags", "BasisPremium")
+def basis_momentum_1m(lags, basis):
+    return lags.diff(basis, 1)
+
+
+@metric("BasisMomentum_5m", "_basis_lags", "BasisPremium")
+def basis_momentum_5m(lags, basis):
+    return lags.diff(basis, 5)
+
+
+@metric("BasisMomentum_1h", "_basis_lags", "BasisPremium")
+def basis_momentum_1h(lags, basis):
+    return lags.diff(basis, SPAN_1H)
+
+
+# Open interest
+
+@metric("_oi_lags", "OpenInterest", state=_lags(SPAN_1H))
+def oi_lags(acc, oi):
+    return acc
+
+
+@metric("OIΔ_1m", "_oi_lags", "OpenInterest")
+def oi_delta_1m(lags, oi):
+    return lags.diff(oi, 1)
+
+
+@metric("OIΔ_5m", "_oi_lags", "OpenInterest")
+def oi_delta_5m(lags, oi):
+    return lags.diff(oi, 5)
+
+
+@metric("OIΔ_1h", "_oi_lags", "OpenInterest")
+def oi_delta_1h(lags, oi):
+    return lags.diff(oi, SPAN_1H)
+
+
+@metric("OpenInterestUSD", "OpenInterest", "LastPrice")
+def open_interest_usd(oi, last):
+    return oi * last
+
+
+@metric("LeverageRatio", "OpenInterest", "MarketCap")
+def leverage_ratio(oi, market_cap):
+    return oi / (market_cap + 1e-9)
+
+
+@metric("LongShortRatio", "LongOI", "ShortOI")
+def long_short_ratio(long_oi, short_oi):
+    return long_oi / (short_oi + 1e-9)
+
+
+@metric("NetOIFlow", "LongOI", "ShortOI", "prev:LongOI", "prev:ShortOI")
+def net_oi_flow(long_oi, short_oi, prev_long, prev_short):
+    return _nz(long_oi - prev_long) - _nz(short_oi - prev_short)
+
+
+# Returns and volatility
+
+@metric("Return", "LastPrice", "prev:LastPrice")
+def bar_return(last, prev_last):
+    return _nz(_div(last, prev_last) - 1)
+
+
+@metric("_ret5", "Return", state=_returns(5))
+def ret5(acc, ret):
+    return acc.peek(ret)
+
+
+@metric("_ret1h", "Return", state=_returns(SPAN_1H))
+def ret1h(acc, ret):
+    return acc.peek(ret)
+
+
+@metric("_ret24h", "Return", state=_returns(SPAN_24H))
+def ret24h(acc, ret):
+    return acc.peek(ret)
+
+
+@metric("RealizedVolatility_5m", "_ret5")
+def realized_vol_5m(m5):
+    return m5.std * math.sqrt(5)
+
+
+@metric("RealizedVolatility_1h", "_ret1h")
+def realized_vol_1h(m1h):
+    return m1h.std * math.sqrt(SPAN_1H)
+
+
+@metric("RealizedVolatility_24h", "_ret24h")
+def realized_vol_24h(m24h):
+    return m24h.std * math.sqrt(SPAN_24H)
+
+
+@metric("VolatilityImpulse", "RealizedVolatility_5m", "prev:RealizedVolatility_5m")
+def volatility_impulse(rv5, prev_rv5):
+    return rv5 - prev_rv5
+
+
+@metric("VolOfVol", "RealizedVolatility_5m", state=_returns(20))
+def vol_of_vol(acc, rv5):
+    return acc.peek(rv5).std
+
+
+# Filled in by DerivedMetrics from the reference symbol's table.
+
+@metric("BetaBTC", "Return")
+def beta_btc(ret):
+    return NAN
+
+
+@metric("CrossExchangeBasis", "BasisPremium")
+def cross_exchange_basis(basis):
+    return NAN
+
+
+# Tail risk and risk-adjusted returns
+
+@metric("_tail", "Return", state=lambda engine: TailRisk(engine.tail_window, q=0.05, mode=engine.tail_mode))
+def tail(acc, ret):
+    return acc.peek(ret)
+
+
+@metric("ValueAtRisk_95", "_tail")
+def value_at_risk(stats):
+    return stats[0]
+
+
+@metric("ExpectedShortfall_95", "_tail")
+def expected_shortfall(stats):
+    return stats[1]
+
+
+@metric("MaxAdverseExcursion", "_tail")
+def max_adverse_excursion(stats):
+    return stats[2]
+
+
+@metric("KellyFraction", "_ret24h")
+def kelly_fraction(m24h):
+    return m24h.mean / (m24h.var + 1e-9)
+
+
+@metric("RollingSharpeRatio", "_ret24h")
+def rolling_sharpe(m24h):
+    return m24h.mean / (m24h.std + 1e-9)
+
+
+@metric("MomentumScore", "RollingSharpeRatio", "_ret1h")
+def momentum_score(sharpe_24h, m1h):
+    return sharpe_24h * _sign(m1h.mean)
+
+
+@metric("ZScoreReturns", "Return", "_ret1h")
+def zscore_returns(ret, m1h):
+    return (ret - m1h.mean) / (m1h.std + 1e-9)
+
+
+# Bands
+
+@metric("_price20", "LastPrice", state=_returns(20))
+def price20(acc, last):
+    return acc.peek(last)
+
+
+@metric("BollingerBandwidth", "_price20")
+def bollinger_bandwidth(p20):
+    upper = p20.mean + 2 * p20.std
+    lower = p20.mean - 2 * p20.std
+    return (upper - lower) / (p20.mean + 1e-9)
+
+
+@metric("_ema20", "LastPrice", state=lambda engine: Ewm(20))
+def ema20(acc, last):
+    return acc.peek(last)
+
+
+@metric("_true_range", "High", "Low", "prev:LastPrice")
+def true_range(high, low, prev_last):
+    ranges = [abs(v) for v in (high - low, high - prev_last, low - prev_last) if v == v]
+    return max(ranges) if ranges else NAN
+
+
+@metric("_atr14", "_true_range", state=_sums(14))
+def atr14(acc, tr):
+    return acc.mean(tr)
+
+
+@metric("ATRBandsWidth", "_atr14", "LastPrice")
+def atr_bands_width(atr, last):
+    return (2 * atr) / (last + 1e-9)
+
+
+@metric("KeltnerChannelWidth", "_atr14", "_ema20")
+def keltner_channel_width(atr, ema):
+    return (4 * atr) / (ema + 1e-9)
+
+
+# Funding aggregates
+
+@metric("CumulativeFunding", "FundingRate", state=lambda engine: Cumulative())
+def cumulative_funding(acc, funding):
+    return acc.sum(funding)
+
+
+@metric("_abs_funding", "FundingRate")
+def abs_funding(funding):
+    return abs(funding)
+
+
+@metric("CumulativeFundingAbsolute", "_abs_funding", state=lambda engine: Cumulative())
+def cumulative_funding_abs(acc, funding):
+    return acc.sum(funding)
+
+
+@metric("FundingVolatility", "FundingRate", state=_returns(SPAN_24H))
+def funding_volatility(acc, funding):
+    return acc.peek(funding).std
+
+
+@metric("FundingLeverageCompositeIndex", "FundingRate", "LeverageRatio")
+def funding_leverage_index(funding, leverage):
+    return funding * leverage
+
+
+# Oscillators
+
+@metric("_price_delta", "LastPrice", "prev:LastPrice")
+def price_delta(last, prev_last):
+    return last - prev_last
+
+
+@metric("_up", "_price_delta")
+def up_move(delta):
+    return max(delta, 0.0) if delta == delta else NAN
+
+
+@metric("_down", "_price_delta")
+def down_move(delta):
+    return -min(delta, 0.0) if delta == delta else NAN
+
+
+@metric("_roll_up", "_up", state=_sums(14))
+def roll_up(acc, up):
+    return acc.mean(up)
+
+
+@metric("_roll_down", "_down", state=_sums(14))
+def roll_down(acc, down):
+    return acc.mean(down)
+
+
+@metric("RSI", "_roll_up", "_roll_down")
+def rsi(up, down):
+    rs = up / (down + 1e-9)
+    return 100 - 100 / (1 + rs)
+
+
+@metric("StochasticRSI", "RSI", state=lambda engine: RollingExtrema(14))
+def stochastic_rsi(acc, rsi):
+    low, high = acc.peek(rsi)
+    return (rsi - low) / (high - low + 1e-9)
+
+
+@metric("_obv_flow", "_price_delta", "Volume")
+def obv_flow(delta, volume):
+    return _sign(_nz(delta)) * volume
+
+
+@metric("OBV", "_obv_flow", state=lambda engine: Cumulative())
+def obv(acc, flow):
+    return acc.sum(flow)
+
+
+@metric("_ema1", "LastPrice", state=lambda engine: Ewm(9))
+def ema1(acc, last):
+    return acc.peek(last)
+
+
+@metric("_ema2", "_ema1", state=lambda engine: Ewm(9))
+def ema2(acc, x):
+    return acc.peek(x)
+
+
+@metric("_ema3", "_ema2", state=lambda engine: Ewm(9))
+def ema3(acc, x):
+    return acc.peek(x)
+
+
+@metric("TRIX", "_ema3", state=_lags(1))
+def trix(acc, ema):
+    return (_div(ema, acc.prev()) - 1) * 100
+
+
+# Money flow
+
+@metric("_mf_vol", "LastPrice", "High", "Low", "Volume")
+def mf_vol(last, high, low, volume):
+    mf_mul = ((last - low) - (high - last)) / (high - low + 1e-9)
+    return mf_mul * volume
+
+
+@metric("_vol20", "Volume", state=_sums(20))
+def vol20(acc, volume):
+    return acc.sum(volume)
+
+
+@metric("ChaikinMoneyFlow", "_mf_vol", "_vol20", state=_sums(20))
+def chaikin_money_flow(acc, mf, vol_sum):
+    return acc.sum(mf) / (vol_sum if vol_sum != 0 else NAN)
+
+
+@metric("_typical", "High", "Low", "LastPrice")
+def typical_price(high, low, last):
+    return (high + low + last) / 3
+
+
+@metric("_prev_typical", "prev:High", "prev:Low", "prev:LastPrice")
+def prev_typical_price(high, low, last):
+    return (high + low + last) / 3
+
+
+@metric("_pos_mf", "_typical", "_prev_typical", "Volume")
+def positive_money_flow(typical, prev_typical, volume):
+    return typical * volume if typical > prev_typical else 0.0
+
+
+@metric("_neg_mf", "_typical", "_prev_typical", "Volume")
+def negative_money_flow(typical, prev_typical, volume):
+    return typical * volume if typical < prev_typical else 0.0
+
+
+@metric("_pos_mf14", "_pos_mf", state=_sums(14))
+def pos_mf14(acc, mf):
+    return acc.sum(mf)
+
+
+@metric("_neg_mf14", "_neg_mf", state=_sums(14))
+def neg_mf14(acc, mf):
+    return acc.sum(mf)
+
+
+@metric("MoneyFlowIndex", "_pos_mf14", "_neg_mf14")
+def money_flow_index(pos, neg):
+    return 100 - (100 / (1 + pos / (abs(neg) + 1e-9)))
+
+
+@metric("TWAP", "_price20")
+def twap(p20):
+    return p20.mean
+
+
+@metric("TWAPDeviation", "LastPrice", "TWAP")
+def twap_deviation(last, twap):
+    return (last - twap) / (twap + 1e-9)
+
+
+# Long-horizon risk
+
+@metric("HV10d", "Return", state=_returns(SPAN_10D))
+def hv10d(acc, ret):
+    return acc.peek(ret).std * math.sqrt(SPAN_10D)
+
+
+@metric("HV20d", "Return", state=_returns(SPAN_20D))
+def hv20d(acc, ret):
+    return acc.peek(ret).std * math.sqrt(SPAN_20D)
+
+
+@metric("_win", "Return")
+def win(ret):
+    return 1.0 if ret > 0 else 0.0
+
+
+@metric("_loss", "Return")
+def loss(ret):
+    return 1.0 if ret < 0 else 0.0
+
+
+@metric("_wins", "_win", state=_sums(SPAN_1H))
+def wins(acc, x):
+    return acc.sum(x)
+
+
+@metric("_losses", "_loss", state=_sums(SPAN_1H))
+def losses(acc, x):
+    return acc.sum(x)
+
+
+@metric("WinLossRatio", "_wins", "_losses")
+def win_loss_ratio(wins, losses):
+    return wins / (losses + 1e-9)
+
+
+@metric("_downside_sq", "Return")
+def downside_sq(ret):
+    return min(0.0, ret) ** 2
+
+
+@metric("_downside", "_downside_sq", state=_sums(SPAN_24H))
+def downside(acc, sq):
+    return math.sqrt(acc.mean(sq))
+
+
+@metric("RollingSortinoRatio", "_ret24h", "_downside")
+def rolling_sortino(m24h, downside):
+    return m24h.mean / (downside + 1e-9)
+
+
+@metric("_drawdown", "LastPrice", state=lambda engine: Cumulative())
+def drawdown(acc, last):
+    return last / acc.max(last) - 1
+
+
+@metric("_drawdown_sq", "_drawdown")
+def drawdown_sq(dd):
+    return dd ** 2
+
+
+@metric("UlcerIndex", "_drawdown_sq", state=_sums(14))
+def ulcer_index(acc, sq):
+    return math.sqrt(acc.mean(sq))
+
+
+# Order flow and liquidity
+
+@metric("AggressorVolumeDelta", "CVD", "prev:CVD")
+def aggressor_volume_delta(cvd, prev_cvd):
+    return _nz(cvd - prev_cvd)
+
+
+@metric("NetAggressorVolumeFlow", "AggressorVolumeDelta", state=_sums(5))
+def net_aggressor_volume_flow(acc, avd):
+    return acc.sum(avd)
+
+
+@metric("_volume_delta", "Volume", "prev:Volume")
+def volume_delta(volume, prev_volume):
+    delta = volume - prev_volume
+    return NAN if delta == 0 else delta
+
+
+@metric("FlowImbalance", "AggressorVolumeDelta", "_volume_delta")
+def flow_imbalance(avd, vol_delta):
+    return avd / vol_delta
+
+
+@metric("MeanTradeSize", "_volume_delta", "TradeCount")
+def mean_trade_size(vol_delta, trades):
+    return vol_delta / trades if trades else NAN
+
+
+@metric("TradeIntensity", "TradeCount")
+def trade_intensity(trades):
+    return trades
+
+
+@metric("LiquidationVolumeBuy", "LiquidationPressureBuy")
+def liquidation_volume_buy(x):
+    return x
+
+
+@metric("LiquidationVolumeSell", "LiquidationPressureSell")
+def liquidation_volume_sell(x):
+    return x
+
+
+@metric(
+    "PendingLiquidationPressure",
+    "LiquidationPressureBuy",
+    "LiquidationPressureSell",
+    "prev:LiquidationPressureBuy",
+    "prev:LiquidationPressureSell",
+)
+def pending_liquidation_pressure(buy, sell, prev_buy, prev_sell):
+    return _nz(buy - prev_buy) - _nz(sell - prev_sell)
+
+
+@metric("_spread5", "QuotedSpread", state=_sums(5))
+def spread5(acc, spread):
+    return acc.mean(spread)
+
+
+@metric("_depth5", "DepthAt0_5pct", state=_sums(5))
+def depth5(acc, depth):
+    return acc.mean(depth)
+
+
+@metric("LiquidityStressIndex", "_spread5", "_depth5")
+def liquidity_stress_index(spread, depth):
+    return spread / (depth + 1e-9)
+
+
+class MetricsEngine:
+    """Incremental DerivedMetrics state for a single symbol.
+
+    Rolling accumulators only hold closed bars. Every tick re-derives the
+    open bar's row from that state via ``peek`` and queues the values to be
+    committed when the next bar starts, so a tick never walks history.
+
+    Only ``columns`` (every registered metric when None) and what they
+    depend on are computed; see :mod:`trading.metric_registry`.
+    """
+
+    def __init__(
+        self,
+        tail_window: int = SPAN_24H,
+        tail_mode: str = "exact",
+        columns: Optional[Iterable[str]] = None,
+        registry: MetricRegistry = REGISTRY,
+    ):
+        self.ts: Optional[pd.Timestamp] = None
+        self.bar: Dict[str, float] = {}
+        self.prev: Dict[str, float] = {}
+        self.row: Dict[str, float] = {}
+        self._pending: List[Tuple[Any, float]] = []
+        self.tail_window = tail_window
+        self.tail_mode = tail_mode
+        self.registry = registry
+        self.columns = None if columns is None else set(columns)
+        self.states: Dict[str, Any] = {}
+        self._build()
+
+    def _build(self) -> None:
+        plan = self.registry.plan(self.columns)
+        for m in plan:
+            if m.state is not None and m.name not in self.states:
+                self.states[m.name] = m.state(self)
+        self._run = compile_plan(plan, self.states)
+        self.outputs = [m.name for m in plan if m.public]
+
+    def require(self, columns: Iterable[str]) -> None:
+        """Start computing ``columns`` too; new windows fill from here on."""
+        if self.columns is None:
+            return
+        new = set(columns) - self.columns
+        if new:
+            self.columns |= new
+            self._build()
+
+    def _roll(self, ts: pd.Timestamp, price: float) -> None:
+        for acc, x in self._pending:
+            acc.push(x)
+        self._pending = []
+        prev = self.bar
+        self.ts = ts
+        self.bar = {
+            "Open": price,
+            "High": price,
+            "Low": price,
+            "VWAP_numerator": prev.get("VWAP_numerator", 0.0),
+            "Volume": prev.get("Volume", 0.0),
+            "CVD": prev.get("CVD", 0.0),
+            "TradeCount": 0,
+            "AdverseSelectionCost": 0.0,
+            "LiquidationPressureBuy": 0.0,
+            "LiquidationPressureSell": 0.0,
+            "LiquidationClusterDensity": 0.0,
+        }
+
+    def update(self, ts: pd.Timestamp, tick: Dict[str, float], book: Dict[str, float]) -> Dict[str, float]:
+        """Fold one tick into the bar at ``ts`` and return that bar's row.
+
+        Ticks older than the open bar are folded into the open bar; the
+        rolling state only moves forward.
+        """
+        price = tick["price"]
+        size = tick["size"]
+        if self.ts is None or ts > self.ts:
+            self.prev = self.row
+            self._roll(ts, price)
+        bar = self.bar
+        bar["LastPrice"] = price
+        bar["High"] = max(bar["High"], price)
+        bar["Low"] = min(bar["Low"], price)
+        for key in ("SpotPrice", "FundingRate", "OpenInterest", "LongOI", "ShortOI", "MarketCap"):
+            bar[key] = tick[key]
+        bar["VWAP_numerator"] += price * size
+        bar["Volume"] += size
+        bar["TradeCount"] += 1
+        bar["CVD"] += tick["side"] * size
+        bar["AdverseSelectionCost"] += tick["side"] * (price - tick["micro"]) * size
+        bar["LiquidationPressureBuy"] += tick["liq_buy"]
+        bar["LiquidationPressureSell"] += tick["liq_sell"]
+        bar["LiquidationClusterDensity"] = tick["liq_density"]
+        bar.update(book)
+        self.row = self._compute()
+        return self.row
+
+    def seed(self, bars: pd.DataFrame, metrics: pd.DataFrame) -> None:
+        """Rebuild state from backfilled history, leaving the last bar open.
+
+        ``bars`` holds the per-bar inputs (base and order book columns) and
+        ``metrics`` the matching rows of ``batch_metrics``. Running totals
+        and EMAs are taken from the bars older than the longest window; the
+        rest are replayed bar by bar so every rolling window holds exactly
+        what a tick-by-tick replay would have committed.
+        """
+        start = max(0, len(bars) - max(SPAN_20D, self.tail_window))
+        if start:
+            head = metrics.iloc[:start]
+            last = head["LastPrice"]
+            for name in ("CumulativeFunding", "CumulativeFundingAbsolute", "OBV"):
+                if name in self.states:
+                    self.states[name].total = float(head[name].iloc[-1])
+            if "_drawdown" in self.states:
+                self.states["_drawdown"].high = float(last.max())
+            if "_ema20" in self.states:
+                self.states["_ema20"].value = float(last.ewm(span=20, adjust=False).mean().iloc[-1])
+            ema = last
+            for name in ("_ema1", "_ema2", "_ema3"):
+                ema = ema.ewm(span=9, adjust=False).mean()
+                if name in self.states:
+                    self.states[name].value = float(ema.iloc[-1])
+            self.row = head.iloc[-1].to_dict()
+        self.replay(bars.iloc[start:])
+
+    def replay(self, bars: pd.DataFrame) -> int:
+        """Apply finished ``bars`` from the open bar on, leaving the last open.
+
+        A bar stamped like the open bar replaces it and older ones are
+        skipped. Returns how many bars were applied.
+        """
+        applied = 0
+        for ts, bar in zip(bars.index, bars.to_dict("records")):
+            if self.ts is not None and ts < self.ts:
+                continue
+            if self.ts is None or ts > self.ts:
+                self.prev = self.row
+                self._roll(ts, bar["Open"])
+            self.bar = bar
+            self.row = self._compute()
+            applied += 1
+        return applied
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Rolling state and the open bar, for :meth:`restore` in a new engine.
+
+        Pickle it whole: ``pending`` refers to the accumulators in
+        ``states``.
+        """
+        return {
+            "tail": (self.tail_window, self.tail_mode),
+            "ts": self.ts,
+            "bar": self.bar,
+            "prev": self.prev,
+            "row": self.row,
+            "pending": self._pending,
+            "states": self.states,
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Carry on from ``snapshot``; metrics it lacks state for start empty."""
+        if tuple(snapshot["tail"]) != (self.tail_window, self.tail_mode):
+            raise ValueError(f"Snapshot has tail risk settings {snapshot['tail']}")
+        self.ts = snapshot["ts"]
+        self.bar = snapshot["bar"]
+        self.prev = snapshot["prev"]
+        self.row = snapshot["row"]
+        self._pending = snapshot["pending"]
+        self.states.update(snapshot["states"])
+        self._build()
+
+    def _compute(self) -> Dict[str, float]:
+        row, self._pending = self._run(self.bar, self.prev)
+        return row
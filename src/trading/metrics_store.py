@@ -0,0 +1,298 @@
+"""Append-only columnar storage for finished DerivedMetrics bars.
+
+Rows are partitioned by symbol and UTC day::
+
+    <root>/<symbol>/<YYYY-MM-DD>/schema.json
+    <root>/<symbol>/<YYYY-MM-DD>/_index.bin     int64 epoch ns
+    <root>/<symbol>/<YYYY-MM-DD>/<column>.bin   raw values, dtype from schema
+
+Appends only ever extend files, so a crash can at worst leave a partition's
+files at different lengths; :meth:`ColumnStore.read` trims them to the
+shortest, and the first append to a partition truncates them to it so new
+rows stay aligned. A partition written with other columns is widened:
+columns it lacks are filled back to its first row, and the ones this
+store's schema lacks are filled in every new row. :class:`BackgroundWriter`
+moves the writes off the tick path.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("never", "flush", "close")
+_INDEX = "_index"
+
+
+class ColumnStore:
+    """Per-symbol, per-day directories of raw column files."""
+
+    def __init__(self, root: str, schema: Mapping[str, object]):
+        self.root = root
+        self.schema = {col: np.dtype(dtype) for col, dtype in schema.items()}
+        self._dirty: Set[str] = set()
+        # schema of every partition prepared for appending by this store
+        self._ready: Dict[str, Dict[str, np.dtype]] = {}
+
+    def _partition(self, symbol: str, day: str) -> str:
+        return os.path.join(self.root, symbol, day)
+
+    def _append(self, path: str, values: np.ndarray) -> None:
+        with open(path, "ab") as fh:
+            fh.write(values.tobytes())
+        self._dirty.add(path)
+
+    def sync(self) -> None:
+        """fsync every file appended to since the last sync."""
+        dirty, self._dirty = self._dirty, set()
+        for path in dirty:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _write_schema(path: str, schema: Mapping[str, np.dtype]) -> None:
+        schema_path = os.path.join(path, "schema.json")
+        tmp = schema_path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({col: dtype.str for col, dtype in schema.items()}, fh)
+        os.replace(tmp, schema_path)
+
+    def _prepare(self, path: str) -> Dict[str, np.dtype]:
+        """The partition's schema, once its files are cut to whole rows and widened to ours."""
+        schema = self._ready.get(path)
+        if schema is not None:
+            return schema
+        schema_path = os.path.join(path, "schema.json")
+        if not os.path.exists(schema_path):
+            os.makedirs(path, exist_ok=True)
+            self._write_schema(path, self.schema)
+            schema = self._ready[path] = dict(self.schema)
+            return schema
+        with open(schema_path) as fh:
+            schema = {col: np.dtype(dtype) for col, dtype in json.load(fh).items()}
+        for col, dtype in self.schema.items():
+            if col in schema and schema[col] != dtype:
+                raise ValueError(f"{path}: column {col} is stored as {schema[col]}, not {dtype}")
+        files = {os.path.join(path, f"{_INDEX}.bin"): np.dtype(np.int64)}
+        files.update((os.path.join(path, f"{col}.bin"), dtype) for col, dtype in schema.items())
+        sizes = {f: os.path.getsize(f) if os.path.exists(f) else 0 for f in files}
+        rows = min(sizes[f] // dtype.itemsize for f, dtype in files.items())
+        for f, dtype in files.items():
+            if sizes[f] > rows * dtype.itemsize:
+                LOGGER.warning("trimming torn append in %s", f)
+                with open(f, "r+b") as fh:
+                    fh.truncate(rows * dtype.itemsize)
+        added = [col for col in self.schema if col not in schema]
+        for col in added:
+            dtype = self.schema[col]
+            self._append(os.path.join(path, f"{col}.bin"), self._fill(rows, dtype))
+            schema[col] = dtype
+        if added:
+            self._write_schema(path, schema)
+        self._ready[path] = schema
+        return schema
+
+    @staticmethod
+    def _fill(n: int, dtype: np.dtype) -> np.ndarray:
+        return np.full(n, np.nan if dtype.kind == "f" else 0, dtype=dtype)
+
+    def append(self, symbol: str, frame: pd.DataFrame) -> None:
+        """Append ``frame`` (UTC DatetimeIndex) to the symbol's day partitions."""
+        if frame.empty:
+            return
+        stamps = frame.index.as_unit("ns").asi8
+        days = frame.index.strftime("%Y-%m-%d")
+        for day in pd.unique(days):
+            mask = days == day
+            path = self._partition(symbol, day)
+            schema = self._prepare(path)
+            try:
+                self._append(os.path.join(path, f"{_INDEX}.bin"), stamps[mask])
+                for col, dtype in schema.items():
+                    if col in frame.columns:
+                        values = frame[col].to_numpy()[mask].astype(dtype)
+                    else:
+                        values = self._fill(int(mask.sum()), dtype)
+                    self._append(os.path.join(path, f"{col}.bin"), values)
+            except BaseException:
+                # the partition may be torn now; check it again before the next append
+                self._ready.pop(path, None)
+                raise
+
+    def symbols(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    def read(
+        self,
+        symbol: str,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+    ) -> pd.DataFrame:
+        """Load ``symbol``'s rows with ``start <= ts <= end``."""
+        base = os.path.join(self.root, symbol)
+        days = sorted(os.listdir(base)) if os.path.isdir(base) else []
+        if start is not None:
+            days = [d for d in days if d >= pd.Timestamp(start).strftime("%Y-%m-%d")]
+        if end is not None:
+            days = [d for d in days if d <= pd.Timestamp(end).strftime("%Y-%m-%d")]
+        frames = [self._read_partition(os.path.join(base, day)) for day in days]
+        if not frames:
+            return pd.DataFrame(columns=list(self.schema))
+        df = pd.concat(frames)
+        if start is not None or end is not None:
+            df = df.loc[start:end]
+        return df
+
+    def _read_partition(self, path: str) -> pd.DataFrame:
+        with open(os.path.join(path, "schema.json")) as fh:
+            schema = {col: np.dtype(dtype) for col, dtype in json.load(fh).items()}
+        stamps = np.fromfile(os.path.join(path, f"{_INDEX}.bin"), dtype=np.int64)
+        columns = {col: np.fromfile(os.path.join(path, f"{col}.bin"), dtype=dtype) for col, dtype in schema.items()}
+        n = min([len(stamps)] + [len(v) for v in columns.values()])
+        index = pd.DatetimeIndex(stamps[:n].view("M8[ns]")).tz_localize("UTC")
+        return pd.DataFrame({col: v[:n] for col, v in columns.items()}, index=index)
+
+
+class _Control(NamedTuple):
+    done: threading.Event
+    stop: bool
+
+
+class BackgroundWriter:
+    """Bounded write-behind queue in front of a :class:`ColumnStore`.
+
+    :meth:`submit` never blocks: a frame that would take the queue past
+    ``max_rows`` rows is dropped and its rows counted; one larger than
+    ``max_rows`` is only accepted into an empty queue. Rows count
+    against the bound until they are written. A daemon thread batches
+    queued rows and appends them once ``flush_rows`` are buffered or
+    ``flush_interval`` seconds have passed. ``fsync`` is ``"never"``, ``"flush"`` (after every batch) or
+    ``"close"`` (once, on :meth:`close`).
+    """
+
+    def __init__(
+        self,
+        store: ColumnStore,
+        flush_interval: float = 1.0,
+        flush_rows: int = 1024,
+        max_rows: int = 10_000,
+        fsync: str = "flush",
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.store = store
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self.max_rows = max_rows
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        # rows submitted and not yet written, guarded by _lock
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Rows submitted and not yet written."""
+        return self._queued
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    def submit(self, symbol: str, frame: pd.DataFrame) -> bool:
+        """Queue finished rows for ``symbol``; False if they were dropped."""
+        n = len(frame)
+        with self._lock:
+            if self._closed or (self._queued and self._queued + n > self.max_rows):
+                self.dropped += n
+                return False
+            self._queued += n
+        self._queue.put_nowait((symbol, frame))
+        return True
+
+    def _run(self) -> None:
+        pending: List[tuple] = []
+        rows = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            control = item if isinstance(item, _Control) else None
+            if item is not None and control is None:
+                pending.append(item)
+                rows += len(item[1])
+            if control or rows >= self.flush_rows or time.monotonic() >= deadline:
+                self._write(pending)
+                with self._lock:
+                    self._queued -= rows
+                if self.fsync == "flush" or (control and control.stop and self.fsync == "close"):
+                    self._sync()
+                pending = []
+                rows = 0
+                deadline = time.monotonic() + self.flush_interval
+            if control:
+                control.done.set()
+                if control.stop:
+                    return
+
+    def _sync(self) -> None:
+        try:
+            self.store.sync()
+        except OSError:
+            self.errors += 1
+            LOGGER.exception("fsync failed")
+
+    def _write(self, pending: List[tuple]) -> None:
+        by_symbol: Dict[str, List[pd.DataFrame]] = {}
+        for symbol, frame in pending:
+            by_symbol.setdefault(symbol, []).append(frame)
+        for symbol, frames in by_symbol.items():
+            frame = frames[0] if len(frames) == 1 else pd.concat(frames)
+            try:
+                self.store.append(symbol, frame)
+                self.written += len(frame)
+            except Exception:
+                self.errors += 1
+                LOGGER.exception("Persist failed for %s", symbol)
+
+    def _control(self, stop: bool, timeout: Optional[float]) -> bool:
+        done = threading.Event()
+        self._queue.put(_Control(done, stop))
+        return done.wait(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is on disk."""
+        return self._control(False, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write what is queued, apply the close fsync and stop the thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._control(True, timeout)
+        self._thread.join(timeout)
@@ -0,0 +1,306 @@
+"""Local L2 order books kept up to date from level2 deltas.
+
+An :class:`OrderBook` lays each side out on a fixed grid of ``levels``
+price ticks around the market, sizes in a float array indexed by tick.
+Two Fenwick trees per side, over the sizes and over the count of occupied
+ticks, make every delta O(log n) and answer best-level and cumulative-depth
+queries in O(log n) without scanning. Levels beyond the grid on the far
+side of the market are left out; if the touch itself walks off the grid,
+the grid is recentred on it.
+
+Deltas carry the exchange sequence. A delta that does not follow the last
+applied one marks the book out of sync; deltas are then buffered until
+:meth:`OrderBook.load_snapshot` rebuilds the book and replays the buffered
+ones newer than the snapshot. :class:`OrderBooks` does that per symbol,
+fetching snapshots itself.
+"""
+import asyncio
+import logging
+from array import array
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+LEVELS = 1 << 15
+MAX_PENDING = 10_000
+
+
+class _Fenwick:
+    """Prefix sums with point updates, both O(log n)."""
+
+    def __init__(self, values: np.ndarray):
+        n = len(values)
+        cum = np.concatenate(([0], np.cumsum(values)))
+        i = np.arange(n + 1)
+        # node i covers values (i - lowbit(i), i]; node 0 is unused
+        nodes = cum[i] - cum[i - (i & -i)]
+        self.tree = array("d" if nodes.dtype.kind == "f" else "q", nodes.tobytes())
+        self.n = n
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, i: int, delta) -> None:
+        tree, n = self.tree, self.n
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int):
+        """Sum of the first ``i`` values."""
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def search(self, target) -> int:
+        """Smallest index whose prefix sum, itself included, reaches ``target``."""
+        tree, n = self.tree, self.n
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] < target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return pos
+
+
+class _Side:
+    def __init__(self, sizes: np.ndarray):
+        self.sizes = sizes
+        self.depth = _Fenwick(sizes)
+        self.count = _Fenwick((sizes > 0).astype(np.int64))
+        self.levels = int(np.count_nonzero(sizes))
+
+    def set(self, i: int, size: float) -> None:
+        old = float(self.sizes[i])
+        if size == old:
+            return
+        self.sizes[i] = size
+        self.depth.add(i, size - old)
+        occupied = (size > 0) - (old > 0)
+        if occupied:
+            self.count.add(i, occupied)
+            self.levels += occupied
+
+
+class OrderBook:
+    """Array-backed L2 book of one symbol on a grid of ``tick``-spaced prices."""
+
+    def __init__(self, tick: float, levels: int = LEVELS, max_pending: int = MAX_PENDING):
+        self.tick = tick
+        self.n = levels
+        self.max_pending = max_pending
+        self.origin = 0.0
+        self.sequence = 0
+        self.synced = False
+        self.gaps = 0
+        self.recentres = 0
+        self.clipped = 0
+        self._pending: List[Tuple[int, float, str, float]] = []
+        self._reset(np.zeros(levels), np.zeros(levels))
+
+    def _reset(self, bids: np.ndarray, asks: np.ndarray) -> None:
+        self.bids = _Side(bids)
+        self.asks = _Side(asks)
+
+    def _index(self, price: float) -> int:
+        return int(round((price - self.origin) / self.tick))
+
+    def price(self, i: int) -> float:
+        return self.origin + i * self.tick
+
+    def _centre(self, price: float) -> None:
+        self.origin = round(price / self.tick) * self.tick - (self.n // 2) * self.tick
+
+    def _side(self, side: str) -> _Side:
+        return self.bids if side in ("buy", "bid", "bids") else self.asks
+
+    # updates
+
+    def load_snapshot(self, sequence: int, bids: Sequence, asks: Sequence) -> None:
+        """Rebuild from a full book and replay buffered deltas newer than it."""
+        levels = [np.asarray(side, dtype=np.float64).reshape(-1, 2) for side in (bids, asks)]
+        prices = np.concatenate([lv[:1, 0] for lv in levels])
+        self._centre(prices.mean() if len(prices) else self.price(self.n // 2))
+        grids = []
+        for lv in levels:
+            grid = np.zeros(self.n)
+            idx = np.rint((lv[:, 0] - self.origin) / self.tick).astype(np.int64)
+            keep = (idx >= 0) & (idx < self.n)
+            grid[idx[keep]] = lv[keep, 1]
+            grids.append(grid)
+        self._reset(*grids)
+        self.sequence = sequence
+        self.synced = True
+        pending, self._pending = self._pending, []
+        for change in pending:
+            if change[0] > sequence:
+                self.apply(*change)
+
+    def apply(self, sequence: int, price: float, side: str, size: float) -> bool:
+        """Set ``side``'s size at ``price``; False while the book is out of sync."""
+        if not self.synced:
+            if len(self._pending) < self.max_pending:
+                self._pending.append((sequence, price, side, size))
+            return False
+        if sequence <= self.sequence:
+            return True
+        if sequence != self.sequence + 1:
+            LOGGER.warning("level2 gap: %d after %d", sequence, self.sequence)
+            self.gaps += 1
+            self.synced = False
+            self._pending = [(sequence, price, side, size)]
+            return False
+        book = self._side(side)
+        i = self._index(price)
+        if not 0 <= i < self.n:
+            self.sequence = sequence
+            # the touch left the grid: a bid above it or an ask below it
+            if size == 0 or (i < 0) == (book is self.bids):
+                self.clipped += 1
+                return True
+            self._recentre(price)
+            book = self._side(side)
+            i = self._index(price)
+        book.set(i, size)
+        self.sequence = sequence
+        return True
+
+    def _recentre(self, price: float) -> None:
+        """Move the grid to centre on ``price``, keeping the levels still on it."""
+        shift = self._index(price) - self.n // 2
+        self.origin += shift * self.tick
+        grids = []
+        for side in (self.bids, self.asks):
+            grid = np.zeros(self.n)
+            lo, hi = max(0, shift), min(self.n, self.n + shift)
+            if lo < hi:
+                grid[lo - shift:hi - shift] = side.sizes[lo:hi]
+            grids.append(grid)
+        self._reset(*grids)
+        self.recentres += 1
+
+    # queries
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        side = self.bids
+        if not side.levels:
+            return None
+        i = side.count.search(side.levels)
+        return self.price(i), float(side.sizes[i])
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        side = self.asks
+        if not side.levels:
+            return None
+        i = side.count.search(1)
+        return self.price(i), float(side.sizes[i])
+
+    def mid(self) -> float:
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return float("nan")
+        return (bid[0] + ask[0]) / 2
+
+    def depth(self, side: str, price: float) -> float:
+        """Size resting from the touch through ``price`` on ``side``."""
+        book = self._side(side)
+        if not book.levels:
+            return 0.0
+        i = min(max(self._index(price), -1), self.n - 1)
+        if book is self.bids:
+            best = book.count.search(book.levels)
+            return float(book.depth.prefix(best + 1) - book.depth.prefix(max(i, 0))) if i <= best else 0.0
+        best = book.count.search(1)
+        return float(book.depth.prefix(i + 1) - book.depth.prefix(best)) if i >= best else 0.0
+
+    def view(self, side: str) -> np.ndarray:
+        """Read-only zero-copy view of ``side``'s sizes by tick; tick ``i`` is at :meth:`price`."""
+        sizes = self._side(side).sizes.view()
+        sizes.flags.writeable = False
+        return sizes
+
+    def levels(self, depth: int = 20) -> Dict[str, np.ndarray]:
+        """Best ``depth`` levels a side as ``(n, 2)`` price/size arrays, best first.
+
+        The shape :class:`~trading.derived_metrics.DerivedMetrics` and
+        :class:`~trading.book_metrics.BookMetrics` take as an orderbook.
+        """
+        out = {}
+        for name, side in (("bids", self.bids), ("asks", self.asks)):
+            if not side.levels:
+                out[name] = np.empty((0, 2))
+                continue
+            n = min(depth, side.levels)
+            if side is self.bids:
+                # the n-th best bid is the (levels - n + 1)-th occupied tick
+                lo = side.count.search(side.levels - n + 1)
+                hi = side.count.search(side.levels) + 1
+                idx = np.flatnonzero(side.sizes[lo:hi])[::-1] + lo
+            else:
+                lo = side.count.search(1)
+                hi = side.count.search(n) + 1
+                idx = np.flatnonzero(side.sizes[lo:hi]) + lo
+            out[name] = np.column_stack((self.origin + idx * self.tick, side.sizes[idx]))
+        return out
+
+
+class OrderBooks:
+    """One :class:`OrderBook` per symbol, resynced from ``snapshot`` after gaps.
+
+    ``snapshot(symbol)`` returns ``{"sequence", "bids", "asks"}``, as KuCoin's
+    level2 snapshot endpoint does. ``ticks`` gives each symbol's tick size,
+    ``tick`` the default.
+    """
+
+    def __init__(
+        self,
+        snapshot: Callable[[str], Awaitable[Dict]],
+        tick: float = 0.01,
+        ticks: Optional[Dict[str, float]] = None,
+        levels: int = LEVELS,
+    ):
+        self.snapshot = snapshot
+        self.tick = tick
+        self.ticks = dict(ticks or {})
+        self.levels = levels
+        self.books: Dict[str, OrderBook] = {}
+        self._resyncs: Dict[str, asyncio.Task] = {}
+
+    def __getitem__(self, symbol: str) -> OrderBook:
+        return self.books[symbol]
+
+    def book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(self.ticks.get(symbol, self.tick), self.levels)
+        return book
+
+    def apply(self, change) -> bool:
+        """Apply a :class:`~trading.decoders.BookChange`; starts a resync when the book is out of sync."""
+        book = self.book(change.symbol)
+        if book.apply(change.sequence, change.price, change.side, change.size):
+            return True
+        if change.symbol not in self._resyncs:
+            self._resyncs[change.symbol] = asyncio.ensure_future(self._resync(change.symbol))
+        return False
+
+    async def _resync(self, symbol: str) -> None:
+        try:
+            snap = await self.snapshot(symbol)
+            self.books[symbol].load_snapshot(int(snap["sequence"]), snap["bids"], snap["asks"])
+        except Exception as exc:
+            LOGGER.warning("level2 snapshot for %s failed: %s", symbol, exc)
+        finally:
+            del self._resyncs[symbol]
+
+    async def wait_synced(self) -> None:
+        """Wait for the resyncs in flight."""
+        while self._resyncs:
+            await asyncio.gather(*list(self._resyncs.values()), return_exceptions=True)
@@ -1,6 +1,6 @@
 import os
 import asyncio
-from datetime import datetime
+from .clock import WALL_CLOCK, SimulatedClock, parse_speed
 from .config import Config
 from .ingestion import KucoinDataStream, HistoricalDataStream
 from .agents.sentiment import SentimentAgent
@@ -25,10 +25,19 @@ class TradingPlatform:
             secret=os.getenv("KUCOIN_SECRET", ""),
             passphrase=os.getenv("KUCOIN_PASSPHRASE", ""),
         )
-        if config.mode == "backtest" and hasattr(config, "data_path"):
-            self.stream = HistoricalDataStream(config.data_path)
+        if config.mode == "backtest" and config.data_path:
+            self.clock = SimulatedClock(parse_speed(config.replay_speed))
+            self.stream = HistoricalDataStream(config.data_path, clock=self.clock)
         else:
-            self.stream = KucoinDataStream(self.client, config.pairs)
+            self.clock = WALL_CLOCK
+            self.stream = KucoinDataStream(
+                self.client,
+                config.pairs,
+                config.feature_workers,
+                config.checkpoint_dir,
+                record_dir=config.record_dir,
+                connections=config.ws_connections,
+            )
         self.state = StateStore()
         self.agents = [
             SentimentAgent(),
@@ -39,7 +48,9 @@ class TradingPlatform:
         ]
         self.classifier = MarketRegimeClassifier()
         self.risk = RiskEngine(config.risk)
-        self.coordinator = MultiAgentCoordinator(self.agents)
+        for agent in self.agents:
+            agent.clock = self.clock
+        self.coordinator = MultiAgentCoordinator(self.agents, self.clock)
         # restore state
         for agent in self.agents:
             agent.history = self.state.load_agent_history(agent.name)
@@ -88,9 +99,18 @@ class TradingPlatform:
         self.state.save()
 
     async def run(self):
-        async for data in self.stream.stream():
-            await self.handle_slice(data)
-            now = datetime.utcnow()
-            if self.last_optimisation_day != now.date() and now.hour == 0:
-                self.optimise_weights()
-                self.last_optimisation_day = now.date()
+        try:
+            async for data in self.stream.stream():
+                await self.handle_slice(data)
+                now = self.clock.now()
+                if self.last_optimisation_day != now.date() and now.hour == 0:
+                    self.optimise_weights()
+                    self.last_optimisation_day = now.date()
+        finally:
+            # however the loop ends, write the last checkpoints and release
+            # the recorder and feature workers
+            if isinstance(self.stream, KucoinDataStream):
+                try:
+                    await self.stream.disconnect()
+                finally:
+                    self.stream.close()
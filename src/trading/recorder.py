@@ -0,0 +1,220 @@
+"""Capture raw feed messages and play them back.
+
+:class:`TickRecorder` appends every websocket message, as received, to a
+gzip-compressed log of length-prefixed records::
+
+    <int64 receive time, epoch ns><uint32 length><payload bytes>
+
+The log is split into segments named after their first receive time
+(``<root>/<ns>.tlog.gz``) and rotated by size or age. A daemon thread
+sync-flushes the compressor every ``flush_interval`` seconds, also when
+the feed has gone quiet, so a crash loses at most that much; readers stop
+cleanly at a torn tail.
+
+:class:`LogReplayer` is a stand-in for the websocket: it yields the
+recorded payloads with their original spacing divided by ``speed``, so a
+stream that has it assigned as its socket runs the same parsing code it
+ran in production.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import AsyncIterator, Callable, Iterator, List, NamedTuple, Optional, Union
+
+from .clock import MAX_SPEED, SimulatedClock
+
+LOGGER = logging.getLogger(__name__)
+
+SUFFIX = ".tlog.gz"
+_HEADER = struct.Struct("<qI")
+
+
+class Record(NamedTuple):
+    recv_ns: int
+    payload: bytes
+
+
+class TickRecorder:
+    """Append-only, rotating, compressed log of raw messages.
+
+    With ``flush_interval`` 0 every message is flushed as it is written.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 256 * 2**20,
+        max_seconds: float = 3600.0,
+        flush_interval: float = 1.0,
+        compresslevel: int = 3,
+        clock: Callable[[], int] = time.time_ns,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_ns = int(max_seconds * 1e9)
+        self.flush_interval = flush_interval
+        self.compresslevel = compresslevel
+        self.clock = clock
+        self.records = 0
+        self._raw = None
+        self._gz: Optional[gzip.GzipFile] = None
+        self._opened_ns = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        os.makedirs(root, exist_ok=True)
+
+    def _open(self, recv_ns: int) -> None:
+        self._close_segment()
+        path = os.path.join(self.root, f"{recv_ns:020d}{SUFFIX}")
+        self._raw = open(path, "xb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.compresslevel)
+        self._opened_ns = recv_ns
+
+    def _close_segment(self) -> None:
+        if self._gz is not None:
+            self._gz.close()
+            self._raw.close()
+            self._gz = self._raw = None
+
+    def record(self, message: Union[str, bytes], recv_ns: Optional[int] = None) -> None:
+        """Append ``message``, stamped now unless ``recv_ns`` is given."""
+        if recv_ns is None:
+            recv_ns = self.clock()
+        if isinstance(message, str):
+            message = message.encode()
+        with self._lock:
+            if self._gz is None or recv_ns - self._opened_ns >= self.max_ns or self._raw.tell() >= self.max_bytes:
+                self._open(recv_ns)
+            self._gz.write(_HEADER.pack(recv_ns, len(message)))
+            self._gz.write(message)
+            self.records += 1
+            self._dirty = True
+            if self.flush_interval <= 0:
+                self._flush()
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._run, name="tick-recorder-flush", daemon=True)
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._dirty:
+                    self._flush()
+
+    def _flush(self) -> None:
+        if self._gz is not None:
+            self._gz.flush(zlib.Z_SYNC_FLUSH)
+            self._raw.flush()
+        self._dirty = False
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            self._close_segment()
+
+    def __enter__(self) -> "TickRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def segments(root: str) -> List[str]:
+    """Segment files under ``root`` in recording order."""
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, name) for name in sorted(os.listdir(root)) if name.endswith(SUFFIX)]
+
+
+def _read_segment(path: str) -> Iterator[Record]:
+    with gzip.open(path, "rb") as fh:
+        try:
+            while True:
+                header = fh.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                recv_ns, size = _HEADER.unpack(header)
+                payload = fh.read(size)
+                if len(payload) < size:
+                    return
+                yield Record(recv_ns, payload)
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            LOGGER.warning("torn tail in %s", path)
+
+
+def read_log(path: str, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> Iterator[Record]:
+    """Records of a segment or a directory of segments, optionally within a receive-time range."""
+    paths = segments(path) if os.path.isdir(path) else [path]
+    if start_ns is not None:
+        # a segment holds everything from its name until the next one starts
+        names = [int(os.path.basename(p)[: -len(SUFFIX)]) for p in paths]
+        first = max([i for i, ns in enumerate(names) if ns <= start_ns], default=0)
+        paths = paths[first:]
+    for p in paths:
+        for record in _read_segment(p):
+            if start_ns is not None and record.recv_ns < start_ns:
+                continue
+            if end_ns is not None and record.recv_ns > end_ns:
+                return
+            yield record
+
+
+class LogReplayer:
+    """Websocket stand-in yielding a recorded log's messages.
+
+    Messages come out as text, spaced like they were received divided by
+    ``speed`` (:data:`~trading.clock.MAX_SPEED` for no waiting). Gaps are
+    measured from the start of the replay, so pacing does not drift. A
+    ``clock`` is advanced to each message's receive time; leave its own
+    speed at ``MAX_SPEED``, the replayer does the pacing.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        speed: float = MAX_SPEED,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        clock: Optional[SimulatedClock] = None,
+    ):
+        self.path = path
+        self.speed = speed
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.clock = clock
+        self.sent: List[str] = []
+
+    async def send(self, message: str) -> None:
+        """Subscriptions are recorded but not answered."""
+        self.sent.append(message)
+
+    async def close(self) -> None:
+        pass
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        first_ns = started = None
+        for recv_ns, payload in read_log(self.path, self.start_ns, self.end_ns):
+            if first_ns is None:
+                first_ns, started = recv_ns, loop.time()
+            elif self.speed != MAX_SPEED:
+                delay = started + (recv_ns - first_ns) / 1e9 / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if self.clock is not None:
+                await self.clock.advance(recv_ns // 10**6)
+            yield payload.decode()
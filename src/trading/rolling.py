@@ -0,0 +1,321 @@
+"""Streaming building blocks for rolling statistics.
+
+Every accumulator follows the same two-step protocol so a bar can be
+revised by many ticks before it closes:
+
+* ``peek(x)`` returns the statistic for the committed history plus the
+  open value ``x`` without mutating anything.
+* ``push(x)`` commits ``x`` once the bar is final.
+
+NaN handling mirrors pandas' ``rolling`` defaults: a window yields NaN
+until it holds ``min_periods`` non-NaN observations.
+"""
+import math
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+NAN = float("nan")
+
+
+def _isnan(x: float) -> bool:
+    return x != x
+
+
+class Lagged:
+    """Committed history used for ``diff``/``shift`` style lookbacks."""
+
+    def __init__(self, maxlen: int = 1):
+        self.values: Deque[float] = deque(maxlen=maxlen)
+
+    def prev(self, n: int = 1) -> float:
+        """Return the committed value ``n`` bars back, NaN if unavailable."""
+        if len(self.values) < n:
+            return NAN
+        return self.values[-n]
+
+    def diff(self, x: float, n: int = 1) -> float:
+        return x - self.prev(n)
+
+    def push(self, x: float) -> None:
+        self.values.append(x)
+
+
+class Cumulative:
+    """Running sum and running max over the whole history."""
+
+    def __init__(self) -> None:
+        self.total = 0.0
+        self.high = NAN
+
+    def sum(self, x: float) -> float:
+        return self.total + x
+
+    def max(self, x: float) -> float:
+        if _isnan(self.high):
+            return x
+        return x if x > self.high else self.high
+
+    def push(self, x: float) -> None:
+        self.total += x
+        self.high = self.max(x)
+
+
+class Ewm:
+    """Exponential moving average matching ``ewm(span, adjust=False)``."""
+
+    def __init__(self, span: float):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value: Optional[float] = None
+
+    def peek(self, x: float) -> float:
+        if self.value is None:
+            return x
+        return self.alpha * x + (1.0 - self.alpha) * self.value
+
+    def push(self, x: float) -> None:
+        self.value = self.peek(x)
+
+
+class EwmMoments:
+    """Exponentially weighted mean and variance, ``ewm(span, adjust=False)``
+    with ``var(bias=True)``, updated in West's incremental form."""
+
+    def __init__(self, span: float):
+        self.alpha = 2.0 / (span + 1.0)
+        self.mean: Optional[float] = None
+        self.var = 0.0
+
+    def peek(self, x: float) -> Tuple[float, float]:
+        if _isnan(x):
+            return (NAN, NAN) if self.mean is None else (self.mean, self.var)
+        if self.mean is None:
+            return x, 0.0
+        delta = x - self.mean
+        return self.mean + self.alpha * delta, (1.0 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+    def push(self, x: float) -> None:
+        if not _isnan(x):
+            self.mean, self.var = self.peek(x)
+
+
+class _Window:
+    """Committed tail of ``window - 1`` values plus a NaN counter.
+
+    Like pandas, it also tracks how many of the latest non-NaN values were
+    equal, so a window holding a single repeated value can report its mean
+    and variance exactly.
+    """
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values: Deque[float] = deque()
+        self.nans = 0
+        self._same = 0
+        self._last = NAN
+
+    def _valid(self, x: float) -> int:
+        """Number of non-NaN observations once ``x`` joins the window."""
+        return len(self.values) - self.nans + (0 if _isnan(x) else 1)
+
+    def _constant(self, x: float, n: int) -> bool:
+        """Whether all ``n`` non-NaN values, ``x`` included, are equal."""
+        if _isnan(x):
+            return self._same >= n
+        return x == self._last and self._same + 1 >= n
+
+    def _evict(self) -> Optional[float]:
+        if len(self.values) < self.window - 1:
+            return None
+        old = self.values.popleft()
+        if _isnan(old):
+            self.nans -= 1
+            return None
+        return old
+
+    def _append(self, x: float) -> None:
+        if not _isnan(x):
+            if x == self._last:
+                self._same += 1
+            else:
+                self._last = x
+                self._same = 1
+        if self.window <= 1:
+            return
+        self.values.append(x)
+        if _isnan(x):
+            self.nans += 1
+
+
+class RollingSum(_Window):
+    """Rolling sum/mean with periodic resummation to bound float drift."""
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        super().__init__(window, min_periods)
+        self.total = 0.0
+        self._pushes = 0
+
+    def sum(self, x: float) -> float:
+        if self._valid(x) < self.min_periods:
+            return NAN
+        return self.total + (0.0 if _isnan(x) else x)
+
+    def mean(self, x: float) -> float:
+        n = self._valid(x)
+        if n < self.min_periods or n == 0:
+            return NAN
+        if self._constant(x, n):
+            return self._last if _isnan(x) else x
+        return (self.total + (0.0 if _isnan(x) else x)) / n
+
+    def push(self, x: float) -> None:
+        old = self._evict()
+        if old is not None:
+            self.total -= old
+        self._append(x)
+        if not _isnan(x) and self.window > 1:
+            self.total += x
+        self._pushes += 1
+        if self._pushes >= self.window:
+            self._pushes = 0
+            self.total = math.fsum(v for v in self.values if not _isnan(v))
+
+
+class Moments(NamedTuple):
+    count: int
+    mean: float
+    var: float
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var) if self.var == self.var else NAN
+
+
+_EMPTY = Moments(0, NAN, NAN)
+
+
+class RollingMoments(_Window):
+    """Rolling mean and sample variance (``ddof=1``) via Welford add/remove."""
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        super().__init__(window, min_periods)
+        self.count = 0
+        self.avg = 0.0
+        self.m2 = 0.0
+        self._pushes = 0
+
+    def peek(self, x: float) -> Moments:
+        n = self._valid(x)
+        if n < self.min_periods or n == 0:
+            return _EMPTY
+        if _isnan(x):
+            mean, m2 = self.avg, self.m2
+        else:
+            mean = self.avg + (x - self.avg) / n
+            m2 = self.m2 + (x - self.avg) * (x - mean)
+        if self._constant(x, n):
+            mean, m2 = (self._last if _isnan(x) else x), 0.0
+        var = max(m2, 0.0) / (n - 1) if n > 1 else NAN
+        return Moments(n, mean, var)
+
+    def push(self, x: float) -> None:
+        old = self._evict()
+        if old is not None:
+            self.count -= 1
+            if self.count == 0:
+                self.avg = self.m2 = 0.0
+            else:
+                delta = old - self.avg
+                self.avg -= delta / self.count
+                self.m2 -= delta * (old - self.avg)
+        self._append(x)
+        if not _isnan(x) and self.window > 1:
+            self.count += 1
+            delta = x - self.avg
+            self.avg += delta / self.count
+            self.m2 += delta * (x - self.avg)
+        self._pushes += 1
+        if self._pushes >= self.window:
+            self._pushes = 0
+            self._resync()
+
+    def _resync(self) -> None:
+        valid = np.fromiter((v for v in self.values if not _isnan(v)), dtype=float)
+        self.count = len(valid)
+        self.avg = float(valid.mean()) if self.count else 0.0
+        self.m2 = float(((valid - self.avg) ** 2).sum()) if self.count else 0.0
+
+
+class RollingExtrema(_Window):
+    """Rolling min/max using monotonic deques."""
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        super().__init__(window, min_periods)
+        self._seq = 0
+        self._lo: Deque[Tuple[int, float]] = deque()
+        self._hi: Deque[Tuple[int, float]] = deque()
+
+    def peek(self, x: float) -> Tuple[float, float]:
+        if self._valid(x) < self.min_periods:
+            return NAN, NAN
+        lo = self._lo[0][1] if self._lo else NAN
+        hi = self._hi[0][1] if self._hi else NAN
+        if not _isnan(x):
+            lo = x if _isnan(lo) or x < lo else lo
+            hi = x if _isnan(hi) or x > hi else hi
+        return lo, hi
+
+    def push(self, x: float) -> None:
+        self._evict()
+        self._append(x)
+        self._seq += 1
+        first = self._seq - self.window + 2
+        while self._lo and self._lo[0][0] < first:
+            self._lo.popleft()
+        while self._hi and self._hi[0][0] < first:
+            self._hi.popleft()
+        if _isnan(x) or self.window <= 1:
+            return
+        while self._lo and self._lo[-1][1] >= x:
+            self._lo.pop()
+        self._lo.append((self._seq, x))
+        while self._hi and self._hi[-1][1] <= x:
+            self._hi.pop()
+        self._hi.append((self._seq, x))
+
+
+class RollingMedian(_Window):
+    """Rolling median over a sorted copy of the committed window."""
+
+    def __init__(self, window: int, min_periods: Optional[int] = None):
+        super().__init__(window, min_periods)
+        self.sorted: List[float] = []
+
+    def _rank(self, k: int, x: float, pos: int) -> float:
+        """k-th smallest of the committed values with ``x`` inserted at ``pos``."""
+        if k < pos:
+            return self.sorted[k]
+        if k == pos:
+            return x
+        return self.sorted[k - 1]
+
+    def peek(self, x: float) -> float:
+        n = self._valid(x)
+        if n < self.min_periods or n == 0:
+            return NAN
+        pos = n if _isnan(x) else bisect_left(self.sorted, x)
+        mid = n // 2
+        if n % 2:
+            return self._rank(mid, x, pos)
+        return (self._rank(mid - 1, x, pos) + self._rank(mid, x, pos)) / 2
+
+    def push(self, x: float) -> None:
+        old = self._evict()
+        if old is not None:
+            del self.sorted[bisect_left(self.sorted, old)]
+        self._append(x)
+        if not _isnan(x) and self.window > 1:
+            insort(self.sorted, x)
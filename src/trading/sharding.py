@@ -0,0 +1,354 @@
+"""Per-symbol FeatureFabric state sharded across worker processes.
+
+Symbols are assigned round-robin to shards. Each shard is a worker process
+owning one :class:`~trading.features.FeatureFabric` per symbol, with two
+shared-memory rings of fixed-width float64 records: ticks in and features
+out. The rings are single-producer/single-consumer. The writer fills a
+slot and then advances ``head``; the reader copies everything up to
+``head`` and then advances ``tail``. Nothing is pickled per tick. The
+worker is woken through a non-blocking pipe, which unlike an event cannot
+hang the parent when a worker dies mid-wait, and reports new features
+through another pipe, whose file descriptor an event loop can watch.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .checkpoint import Checkpointer
+from .features import BAR_FIELDS, FeatureFabric
+
+LOGGER = logging.getLogger(__name__)
+
+NAN = float("nan")
+TICK_FIELDS = ("ts", "price", "size", "bestBidPrice", "bestBidSize", "bestAskPrice", "bestAskSize")
+_DIFFS = tuple(f"d_{col}" for col in BAR_FIELDS)
+_HEADER = 2  # int64 head, tail
+
+
+class SharedRing:
+    """Fixed-width float64 records in a shared-memory ring."""
+
+    def __init__(self, slots: int, width: int, name: Optional[str] = None):
+        size = 8 * (_HEADER + slots * width)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.slots = slots
+        self.width = width
+        self._pos = np.ndarray((_HEADER,), dtype=np.int64, buffer=self.shm.buf)
+        self._data = np.ndarray((slots, width), dtype=np.float64, buffer=self.shm.buf, offset=8 * _HEADER)
+        if name is None:
+            self._pos[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def written(self) -> int:
+        return int(self._pos[0])
+
+    def __len__(self) -> int:
+        return int(self._pos[0] - self._pos[1])
+
+    def put(self, record: Sequence[float]) -> bool:
+        head = int(self._pos[0])
+        if head - int(self._pos[1]) >= self.slots:
+            return False
+        self._data[head % self.slots] = record
+        self._pos[0] = head + 1
+        return True
+
+    def take(self) -> np.ndarray:
+        """Copy out every available record and free their slots."""
+        tail = int(self._pos[1])
+        n = int(self._pos[0]) - tail
+        if n <= 0:
+            return self._data[:0].copy()
+        idx = (tail + np.arange(n)) % self.slots
+        rows = self._data[idx]
+        self._pos[1] = tail + n
+        return rows
+
+    def close(self, unlink: bool = False) -> None:
+        del self._pos, self._data
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def encode_tick(symbol_id: int, tick: dict) -> List[float]:
+    """Numeric tick record; missing fields are NaN."""
+    ts = tick.get("ts") or tick.get("time")
+    price = tick.get("price") or tick.get("lastPrice") or tick.get("lastTradePrice")
+    values = {"ts": ts, "price": price}
+    record = [float(symbol_id)]
+    for field in TICK_FIELDS:
+        value = values[field] if field in values else tick.get(field)
+        record.append(NAN if value is None else float(value))
+    return record
+
+
+def decode_tick(record: np.ndarray) -> dict:
+    return {field: float(v) for field, v in zip(TICK_FIELDS, record[1:]) if v == v}
+
+
+def _feature_columns(fabric: FeatureFabric) -> List[str]:
+    return [col for col in fabric.columns if col != "symbol"]
+
+
+def _work(tick_name, out_name, slots, tick_width, out_width, wake, notify, stop, names, checkpoint, fabric_kwargs):
+    ticks = SharedRing(slots, tick_width, tick_name)
+    out = SharedRing(slots, out_width, out_name)
+    checkpointer = None if checkpoint is None else Checkpointer(*checkpoint)
+    fabrics: Dict[int, FeatureFabric] = {}
+    columns = _feature_columns(FeatureFabric(**fabric_kwargs))
+
+    def fabric_for(symbol_id: int) -> FeatureFabric:
+        fabric = None
+        if checkpointer is not None and symbol_id < len(names):
+            fabric = checkpointer.load(names[symbol_id])
+        if not isinstance(fabric, FeatureFabric):
+            fabric = FeatureFabric(**fabric_kwargs)
+        fabrics[symbol_id] = fabric
+        return fabric
+
+    def save(symbol_ids) -> None:
+        for symbol_id in symbol_ids:
+            if symbol_id < len(names):
+                checkpointer.save(names[symbol_id], fabrics[symbol_id])
+
+    try:
+        while True:
+            records = ticks.take()
+            if not len(records):
+                if stop.is_set():
+                    return
+                if wake.poll(0.1):
+                    os.read(wake.fileno(), 65_536)
+                continue
+            for record in records:
+                symbol_id = int(record[0])
+                fabric = fabrics.get(symbol_id) or fabric_for(symbol_id)
+                features = fabric.update(decode_tick(record))
+                row = [float(symbol_id), 1.0 if _DIFFS[0] in features else 0.0]
+                row += [features.get(col, NAN) for col in columns]
+                while not out.put(row):
+                    time.sleep(0.001)
+            notify.send_bytes(b"\0")
+            if checkpointer is not None:
+                save([i for i in fabrics if i < len(names) and checkpointer.due(names[i])])
+    finally:
+        if checkpointer is not None:
+            save(list(fabrics))
+            checkpointer.close()
+        ticks.close()
+        out.close()
+        notify.close()
+
+
+class _Shard:
+    def __init__(self, ctx, slots: int, tick_width: int, out_width: int, names, checkpoint, fabric_kwargs: dict):
+        self.ticks = SharedRing(slots, tick_width)
+        self.out = SharedRing(slots, out_width)
+        wake, self.wake = ctx.Pipe(duplex=False)
+        os.set_blocking(self.wake.fileno(), False)
+        self.stop = ctx.Event()
+        self.reader, writer = ctx.Pipe(duplex=False)
+        self.submitted = 0
+        self.process = ctx.Process(
+            target=_work,
+            args=(self.ticks.name, self.out.name, slots, tick_width, out_width,
+                  wake, writer, self.stop, names, checkpoint, fabric_kwargs),
+            daemon=True,
+        )
+        self.process.start()
+        wake.close()
+        writer.close()
+
+    def poke(self) -> None:
+        """Wake the worker."""
+        try:
+            os.write(self.wake.fileno(), b"\0")
+        except (BlockingIOError, BrokenPipeError):
+            # a wake-up is already pending, or the worker is gone
+            pass
+
+    def clear_notifications(self) -> None:
+        try:
+            while self.reader.poll():
+                self.reader.recv_bytes()
+        except (EOFError, OSError):
+            pass
+
+    @property
+    def idle(self) -> bool:
+        return self.out.written >= self.submitted
+
+    def close(self, timeout: Optional[float]) -> None:
+        self.stop.set()
+        self.poke()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.reader.close()
+        self.wake.close()
+        self.ticks.close(unlink=True)
+        self.out.close(unlink=True)
+
+
+class ShardedFeatures:
+    """FeatureFabric per symbol spread over ``workers`` processes.
+
+    :meth:`submit` never blocks; a tick that finds its shard's ring full is
+    dropped and counted. :meth:`poll` returns the features ready so far,
+    each shard's in tick order. :meth:`stream` runs the same way inside an
+    event loop.
+
+    With ``checkpoint_dir`` each worker snapshots the fabrics of the
+    ``symbols`` given here every ``checkpoint_interval`` seconds and on
+    :meth:`close`, and resumes them from there on the next start. Symbols
+    first seen in :meth:`submit` are not checkpointed.
+
+    A worker that dies makes :meth:`drain` and :meth:`stream` raise
+    ``RuntimeError`` rather than wait for features that will never come.
+    """
+
+    def __init__(
+        self,
+        symbols: Sequence[str] = (),
+        workers: Optional[int] = None,
+        capacity: int = 65_536,
+        start_method: Optional[str] = None,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: float = 300.0,
+        **fabric_kwargs,
+    ):
+        ctx = mp.get_context(start_method)
+        self.workers = workers or os.cpu_count() or 1
+        self.columns = _feature_columns(FeatureFabric(**fabric_kwargs))
+        self._symbol_at = FeatureFabric(**fabric_kwargs).columns.index("symbol")
+        self.symbols: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.dropped = 0
+        names = tuple(dict.fromkeys(symbols))
+        checkpoint = None if checkpoint_dir is None else (checkpoint_dir, checkpoint_interval)
+        self.shards = [
+            _Shard(ctx, capacity, 1 + len(TICK_FIELDS), 2 + len(self.columns), names, checkpoint, fabric_kwargs)
+            for _ in range(self.workers)
+        ]
+        for symbol in symbols:
+            self._id(symbol)
+
+    def _id(self, symbol: str) -> int:
+        i = self._ids.get(symbol)
+        if i is None:
+            i = self._ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return i
+
+    def shard_of(self, symbol: str) -> int:
+        return self._id(symbol) % self.workers
+
+    def submit(self, tick: dict) -> bool:
+        """Queue a tick for its symbol's shard; False if it was dropped."""
+        symbol_id = self._id(tick.get("symbol", ""))
+        shard = self.shards[symbol_id % self.workers]
+        if not shard.ticks.put(encode_tick(symbol_id, tick)):
+            self.dropped += 1
+            return False
+        shard.submitted += 1
+        shard.poke()
+        return True
+
+    def _decode(self, row: np.ndarray) -> dict:
+        values = dict(zip(self.columns, row[2:].tolist()))
+        if not row[1]:
+            for col in _DIFFS:
+                del values[col]
+        items = list(values.items())
+        items.insert(self._symbol_at, ("symbol", self.symbols[int(row[0])]))
+        return dict(items)
+
+    def poll(self) -> List[dict]:
+        """Features computed since the last call."""
+        out = []
+        for shard in self.shards:
+            shard.clear_notifications()
+            out.extend(self._decode(row) for row in shard.out.take())
+        return out
+
+    def pending(self) -> int:
+        """Ticks submitted but not yet turned into features."""
+        return sum(shard.submitted - shard.out.written for shard in self.shards)
+
+    def check(self) -> None:
+        """Raise ``RuntimeError`` if a worker process has died."""
+        for i, shard in enumerate(self.shards):
+            code = shard.process.exitcode
+            if code is not None and not shard.stop.is_set():
+                raise RuntimeError(f"feature worker {i} died with exit code {code}")
+
+    def drain(self, timeout: Optional[float] = None) -> List[dict]:
+        """Wait until every submitted tick has its features and return them.
+
+        Without ``timeout`` this waits as long as the workers are alive and
+        busy; it raises once one has died.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        out = self.poll()
+        while not all(shard.idle for shard in self.shards):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            self.check()
+            time.sleep(0.001)
+            out.extend(self.poll())
+        out.extend(self.poll())
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "symbols": len(self.symbols),
+            "pending": self.pending(),
+            "dropped": self.dropped,
+        }
+
+    async def stream(self, ticks: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        """Feed ``ticks`` to the shards and yield features as they arrive."""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        for shard in self.shards:
+            loop.add_reader(shard.reader.fileno(), ready.set)
+
+        async def pump() -> None:
+            async for tick in ticks:
+                self.submit(tick)
+
+        feeder = asyncio.create_task(pump())
+        try:
+            while not feeder.done():
+                waiter = asyncio.create_task(ready.wait())
+                await asyncio.wait({feeder, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                ready.clear()
+                for features in self.poll():
+                    yield features
+                # a dead worker's pipe reads as closed, which wakes us here
+                self.check()
+            feeder.result()
+            for features in await asyncio.to_thread(self.drain):
+                yield features
+        finally:
+            for shard in self.shards:
+                loop.remove_reader(shard.reader.fileno())
+            feeder.cancel()
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        for shard in self.shards:
+            shard.close(timeout)
@@ -0,0 +1,164 @@
+"""Deterministic synthetic futures market data.
+
+:class:`SyntheticMarket` produces ticks for any number of symbols together
+with the order book, funding, open interest and liquidations that go with
+them, in the shapes :class:`~trading.features.FeatureFabric` and
+:class:`~trading.derived_metrics.DerivedMetrics` consume. Prices, funding
+and open interest follow per-symbol random walks. Everything is drawn from
+seeded generators, one per field, in fixed-size chunks: a seed always
+gives the same stream, other chunk sizes change it only by rounding, and
+memory stays flat however many ticks are drawn.
+"""
+from typing import Dict, Iterator, List, NamedTuple, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+_FIELDS = ("ts", "sym", "price", "size", "buy", "spread", "depth", "funding", "oi", "long", "liquidations", "liq_size")
+
+
+class MarketEvent(NamedTuple):
+    """Arguments of one :meth:`DerivedMetrics.update` call."""
+
+    tick: dict
+    book: dict
+    funding: dict
+    oi: dict
+    liquidations: List[dict]
+
+
+def _walk(level: np.ndarray, steps: np.ndarray, sym: np.ndarray) -> np.ndarray:
+    """Per-symbol cumulative sums of ``steps`` on top of ``level``, which is advanced."""
+    out = np.empty(len(steps))
+    for s in range(len(level)):
+        mask = sym == s
+        if mask.any():
+            path = level[s] + np.cumsum(steps[mask])
+            out[mask] = path
+            level[s] = path[-1]
+    return out
+
+
+class SyntheticMarket:
+    """Seeded tick stream over ``symbols`` (a count or a list of names).
+
+    Ticks arrive ``tick_ms`` apart on average across all symbols. Each
+    tick's book has ``levels`` levels a side around the traded price, and
+    a tick comes with liquidations with probability ``liquidation_rate``.
+    """
+
+    def __init__(
+        self,
+        symbols: Union[int, Sequence[str]] = 8,
+        seed: int = 0,
+        start: str = "2024-01-01",
+        tick_ms: float = 50.0,
+        levels: int = 20,
+        vol: float = 2e-4,
+        liquidation_rate: float = 0.01,
+        chunk: int = 16_384,
+    ):
+        if isinstance(symbols, int):
+            symbols = [f"SYM{i:02d}USDTM" for i in range(symbols)]
+        self.symbols = list(symbols)
+        self.seed = seed
+        self.start_ms = pd.Timestamp(start, tz="UTC").value // 10**6
+        self.tick_ms = tick_ms
+        self.levels = levels
+        self.vol = vol
+        self.liquidation_rate = liquidation_rate
+        self.chunk = chunk
+
+    def _chunks(self, n: int) -> Iterator[Dict[str, np.ndarray]]:
+        rng = dict(zip(_FIELDS, map(np.random.default_rng, np.random.SeedSequence(self.seed).spawn(len(_FIELDS)))))
+        k = len(self.symbols)
+        log_price = np.log(100.0 * (1 + np.arange(k)))
+        funding = np.full(k, 1e-4)
+        log_oi = np.full(k, np.log(1e6))
+        clock = float(self.start_ms)
+        done = 0
+        while done < n:
+            m = min(self.chunk, n - done)
+            stamps = clock + np.cumsum(rng["ts"].exponential(self.tick_ms, m))
+            clock = stamps[-1]
+            sym = rng["sym"].integers(k, size=m)
+            price = np.exp(_walk(log_price, rng["price"].normal(0, self.vol, m), sym))
+            yield {
+                "ts": stamps.astype(np.int64),
+                "sym": sym,
+                "price": price,
+                "size": rng["size"].lognormal(0, 1, m),
+                "buy": rng["buy"].random(m) < 0.5,
+                "spread": price * rng["spread"].uniform(2e-5, 2e-4, m),
+                "depth": rng["depth"].uniform(0.1, 5.0, (m, 2, self.levels)),
+                "funding": _walk(funding, rng["funding"].normal(0, 2e-7, m), sym),
+                "oi": np.exp(_walk(log_oi, rng["oi"].normal(0, 1e-4, m), sym)),
+                "long": rng["long"].uniform(0.4, 0.6, m),
+                "liquidations": rng["liquidations"].random(m) < self.liquidation_rate,
+                "liq_size": rng["liq_size"].exponential(2.0, m),
+            }
+            done += m
+
+    def _rows(self, n: int) -> Iterator[tuple]:
+        for c in self._chunks(n):
+            for i in range(len(c["ts"])):
+                yield c, i
+
+    def _tick(self, c: Dict[str, np.ndarray], i: int) -> dict:
+        price = float(c["price"][i])
+        half = float(c["spread"][i]) / 2
+        depth = c["depth"][i]
+        return {
+            "ts": int(c["ts"][i]),
+            "symbol": self.symbols[c["sym"][i]],
+            "price": price,
+            "size": float(c["size"][i]),
+            "side": "buy" if c["buy"][i] else "sell",
+            "bestBidPrice": price - half,
+            "bestBidSize": float(depth[0, 0]),
+            "bestAskPrice": price + half,
+            "bestAskSize": float(depth[1, 0]),
+        }
+
+    def ticks(self, n: int) -> Iterator[dict]:
+        """``n`` ticker messages as :class:`FeatureFabric` reads them."""
+        for c, i in self._rows(n):
+            yield self._tick(c, i)
+
+    def _book(self, tick: dict, depth: np.ndarray) -> dict:
+        step = tick["price"] * 1e-4
+        bid, ask = tick["bestBidPrice"], tick["bestAskPrice"]
+        sizes = depth.tolist()
+        return {
+            "bids": [[bid - j * step, size] for j, size in enumerate(sizes[0])],
+            "asks": [[ask + j * step, size] for j, size in enumerate(sizes[1])],
+            "spot_price": tick["price"] - step,
+        }
+
+    def events(self, n: int) -> Iterator[MarketEvent]:
+        """``n`` ticks with their book, funding, open interest and liquidations."""
+        for c, i in self._rows(n):
+            tick = self._tick(c, i)
+            oi = float(c["oi"][i])
+            long = float(c["long"][i])
+            liquidations = []
+            if c["liquidations"][i]:
+                side = "sell" if c["buy"][i] else "buy"
+                liquidations.append({"side": side, "size": float(c["liq_size"][i]), "price": tick["price"]})
+            yield MarketEvent(
+                tick,
+                self._book(tick, c["depth"][i]),
+                {"fundingRate": float(c["funding"][i])},
+                {"openInterest": oi, "longQty": oi * long, "shortQty": oi * (1 - long), "marketCap": 20 * oi * tick["price"]},
+                liquidations,
+            )
+
+    def messages(self, n: int, funding_every: int = 10) -> Iterator[dict]:
+        """``n`` websocket messages, level2 books and every ``funding_every``-th a funding update."""
+        for j, event in enumerate(self.events(n)):
+            symbol = event.tick["symbol"]
+            if j % funding_every == 0:
+                yield {"topic": f"/contractMarket/fundingRate:{symbol}", "data": event.funding}
+            else:
+                yield {"topic": f"/contractMarket/level2:{symbol}", "data": event.book}
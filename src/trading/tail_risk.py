@@ -0,0 +1,261 @@
+"""Incremental rolling tail-risk estimators.
+
+These follow the ``peek``/``push`` protocol from :mod:`trading.rolling` and
+back ``ValueAtRisk_95``, ``ExpectedShortfall_95`` and
+``MaxAdverseExcursion`` in :class:`~trading.metrics_engine.MetricsEngine`.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Deque, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .rolling import NAN
+
+
+class TailStats(NamedTuple):
+    var: float
+    es: float
+
+
+_EMPTY = TailStats(NAN, NAN)
+
+
+class OrderStatistics:
+    """Exact rolling quantile and expected shortfall over a sorted window.
+
+    Insertions and evictions are a bisect plus a list memmove. The sum of
+    the smallest values is kept for a cursor that follows the tail's size,
+    so a query is O(log n) plus the few steps the cursor moves; the sum is
+    recomputed every ``window`` pushes so rounding does not accumulate.
+    """
+
+    def __init__(self, window: int, q: float = 0.05):
+        self.window = window
+        self.q = q
+        self.fifo: Deque[float] = deque()
+        self.sorted: List[float] = []
+        # sum of the _k smallest values in ``sorted``
+        self._k = 0
+        self._sum = 0.0
+        self._pushes = 0
+
+    def _get(self, rank: int, x: float, pos: int) -> float:
+        if rank < pos:
+            return self.sorted[rank]
+        if rank == pos:
+            return x
+        return self.sorted[rank - 1]
+
+    def _tail_sum(self, k: int) -> float:
+        """Sum of the ``k`` smallest committed values, moving the cursor to ``k``."""
+        values = self.sorted
+        while self._k < k:
+            self._sum += values[self._k]
+            self._k += 1
+        while self._k > k:
+            self._k -= 1
+            self._sum -= values[self._k]
+        return self._sum
+
+    def peek(self, x: float) -> TailStats:
+        n = len(self.sorted) + 1
+        if n < self.window:
+            return _EMPTY
+        pos = bisect_left(self.sorted, x)
+        h = self.q * (n - 1)
+        lo = int(math.floor(h))
+        value = self._get(lo, x, pos)
+        if lo + 1 < n:
+            value += (self._get(lo + 1, x, pos) - value) * (h - lo)
+        k = bisect_right(self.sorted, value)
+        total = self._tail_sum(k)
+        if x <= value:
+            total += x
+            k += 1
+        return TailStats(value, total / k if k else NAN)
+
+    def push(self, x: float) -> None:
+        values = self.sorted
+        if len(self.fifo) >= self.window - 1:
+            old = self.fifo.popleft()
+            i = bisect_left(values, old)
+            del values[i]
+            if i < self._k:
+                # the next value shifts into the summed prefix, if there is one
+                self._sum -= old
+                if self._k <= len(values):
+                    self._sum += values[self._k - 1]
+                else:
+                    self._k -= 1
+        self.fifo.append(x)
+        i = bisect_right(values, x)
+        values.insert(i, x)
+        if i < self._k:
+            self._sum += x - values[self._k]
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self._sum = math.fsum(values[:self._k])
+
+
+class QuantileSketch:
+    """Sliding log-bucketed histogram with bounded relative error.
+
+    Values are mapped to buckets whose representative is within
+    ``accuracy`` (relative) of any value in the bucket, in the style of
+    DDSketch. Magnitudes below ``min_value`` collapse into a zero bucket
+    and magnitudes above ``max_value`` clamp to the last bucket. Memory is
+    one small int per window slot plus the bucket counts; query cost
+    depends on the bucket count, not the window.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        q: float = 0.05,
+        accuracy: float = 0.01,
+        min_value: float = 1e-9,
+        max_value: float = 10.0,
+    ):
+        self.window = window
+        self.q = q
+        gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.min_value = min_value
+        reps = 2 * gamma ** (np.arange(self.buckets) + self._offset) / (gamma + 1)
+        # ordered from most negative through zero to most positive
+        self._values = np.concatenate([-reps[::-1], [0.0], reps])
+        self.counts = np.zeros(len(self._values), dtype=np.int64)
+        self.fifo: Deque[int] = deque()
+
+    def _slot(self, x: float) -> int:
+        mag = abs(x)
+        if mag < self.min_value:
+            return self.buckets
+        i = math.ceil(math.log(mag) / self._log_gamma) - self._offset
+        i = min(max(i, 0), self.buckets - 1)
+        return self.buckets + 1 + i if x > 0 else self.buckets - 1 - i
+
+    def peek(self, x: float) -> TailStats:
+        n = len(self.fifo) + 1
+        if n < self.window:
+            return _EMPTY
+        slot = self._slot(x)
+        self.counts[slot] += 1
+        try:
+            cum = np.cumsum(self.counts)
+            rank = int(round(self.q * (n - 1)))
+            idx = int(np.searchsorted(cum, rank + 1))
+            value = float(self._values[idx])
+            k = int(cum[idx])
+            es = float(np.dot(self.counts[: idx + 1], self._values[: idx + 1])) / k
+        finally:
+            self.counts[slot] -= 1
+        return TailStats(value, es)
+
+    def push(self, x: float) -> None:
+        if len(self.fifo) >= self.window - 1:
+            self.counts[self.fifo.popleft()] -= 1
+        slot = self._slot(x)
+        self.fifo.append(slot)
+        self.counts[slot] += 1
+
+
+class _Segment(NamedTuple):
+    growth: float
+    high: float
+    low: float
+    drawdown: float
+
+
+def _leaf(r: float) -> _Segment:
+    g = 1.0 + r
+    return _Segment(g, g, g, 0.0)
+
+
+def _combine(a: _Segment, b: _Segment) -> _Segment:
+    """Aggregate of segment ``a`` followed by segment ``b``."""
+    low_b = a.growth * b.low
+    return _Segment(
+        a.growth * b.growth,
+        max(a.high, a.growth * b.high),
+        min(a.low, low_b),
+        min(a.drawdown, b.drawdown, low_b / a.high - 1),
+    )
+
+
+class RollingDrawdown:
+    """Worst peak-to-trough move of compounded returns over a window.
+
+    Sliding-window aggregation over two stacks: each element carries the
+    aggregate of its stack below it, so push, evict and query are
+    amortised O(1).
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._front: List[Tuple[_Segment, _Segment]] = []
+        self._back: List[Tuple[_Segment, _Segment]] = []
+
+    def __len__(self) -> int:
+        return len(self._front) + len(self._back)
+
+    def _total(self):
+        agg = None
+        if self._front:
+            agg = self._front[-1][1]
+        if self._back:
+            agg = self._back[-1][1] if agg is None else _combine(agg, self._back[-1][1])
+        return agg
+
+    def peek(self, r: float) -> float:
+        if len(self) + 1 < self.window:
+            return NAN
+        agg = self._total()
+        leaf = _leaf(r)
+        agg = leaf if agg is None else _combine(agg, leaf)
+        return agg.drawdown
+
+    def push(self, r: float) -> None:
+        if len(self) >= self.window - 1:
+            if not self._front:
+                agg = None
+                while self._back:
+                    leaf = self._back.pop()[0]
+                    agg = leaf if agg is None else _combine(leaf, agg)
+                    self._front.append((leaf, agg))
+            if self._front:
+                self._front.pop()
+        if self.window <= 1:
+            return
+        leaf = _leaf(r)
+        agg = leaf if not self._back else _combine(self._back[-1][1], leaf)
+        self._back.append((leaf, agg))
+
+
+class TailRisk:
+    """VaR, expected shortfall and max adverse excursion over one window.
+
+    ``mode="exact"`` uses :class:`OrderStatistics`; ``mode="sketch"`` trades
+    exactness for :class:`QuantileSketch`'s bounded relative error.
+    """
+
+    def __init__(self, window: int, q: float = 0.05, mode: str = "exact", accuracy: float = 0.01):
+        if mode == "exact":
+            self.quantiles = OrderStatistics(window, q)
+        elif mode == "sketch":
+            self.quantiles = QuantileSketch(window, q, accuracy)
+        else:
+            raise ValueError(f"Unknown tail risk mode: {mode}")
+        self.drawdown = RollingDrawdown(window)
+
+    def peek(self, r: float) -> Tuple[float, float, float]:
+        stats = self.quantiles.peek(r)
+        return stats.var, stats.es, self.drawdown.peek(r)
+
+    def push(self, r: float) -> None:
+        self.quantiles.push(r)
+        self.drawdown.push(r)
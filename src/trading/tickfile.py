@@ -0,0 +1,266 @@
+"""Chunked readers for historical tick files.
+
+Two formats are supported:
+
+* CSV, read with ``pandas.read_csv(chunksize=...)``.
+* A directory of raw column files, memory-mapped on read::
+
+      <root>/schema.json    column dtypes and the categories of text columns
+      <root>/<column>.bin   raw values; text columns as int32 category codes
+
+  Rows are sorted by the int64 ``ts`` column (epoch ms), so a time range is
+  located by binary search and only the pages it covers are touched. Like
+  :class:`~trading.metrics_store.ColumnStore`, appends only extend files, a
+  reader trims torn appends to the shortest column and a writer truncates
+  the files to it before appending.
+
+Both readers yield DataFrames of at most ``chunksize`` rows, with the
+``start``/``end`` (inclusive, epoch ms or anything :class:`pandas.Timestamp`
+accepts) and ``symbols`` filters applied, so memory stays bounded however
+large the file is.
+"""
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+CHUNKSIZE = 65_536
+SCHEMA = "schema.json"
+_CODE = np.dtype(np.int32)
+
+
+def to_ms(t) -> Optional[int]:
+    """Epoch milliseconds of ``t``; naive timestamps are taken as UTC."""
+    if t is None:
+        return None
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.value // 10**6
+
+
+def is_columnar(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, SCHEMA))
+
+
+def _filter(frame: pd.DataFrame, start: Optional[int], end: Optional[int], symbols: Optional[Set[str]]) -> pd.DataFrame:
+    mask = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        mask &= frame["ts"].to_numpy() >= start
+    if end is not None:
+        mask &= frame["ts"].to_numpy() <= end
+    if symbols is not None:
+        if "symbol" not in frame.columns:
+            raise ValueError("symbol filter on a file without a symbol column")
+        mask &= frame["symbol"].isin(symbols).to_numpy()
+    return frame if mask.all() else frame[mask]
+
+
+def read_csv_chunks(
+    path: str,
+    chunksize: int = CHUNKSIZE,
+    start=None,
+    end=None,
+    symbols: Optional[Iterable[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Filtered chunks of a CSV tick file; empty chunks are skipped."""
+    start, end = to_ms(start), to_ms(end)
+    wanted = None if symbols is None else set(symbols)
+    with pd.read_csv(path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk = _filter(chunk, start, end, wanted)
+            if len(chunk):
+                yield chunk
+
+
+class TickFileWriter:
+    """Append time-sorted tick frames to a columnar tick directory.
+
+    The columns and their dtypes come from the first frame (or an existing
+    file); text columns are dictionary-encoded. Later frames may omit
+    columns, which are filled with NaN or 0, but not add new ones.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.columns: Dict[str, np.dtype] = {}
+        self.categories: Dict[str, List[str]] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self.last_ts: Optional[int] = None
+        if is_columnar(root):
+            with TickFile(root) as existing:
+                self.columns = dict(existing.columns)
+                self.categories = {col: list(v) for col, v in existing.categories.items()}
+                rows = len(existing)
+                if rows:
+                    self.last_ts = int(existing.ts[-1])
+            self._truncate(rows)
+            self._codes = {col: {v: i for i, v in enumerate(vals)} for col, vals in self.categories.items()}
+
+    def _truncate(self, rows: int) -> None:
+        """Cut every column file to ``rows``, dropping a torn append."""
+        for col, dtype in self.columns.items():
+            path = os.path.join(self.root, f"{col}.bin")
+            if os.path.exists(path) and os.path.getsize(path) > rows * dtype.itemsize:
+                with open(path, "r+b") as fh:
+                    fh.truncate(rows * dtype.itemsize)
+
+    def _init_schema(self, frame: pd.DataFrame) -> None:
+        if "ts" not in frame.columns:
+            raise ValueError("tick frames need a ts column")
+        for col in frame.columns:
+            dtype = frame[col].dtype
+            if col == "ts":
+                self.columns[col] = np.dtype(np.int64)
+            elif dtype.kind in "biuf":
+                self.columns[col] = np.dtype(dtype)
+            else:
+                self.columns[col] = _CODE
+                self.categories[col] = []
+                self._codes[col] = {}
+
+    def _write_schema(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, SCHEMA)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"columns": {c: d.str for c, d in self.columns.items()}, "categories": self.categories}, fh)
+        os.replace(tmp, path)
+
+    def _encode(self, col: str, values: pd.Series) -> np.ndarray:
+        codes = self._codes[col]
+        for value in pd.unique(values.astype(str)):
+            if value not in codes:
+                codes[value] = len(codes)
+                self.categories[col].append(value)
+        return values.astype(str).map(codes).to_numpy(_CODE)
+
+    def append(self, frame: pd.DataFrame) -> None:
+        if frame.empty:
+            return
+        if not self.columns:
+            self._init_schema(frame)
+        extra = set(frame.columns) - set(self.columns)
+        if extra:
+            raise ValueError(f"columns not in the tick file: {', '.join(sorted(extra))}")
+        ts = frame["ts"].to_numpy(np.int64)
+        if np.any(np.diff(ts) < 0) or (self.last_ts is not None and ts[0] < self.last_ts):
+            raise ValueError("ticks must be appended in time order")
+        known = {col: len(v) for col, v in self.categories.items()}
+        arrays = {}
+        for col, dtype in self.columns.items():
+            if col not in frame.columns:
+                arrays[col] = np.full(len(frame), np.nan if dtype.kind == "f" else 0, dtype=dtype)
+            elif col in self.categories:
+                arrays[col] = self._encode(col, frame[col])
+            else:
+                arrays[col] = frame[col].to_numpy().astype(dtype)
+        if known != {col: len(v) for col, v in self.categories.items()} or not is_columnar(self.root):
+            # categories are written before the codes that use them
+            self._write_schema()
+        for col, values in arrays.items():
+            with open(os.path.join(self.root, f"{col}.bin"), "ab") as fh:
+                fh.write(values.tobytes())
+        self.last_ts = int(ts[-1])
+
+
+def convert_csv(src: str, dst: str, chunksize: int = CHUNKSIZE) -> int:
+    """Copy a time-sorted CSV tick file into a columnar directory; returns the row count."""
+    writer = TickFileWriter(dst)
+    rows = 0
+    for chunk in read_csv_chunks(src, chunksize):
+        writer.append(chunk)
+        rows += len(chunk)
+    return rows
+
+
+class TickFile:
+    """Memory-mapped view of a columnar tick directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, SCHEMA)) as fh:
+            schema = json.load(fh)
+        self.columns = {col: np.dtype(dtype) for col, dtype in schema["columns"].items()}
+        self.categories = {col: np.asarray(vals, dtype=object) for col, vals in schema["categories"].items()}
+        maps = {col: self._map(col, dtype) for col, dtype in self.columns.items()}
+        n = min(len(m) for m in maps.values())
+        self._maps = {col: m[:n] for col, m in maps.items()}
+
+    def _map(self, col: str, dtype: np.dtype) -> np.ndarray:
+        path = os.path.join(self.root, f"{col}.bin")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < dtype.itemsize:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(size // dtype.itemsize,))
+
+    def __len__(self) -> int:
+        return len(self._maps["ts"])
+
+    def __enter__(self) -> "TickFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._maps = {col: np.empty(0, dtype=m.dtype) for col, m in self._maps.items()}
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._maps["ts"]
+
+    def span(self, start=None, end=None) -> slice:
+        """Rows with ``start <= ts <= end``, found by binary search."""
+        start, end = to_ms(start), to_ms(end)
+        lo = 0 if start is None else int(np.searchsorted(self.ts, start, "left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.ts, end, "right"))
+        return slice(lo, max(lo, hi))
+
+    def chunks(
+        self,
+        chunksize: int = CHUNKSIZE,
+        start=None,
+        end=None,
+        symbols: Optional[Iterable[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Filtered frames of at most ``chunksize`` rows, copied out of the map."""
+        span = self.span(start, end)
+        codes = None
+        if symbols is not None:
+            if "symbol" not in self.categories:
+                raise ValueError("symbol filter on a file without a symbol column")
+            codes = np.flatnonzero(np.isin(self.categories["symbol"], list(symbols)))
+            if not len(codes):
+                return
+        for lo in range(span.start, span.stop, chunksize):
+            hi = min(lo + chunksize, span.stop)
+            rows = slice(lo, hi)
+            if codes is not None:
+                rows = lo + np.flatnonzero(np.isin(self._maps["symbol"][lo:hi], codes))
+                if not len(rows):
+                    continue
+            data = {}
+            for col, m in self._maps.items():
+                values = np.array(m[rows])
+                data[col] = self.categories[col][values] if col in self.categories else values
+            yield pd.DataFrame(data)
+
+
+def read_chunks(
+    path: str,
+    chunksize: int = CHUNKSIZE,
+    start=None,
+    end=None,
+    symbols: Optional[Iterable[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Chunks of a CSV file or columnar directory, whichever ``path`` is."""
+    if not is_columnar(path):
+        yield from read_csv_chunks(path, chunksize, start, end, symbols)
+        return
+    with TickFile(path) as ticks:
+        yield from ticks.chunks(chunksize, start, end, symbols)
@@ -0,0 +1,150 @@
+import sys, os, asyncio, json
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pandas as pd
+import pytest
+from kucoin_stream import KucoinDataStream
+from trading.bars import BarAggregator, parse_resolution
+from trading.decoders import Candle
+from trading.features import FeatureFabric
+from trading.recorder import LogReplayer, TickRecorder
+
+T0 = 1_704_067_200_000
+
+
+def _trades(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = T0 + np.cumsum(rng.integers(0, 400, n))
+    price = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    size = rng.uniform(0.1, 3, n)
+    side = np.where(rng.random(n) < 0.5, "buy", "sell")
+    return pd.DataFrame({"ts": ts, "price": price, "size": size, "side": side})
+
+
+def _reference(trades, length):
+    signed = np.where(trades["side"] == "sell", -trades["size"], trades["size"])
+    g = trades.assign(signed=signed, turnover=trades["price"] * trades["size"]).groupby(
+        trades["ts"] - trades["ts"] % length
+    )
+    out = g.agg(
+        open=("price", "first"), high=("price", "max"), low=("price", "min"), close=("price", "last"),
+        volume=("size", "sum"), turnover=("turnover", "sum"), trades=("price", "size"), delta=("signed", "sum"),
+    )
+    out["cvd"] = out["delta"].cumsum()
+    return out
+
+
+def test_parse_resolution():
+    assert parse_resolution("1s") == 1000
+    assert parse_resolution("5s") == 5000
+    assert parse_resolution("1min") == parse_resolution("1m") == 60_000
+    assert parse_resolution("4hour") == 4 * 3_600_000
+    for bad in ("", "1x", "0s", "min"):
+        with pytest.raises(ValueError):
+            parse_resolution(bad)
+
+
+def test_bars_match_batch_at_every_resolution():
+    trades = _trades()
+    agg = BarAggregator(("1min", "1s", "5s"))
+    closed = {r: [] for r in agg.resolutions}
+    agg.subscribe(lambda bar: closed[bar.resolution].append(bar), closed_only=True)
+    last = []
+    for row in trades.itertuples():
+        last = agg.add("XBTUSDTM", row.ts, row.price, row.size, row.side)
+    assert agg.resolutions == ["1s", "5s", "1min"]
+    assert [b.closed for b in last[-3:]] == [False] * 3
+    for resolution in agg.resolutions:
+        ref = _reference(trades, parse_resolution(resolution))
+        bars = closed[resolution] + [agg.bar("XBTUSDTM", resolution)]
+        got = pd.DataFrame(bars).set_index("start")
+        assert list(got.index) == list(ref.index)
+        for col in ref.columns:
+            np.testing.assert_allclose(got[col], ref[col], rtol=1e-9, atol=1e-9)
+        assert bars[0].vwap == pytest.approx(ref["turnover"].iloc[0] / ref["volume"].iloc[0])
+
+
+def test_late_trades_are_dropped():
+    agg = BarAggregator(("1s", "5s"))
+    agg.add("A", T0 + 1500, 10.0, 1.0)
+    assert agg.add("A", T0 + 900, 11.0, 1.0) == []
+    bars = agg.add("A", T0 + 1600, 12.0, 2.0, "sell")
+    assert agg.late == 1
+    assert [(b.resolution, b.high, b.trades, b.cvd) for b in bars] == [("1s", 12.0, 2, -1.0), ("5s", 12.0, 2, -1.0)]
+
+
+def test_subscriber_filters():
+    agg = BarAggregator(("1s", "5s"))
+    seen = []
+    agg.subscribe(seen.append, symbol="B", resolution="5000ms")
+    agg.add("A", T0, 1.0, 1.0)
+    agg.add("B", T0, 1.0, 1.0)
+    agg.add("B", T0 + 6000, 2.0, 1.0)
+    assert [(b.symbol, b.resolution, b.start, b.closed) for b in seen] == [
+        ("B", "5s", T0, False), ("B", "5s", T0, True), ("B", "5s", T0 + 5000, False),
+    ]
+    agg.unsubscribe(seen.append)
+    agg.add("B", T0 + 7000, 2.0, 1.0)
+    assert len(seen) == 3
+
+
+def test_reconcile_against_candles():
+    agg = BarAggregator(("1min",))
+    agg.add("A", T0 + 1000, 10.0, 1.0)
+    agg.add("A", T0 + 2000, 12.0, 1.0)
+    # the exchange revises the open candle; only the last one counts
+    assert agg.reconcile(Candle("A", "1min", T0, 10.0, 11.0, 11.0, 10.0, 1.0, 10.0)) is None
+    assert agg.reconcile(Candle("A", "1min", T0, 10.0, 12.0, 12.0, 10.0, 2.0, 22.0)) is None
+    agg.add("A", T0 + 61_000, 13.0, 1.0)
+    assert agg.stats() == {"symbols": 1, "late": 0, "reconciled": 1, "mismatches": 0}
+    diffs = agg.reconcile(Candle("A", "1min", T0, 10.0, 12.0, 12.0, 10.0, 3.0, 34.0))
+    assert diffs == {"volume": (2.0, 3.0)}
+    assert agg.mismatches == 1 and agg.mismatched[-1][:3] == ("A", "1min", T0)
+    assert agg.reconcile(Candle("A", "5min", T0, 10.0, 12.0, 12.0, 10.0, 3.0, 34.0)) is None
+
+
+def test_shared_aggregator_drives_feature_fabric():
+    trades = _trades(1500, seed=1)
+    agg = BarAggregator()
+    shared = FeatureFabric()
+    agg.subscribe(shared.on_bar, symbol="XBTUSDTM", resolution="1s")
+    own = FeatureFabric()
+    for row in trades.itertuples():
+        agg.add("XBTUSDTM", row.ts, row.price, row.size, row.side)
+        expected = own.update({"ts": row.ts, "price": row.price, "size": row.size, "symbol": "XBTUSDTM"})
+        assert shared.bar == own.bar and shared.bars == own.bars
+        for key in ("close", "volume", "vol", "ma60", "atr", "trend_strength"):
+            assert shared.row[key] == pytest.approx(expected[key], nan_ok=True)
+
+
+def test_stream_aggregates_trades(tmp_path):
+    frames = [
+        {"type": "message", "topic": "/contractMarket/execution:XBTUSDTM",
+         "data": {"symbol": "XBTUSDTM", "ts": (T0 + k * 700) * 10**6, "price": str(100 + k), "size": "1",
+                  "side": "sell" if k % 2 else "buy", "tradeId": str(k)}}
+        for k in range(4)
+    ]
+    frames.append({"type": "message", "topic": "/contractMarket/candles:XBTUSDTM_1s",
+                   "data": {"symbol": "XBTUSDTM", "candles": [str(T0 // 1000), "100", "101", "101", "100", "2", "201"]}})
+    with TickRecorder(str(tmp_path)) as rec:
+        for frame in frames:
+            rec.record(json.dumps(frame))
+    stream = KucoinDataStream(["XBTUSDTM"], resolutions=("1s",))
+    assert [t for t in stream.topics() if "candles" in t] == ["/contractMarket/candles:XBTUSDTM_1s"]
+    # the default subscription still carries the candles messages() always had
+    assert [t for t in KucoinDataStream(["XBTUSDTM"]).topics() if "candles" in t] == [
+        f"/contractMarket/candles:XBTUSDTM_{r}" for r in ("1s", "5s", "1min")
+    ]
+
+    async def _collect(stream):
+        stream.websocket = LogReplayer(str(tmp_path))
+        return [e async for e in stream.events()]
+
+    asyncio.run(_collect(stream))
+    bar = stream.bars.bar("XBTUSDTM", "1s")
+    assert (bar.start, bar.open, bar.close, bar.trades, bar.cvd) == (T0 + 2000, 103.0, 103.0, 1, 0.0)
+    assert stream.bars.reconciled == 1 and stream.bars.mismatches == 0
+
+    quiet = KucoinDataStream(["XBTUSDTM"], resolutions=("1s",), reconcile=False)
+    assert isinstance(asyncio.run(_collect(quiet))[-1], Candle)
+    assert quiet.bars.reconciled == 0
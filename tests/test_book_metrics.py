@@ -0,0 +1,83 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pytest
+from trading.book_metrics import BookMetrics, depth_column, slippage_column
+from trading.derived_metrics import BOOK_COLUMNS, DerivedMetrics
+
+
+def _depth(book, pct):
+    bids, asks = book.get("bids", []), book.get("asks", [])
+    if not bids or not asks:
+        return 0.0, 0.0
+    mid = (bids[0][0] + asks[0][0]) / 2
+    th = mid * pct
+    return (sum(s for p, s in bids if p >= mid - th), sum(s for p, s in asks if p <= mid + th))
+
+
+def _slippage(book, usd):
+    asks = book.get("asks", [])
+    if not asks:
+        return 0.0
+    qty = remain = usd / asks[0][0]
+    cost = 0.0
+    for price, size in asks:
+        take = min(size, remain)
+        cost += take * price
+        remain -= take
+        if remain <= 0:
+            break
+    if remain > 0:
+        cost += remain * asks[-1][0]
+    return (cost / qty - asks[0][0]) / asks[0][0]
+
+
+def _book(rng, levels, price=100.0):
+    spread = abs(rng.normal(0.05, 0.01))
+    return {
+        "bids": [[price - spread - k * 0.02, float(rng.uniform(0.5, 5))] for k in range(levels)],
+        "asks": [[price + spread + k * 0.02, float(rng.uniform(0.5, 5))] for k in range(levels)],
+    }
+
+
+@pytest.mark.parametrize("levels", [1, 5, 60, 400])
+def test_matches_level_walk(levels):
+    rng = np.random.default_rng(levels)
+    metrics = BookMetrics(depth_pcts=(0.0025, 0.01, 0.05), slippage_usd=(10, 1e4, 1e5, 1e7))
+    for _ in range(20):
+        book = _book(rng, levels)
+        out = metrics(book, 100.0)
+        for pct in metrics.depth_pcts:
+            assert out[depth_column(pct)] == pytest.approx(sum(_depth(book, pct)), rel=1e-12)
+        for usd in metrics.slippage_usd:
+            assert out[slippage_column(usd)] == pytest.approx(_slippage(book, usd), rel=1e-9, abs=1e-15)
+        bid, ask = _depth(book, 0.01)
+        assert out["OrderBookImbalance"] == pytest.approx((bid - ask) / (bid + ask))
+        assert list(out) == metrics.columns
+
+
+def test_defaults_and_empty_sides():
+    assert BookMetrics().columns == BOOK_COLUMNS
+    assert "DepthAt1pct" in BookMetrics((0.01,)).columns
+    assert "SlippageCost10kUSD" in BookMetrics(slippage_usd=(1e4,)).columns
+
+    out = BookMetrics()({"bids": [[99.0, 1.0]], "asks": []}, 100.0)
+    assert out["MicroPrice"] == pytest.approx((100.0 * 1.0 + 99.0 * 0.0) / 1.0)
+    assert out["DepthAt0_1pct"] == 0.0 and out["OrderBookImbalance"] == 0.0
+    assert out["SlippageCost1kUSD"] == 0.0
+
+    array_book = {"bids": np.array([[99.9, 2.0], [99.8, 1.0]]), "asks": np.array([[100.1, 1.0], [100.2, 3.0]])}
+    list_book = {side: levels.tolist() for side, levels in array_book.items()}
+    assert BookMetrics()(array_book, 100.0) == pytest.approx(BookMetrics()(list_book, 100.0))
+
+
+def test_extra_book_columns_reach_the_table(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "metrics"), depth_pcts=(0.01,), slippage_usd=(1e4,))
+    book = {"bids": [[99.5, 5.0], [99.0, 5.0]], "asks": [[100.5, 5.0], [101.0, 50.0]], "spot_price": 100.0}
+    for i in range(2):
+        tick = {"ts": 1_700_000_000_000 + i * 60_000, "symbol": "BTCUSDTM", "price": 100.0, "size": 1.0}
+        row = dm.update(tick, book, {}, {}, [])
+    assert row["DepthAt1pct"] == 65.0
+    assert row["SlippageCost10kUSD"] == pytest.approx(_slippage(book, 1e4))
+    dm.close()
+    assert dm.store.read("BTCUSDTM")["DepthAt1pct"].tolist() == [65.0]
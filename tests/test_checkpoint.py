@@ -0,0 +1,125 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from trading.backfill import iter_updates
+from trading.checkpoint import Checkpointer
+from trading.derived_metrics import COLUMNS, CROSS_COLUMNS, DerivedMetrics
+from trading.features import FeatureFabric
+
+START = pd.Timestamp("2024-01-01", tz="UTC").value // 10**6
+
+
+def _history(n_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    ticks, books, funding, oi = [], [], [], []
+    for symbol, price in (("BTCUSDTM", 40000.0), ("ETHUSDTM", 2000.0)):
+        for i in range(n_bars):
+            for j in range(int(rng.integers(1, 3))):
+                ts = START + i * 60_000 + j * 20_000 + int(rng.integers(0, 5_000))
+                price *= 1 + rng.normal(0, 0.002)
+                ticks.append({"ts": ts, "symbol": symbol, "price": price,
+                              "size": float(rng.uniform(0.1, 3)), "side": str(rng.choice(["buy", "sell"]))})
+                books.append({
+                    "ts": ts - 1, "symbol": symbol,
+                    "bids": [[price * (1 - 1e-4 - k * 1e-3), float(rng.uniform(0.5, 5))] for k in range(3)],
+                    "asks": [[price * (1 + 1e-4 + k * 1e-3), float(rng.uniform(0.5, 5))] for k in range(3)],
+                    "spot_price": price,
+                })
+            if i % 5 == 0:
+                ts = START + i * 60_000
+                funding.append({"ts": ts, "symbol": symbol, "fundingRate": float(rng.normal(1e-4, 5e-5))})
+                oi.append({"ts": ts, "symbol": symbol, "openInterest": float(rng.uniform(900, 1100)),
+                           "longQty": 500.0, "shortQty": 450.0, "marketCap": 1e6})
+    ticks = pd.DataFrame(ticks).sort_values("ts", kind="stable")
+    return ticks, pd.DataFrame(books), pd.DataFrame(funding), pd.DataFrame(oi), pd.DataFrame(columns=["ts", "symbol"])
+
+
+def test_checkpointer_round_trip(tmp_path):
+    ckpt = Checkpointer(str(tmp_path / "ckpt"), interval=60.0)
+    assert not ckpt.due("BTCUSDTM") and ckpt.load("BTCUSDTM") is None
+    ckpt.save("BTCUSDTM", {"a": 1})
+    ckpt.save("BTCUSDTM", {"a": 2})
+    ckpt.save("ETHUSDTM", [1.5])
+    assert ckpt.flush(timeout=5)
+    assert ckpt.keys() == ["BTCUSDTM", "ETHUSDTM"]
+    assert ckpt.load("BTCUSDTM") == {"a": 2} and ckpt.load("ETHUSDTM") == [1.5]
+    assert not os.path.exists(tmp_path / "ckpt" / "BTCUSDTM.ckpt.tmp")
+    ckpt.close()
+
+    with open(tmp_path / "ckpt" / "ETHUSDTM.ckpt", "wb") as fh:
+        pickle.dump({"format": -1, "state": [0.0]}, fh)
+    assert Checkpointer(str(tmp_path / "ckpt")).load("ETHUSDTM") is None
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+def test_restart_resumes_from_checkpoint_and_store(tmp_path, snapshot):
+    data = _history(90)
+    updates = list(iter_updates(*data))
+    crash = next(i for i, (raw, *_) in enumerate(updates) if raw["ts"] >= START + 60 * 60_000)
+    checkpoint_at = next(i for i, (raw, *_) in enumerate(updates) if raw["ts"] >= START + 45 * 60_000)
+
+    full = DerivedMetrics(store_path=str(tmp_path / "full"))
+    for args in updates:
+        full.update(*args)
+
+    kwargs = {"store_path": str(tmp_path / "store")}
+    if snapshot:
+        kwargs["checkpoint_dir"] = str(tmp_path / "ckpt")
+    first = DerivedMetrics(**kwargs)
+    for i, args in enumerate(updates[:crash]):
+        first.update(*args)
+        if snapshot and i == checkpoint_at:
+            first.checkpoint()
+    # crash: finished bars and the snapshot reached disk, the open bar did not
+    first.writer.flush(timeout=5)
+    if snapshot:
+        first.checkpointer.flush(timeout=5)
+
+    second = DerivedMetrics(**kwargs)
+    replayed = second.restore()
+    if snapshot:
+        assert 10 <= replayed["BTCUSDTM"] <= 20
+    else:
+        assert replayed["BTCUSDTM"] == 59
+    open_bar = second.tables["BTCUSDTM"].last_ts // 10**6
+    for args in updates:
+        if args[0]["ts"] >= open_bar + 60_000:
+            second.update(*args)
+
+    checked = [c for c in COLUMNS if c not in CROSS_COLUMNS]
+    for symbol in ("BTCUSDTM", "ETHUSDTM"):
+        expected = full.master.loc[symbol][checked]
+        got = second.master.loc[symbol][checked]
+        assert got.index.equals(expected.index)
+        np.testing.assert_allclose(got.to_numpy(float), expected.to_numpy(float), rtol=1e-5, atol=1e-9)
+    full.close()
+    second.close()
+    stored = second.store.read("ETHUSDTM")
+    assert stored.index.is_unique
+    assert stored.index.equals(full.store.read("ETHUSDTM").index)
+
+
+def test_feature_fabric_resumes_from_checkpoint(tmp_path):
+    rng = np.random.default_rng(3)
+    price = 100.0
+    ticks = []
+    for i in range(400):
+        price *= 1 + rng.normal(0, 5e-4)
+        ticks.append({"ts": 1_700_000_000_000 + i * 700, "symbol": "BTCUSDTM", "price": price,
+                      "size": 1.0, "bestBidSize": 2.0, "bestAskSize": 1.0})
+    full = FeatureFabric()
+    expected = [full.update(t) for t in ticks]
+
+    ckpt = Checkpointer(str(tmp_path))
+    fabric = FeatureFabric()
+    for t in ticks[:250]:
+        fabric.update(t)
+    ckpt.save("BTCUSDTM", fabric)
+    ckpt.close()
+    resumed = Checkpointer(str(tmp_path)).load("BTCUSDTM")
+    got = [resumed.update(t) for t in ticks[250:]]
+    pd.testing.assert_frame_equal(pd.DataFrame(got), pd.DataFrame(expected[250:]))
@@ -0,0 +1,66 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+from datetime import datetime
+
+import pytest
+from trading.agents.base import AgentResult, BaseAgent
+from trading.clock import MAX_SPEED, SimulatedClock, parse_speed
+from trading.coordination import MultiAgentCoordinator
+from trading.ingestion import HistoricalDataStream
+
+DAY = 86_400_000
+
+
+def test_parse_speed():
+    assert parse_speed("max") == parse_speed(None) == MAX_SPEED
+    assert parse_speed("10x") == parse_speed(10) == 10.0
+    with pytest.raises(ValueError):
+        parse_speed(0)
+
+
+@pytest.mark.parametrize("speed,waits", [(1.0, [2.0, 0.5]), (10.0, [0.2, 0.05]), (MAX_SPEED, [])])
+def test_simulated_clock_paces_by_speed(monkeypatch, speed, waits):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    clock = SimulatedClock(speed)
+    with pytest.raises(RuntimeError):
+        clock.now()
+
+    async def _run():
+        for ts in (1_000, 3_000, 2_000, 3_500):
+            await clock.advance(ts)
+
+    asyncio.run(_run())
+    assert slept == pytest.approx(waits)
+    assert clock.time() == 3.5
+
+
+class EchoAgent(BaseAgent):
+    name = "Echo"
+
+    async def analyze(self, market_slice):
+        return AgentResult(self.clock.now(), "", "FLAT", 0.5, 1.0, ["ok"])
+
+
+def test_backtest_runs_on_event_time(tmp_path):
+    csv = tmp_path / "ticks.csv"
+    start = 1_704_067_200_000  # 2024-01-01
+    csv.write_text("ts,price,size\n" + "".join(f"{start + i * DAY // 4},{100 + i},1\n" for i in range(8)))
+    clock = SimulatedClock()
+    stream = HistoricalDataStream(str(csv), clock=clock)
+    agent = EchoAgent()
+    agent.clock = clock
+    coordinator = MultiAgentCoordinator([agent], clock)
+
+    async def _run():
+        async for features in stream.stream():
+            await coordinator.decide(features)
+
+    asyncio.run(_run())
+    stamps = [r.ts for r in agent.history]
+    assert stamps[0] == datetime(2024, 1, 1) and stamps[-1] == datetime(2024, 1, 2, 18)
+    assert coordinator.transcripts[4]["ts"] == "2024-01-02T00:00:00"
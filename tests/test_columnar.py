@@ -0,0 +1,33 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+from trading.columnar import RingTable
+
+
+def test_ring_wraps_and_stays_contiguous():
+    table = RingTable({"price": np.float64, "rsi": np.float32, "trades": np.int32}, capacity=3)
+    for i in range(5):
+        table.append(i * 60_000_000_000, {"price": 100.0 + i, "rsi": 50.0, "trades": i})
+    assert len(table) == 3
+    assert list(table.column("price")) == [102.0, 103.0, 104.0]
+    assert table.column("trades").dtype == np.int32
+    frame = table.frame()
+    assert list(frame["trades"]) == [2, 3, 4]
+    assert frame.index[0].value == 2 * 60_000_000_000
+    assert np.shares_memory(frame["price"].to_numpy(), table.column("price"))
+    # every row is held twice: 8 + 8 + 4 + 4 bytes of index and columns each
+    assert table.nbytes == 2 * 3 * 24
+
+
+def test_upsert_and_locate():
+    table = RingTable({"price": np.float64, "basis": np.float64}, capacity=4)
+    table.upsert(1, {"price": 1.0})
+    table.upsert(1, {"price": 2.0})
+    table.upsert(2, {"price": 3.0})
+    assert len(table) == 2
+    assert table.value("price", 0) == 2.0
+    assert np.isnan(table.value("basis"))
+    table.set("basis", 0.5)
+    assert table.row()["basis"] == 0.5
+    assert table.locate(2) == 1
+    assert table.locate(5) == -1
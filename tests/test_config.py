@@ -19,3 +19,10 @@ def test_load_config(tmp_path, monkeypatch):
     assert config.mode == "paper"
     assert config.risk["daily_stop"] == -0.02
     assert config.kucoin["api_key"] == "k"
+
+
+def test_load_config_replay(tmp_path):
+    cfg_file = tmp_path / "config.yaml"
+    cfg_file.write_text(yaml.dump({"pairs": [], "data_path": "ticks.csv", "replay_speed": "20x"}))
+    config = load_config(str(cfg_file))
+    assert config.data_path == "ticks.csv" and config.replay_speed == "20x"
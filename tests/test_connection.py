@@ -0,0 +1,151 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+import json
+
+import websockets
+from trading.connection import ConnectionManager, shard_topics, subscriptions, topic_symbol
+
+TOPICS = [f"/contractMarket/{kind}:{symbol}" for symbol in ("A", "B", "C", "D") for kind in ("level2", "execution")]
+
+
+class StandIn:
+    """Local KuCoin-like server: welcome, acks, pongs and a frame per topic every 5ms."""
+
+    def __init__(self):
+        self.subscribed = []
+        self.sockets = set()
+        self.connects = 0
+        self.stall = False
+
+    async def handler(self, ws):
+        self.connects += 1
+        self.sockets.add(ws)
+        topics = []
+        await ws.send(json.dumps({"id": "w", "type": "welcome"}))
+        publisher = asyncio.create_task(self.publish(ws, topics))
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                if self.stall:
+                    continue
+                if msg["type"] == "subscribe":
+                    self.subscribed.append(msg["topic"])
+                    prefix, _, symbols = msg["topic"].partition(":")
+                    topics.extend(f"{prefix}:{s}" for s in symbols.split(","))
+                    await ws.send(json.dumps({"id": msg["id"], "type": "ack"}))
+                elif msg["type"] == "ping":
+                    await ws.send(json.dumps({"id": msg["id"], "type": "pong"}))
+        finally:
+            publisher.cancel()
+            self.sockets.discard(ws)
+
+    async def publish(self, ws, topics):
+        while True:
+            await asyncio.sleep(0.005)
+            if not self.stall:
+                for topic in list(topics):
+                    await ws.send(json.dumps({"type": "message", "topic": topic, "data": {"fundingRate": 0.0}}))
+
+
+def test_sharding_keeps_symbols_together():
+    shards = shard_topics(TOPICS, 3)
+    assert [len(s) for s in shards] == [4, 2, 2]
+    assert shards[0] == TOPICS[:2] + TOPICS[6:]
+    assert subscriptions(shards[0]) == ["/contractMarket/level2:A,D", "/contractMarket/execution:A,D"]
+    assert shard_topics(TOPICS[:2], 4) == [TOPICS[:2]]
+    candles = [f"/contractMarket/candles:{symbol}_{i}" for symbol in ("A", "B", "C", "D") for i in ("1s", "1min")]
+    for shard in shard_topics(TOPICS + candles, 2):
+        owned = {topic_symbol(t) for t in shard}
+        assert owned in ({"A", "C"}, {"B", "D"})
+        assert len(shard) == 8
+
+
+async def _run(scenario, **kwargs):
+    server = StandIn()
+    async with websockets.serve(server.handler, "127.0.0.1", 0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+
+        async def url():
+            return f"ws://127.0.0.1:{port}"
+
+        options = dict(connections=2, ping_interval=0.05, ping_timeout=0.1, backoff=0.01)
+        manager = ConnectionManager(url, TOPICS, **{**options, **kwargs})
+        try:
+            return await scenario(server, manager)
+        finally:
+            await manager.close()
+
+
+async def _take(manager, n):
+    out = []
+    async for raw in manager:
+        out.append(json.loads(raw)["topic"])
+        if len(out) == n:
+            return out
+
+
+def test_streams_over_sharded_sockets_with_heartbeats():
+    async def scenario(server, manager):
+        topics = await asyncio.wait_for(_take(manager, 200), 5)
+        await asyncio.sleep(0.2)
+        return server, topics, manager.stats()
+
+    server, topics, stats = asyncio.run(_run(scenario))
+    assert set(topics) == set(TOPICS)
+    assert sorted(server.subscribed) == sorted([
+        "/contractMarket/level2:A,C", "/contractMarket/execution:A,C",
+        "/contractMarket/level2:B,D", "/contractMarket/execution:B,D",
+    ])
+    for s in stats:
+        assert s["connected"] and s["connects"] == 1 and s["topics"] == 4
+        assert s["messages"] > 0 and s["rate"] > 0
+        assert 0 <= s["latency_ms"] < 100
+
+
+def test_reconnects_and_resubscribes_after_drop_and_stall():
+    async def scenario(server, manager):
+        await asyncio.wait_for(_take(manager, 20), 5)
+        for ws in list(server.sockets):
+            await ws.close()
+        await asyncio.wait_for(_take(manager, 20), 5)
+        dropped = [s["connects"] for s in manager.stats()]
+        server.stall = True
+        await asyncio.sleep(0.4)
+        server.stall = False
+        await asyncio.wait_for(_take(manager, 20), 5)
+        return server, dropped, manager.stats()
+
+    server, dropped, stats = asyncio.run(_run(scenario))
+    assert dropped == [2, 2]
+    assert all(s["stalls"] >= 1 and s["connects"] >= 3 for s in stats)
+    assert len(server.subscribed) >= 3 * 4
+
+
+def test_close_ends_a_waiting_consumer():
+    async def scenario(server, manager):
+        await asyncio.wait_for(_take(manager, 5), 5)
+        server.stall = True
+        while not manager.queue.empty():
+            manager.queue.get_nowait()
+
+        async def consume():
+            return [raw async for raw in manager]
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        await manager.close()
+        return await asyncio.wait_for(consumer, 2)
+
+    assert isinstance(asyncio.run(_run(scenario)), list)
+
+
+def test_slow_consumer_is_not_a_stall():
+    async def scenario(server, manager):
+        await manager.wait_connected(5)
+        # nobody reads: the queue fills and the sockets wait on it
+        await asyncio.sleep(0.5)
+        await asyncio.wait_for(_take(manager, 50), 5)
+        return manager.stats()
+
+    stats = asyncio.run(_run(scenario, queue_size=4))
+    assert all(s["stalls"] == 0 and s["connects"] == 1 for s in stats)
@@ -0,0 +1,72 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pandas as pd
+from trading.cross_asset import CrossAsset, rolling_betas
+
+
+def _returns(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(0, 0.01, n)
+    df = pd.DataFrame({
+        "BTC": base,
+        "ETH": 1.5 * base + rng.normal(0, 0.005, n),
+        "SOL": -0.5 * base + rng.normal(0, 0.01, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="1min", tz="UTC"))
+    df.iloc[rng.choice(n, 40, replace=False), 2] = np.nan  # SOL misses some bars
+    return df
+
+
+def test_streaming_matches_pandas_rolling():
+    df = _returns()
+    window = 50
+    cross = CrossAsset(windows=(window, 20))
+    expected = rolling_betas(df, "BTC", window)
+    stamps = df.index.as_unit("ns").asi8
+    for k, (ts, row) in enumerate(zip(stamps, df.itertuples(index=False))):
+        for sym, value in zip(df.columns, row):
+            if value == value:
+                cross.update(sym, int(ts), value)
+        for sym in ("ETH", "SOL"):
+            got = cross.beta(sym, "BTC")
+            want = expected[sym].iloc[k]
+            assert np.isclose(got, want, rtol=1e-6, atol=1e-12, equal_nan=True), (k, sym)
+    corr = df.iloc[-window:].corr()
+    np.testing.assert_allclose(cross.matrix("correlation").loc[corr.index, corr.columns], corr, rtol=1e-6)
+    assert np.isclose(cross.correlation("ETH", "BTC", window=20), df.iloc[-20:].corr().loc["ETH", "BTC"])
+    assert abs(cross.beta("ETH", "BTC") - 1.5) < 0.2
+
+
+def test_late_value_revises_last_committed_bar():
+    df = _returns(60)
+    stamps = df.index.as_unit("ns").asi8
+    a, b = CrossAsset(windows=(30,)), CrossAsset(windows=(30,))
+    for ts, row in zip(stamps, df.itertuples(index=False)):
+        b.update("BTC", int(ts), row.BTC)
+        b.update("ETH", int(ts), 0.0)
+    for ts, row in zip(stamps, df.itertuples(index=False)):
+        a.update("BTC", int(ts), row.BTC)
+        a.update("ETH", int(ts), 0.0)
+    # a new bar opens, then the previous ETH value arrives late
+    a.update("BTC", int(stamps[-1]) + 60_000_000_000, 0.01)
+    a.update("ETH", int(stamps[-1]), 0.02)
+    b.update("ETH", int(stamps[-1]), 0.02)
+    b.update("BTC", int(stamps[-1]) + 60_000_000_000, 0.01)
+    assert np.isclose(a.covariance("ETH", "BTC"), b.covariance("ETH", "BTC"))
+
+
+def test_seed_matches_streaming():
+    df = _returns(120)
+    stamps = df.index.as_unit("ns").asi8
+    streamed, seeded = CrossAsset(windows=(40,)), CrossAsset(windows=(40,))
+    for ts, row in zip(stamps, df.itertuples(index=False)):
+        for sym, value in zip(df.columns, row):
+            streamed.update(sym, int(ts), value)
+    seeded.seed(df)
+    np.testing.assert_allclose(seeded.matrix("beta"), streamed.matrix("beta"), rtol=1e-9)
+
+
+def test_default_window_is_sixty_days():
+    df = _returns()
+    assert CrossAsset().windows == (60 * 24 * 60,)
+    pd.testing.assert_frame_equal(rolling_betas(df, "BTC"), rolling_betas(df, "BTC", 60 * 24 * 60))
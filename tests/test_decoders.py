@@ -0,0 +1,68 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+import json
+
+import numpy as np
+import pytest
+from kucoin_stream import KucoinDataStream
+from trading.decoders import (
+    BookChange, BookSnapshot, Candle, Funding, Trade, TopicDecoder, peek_topic,
+)
+from trading.recorder import LogReplayer, TickRecorder
+
+FRAMES = [
+    {"type": "welcome", "id": "abc"},
+    {"type": "message", "topic": "/contractMarket/execution:XBTUSDTM", "subject": "match",
+     "data": {"symbol": "XBTUSDTM", "side": "buy", "size": 2, "price": "42000.5", "tradeId": "t1",
+              "ts": 1704067200123456789}},
+    {"type": "message", "topic": "/contractMarket/candles:XBTUSDTM_1min", "subject": "candle.stick",
+     "data": {"symbol": "XBTUSDTM", "candles": ["1704067200", "1", "2", "3", "0.5", "10", "20"],
+              "time": 1704067260000}},
+    {"type": "message", "topic": "/contractMarket/level2:XBTUSDTM", "subject": "level2",
+     "data": {"sequence": 18, "change": "42001.0,sell,7", "timestamp": 1704067200500}},
+    {"type": "message", "topic": "/contractMarket/level2:ETHUSDTM", "subject": "level2",
+     "data": {"bids": [[99.0, 1.0], [98.0, 2.0]], "asks": [[101.0, 3.0]], "timestamp": 1704067200600}},
+    {"type": "message", "topic": "/contractMarket/fundingRate:XBTUSDTM",
+     "data": {"fundingRate": 0.0001, "timestamp": 1704067200700}},
+]
+
+
+def test_frames_decode_to_typed_records():
+    decoder = TopicDecoder()
+    out = [decoder.decode(json.dumps(f)) for f in FRAMES]
+    assert out[0] is None
+    assert out[1] == Trade("XBTUSDTM", 1704067200123, 42000.5, 2.0, "buy", "t1")
+    assert out[2] == Candle("XBTUSDTM", "1min", 1704067200000, 1.0, 2.0, 3.0, 0.5, 10.0, 20.0)
+    assert out[3] == BookChange("XBTUSDTM", 1704067200500, 18, 42001.0, "sell", 7.0)
+    assert isinstance(out[4], BookSnapshot) and out[4].symbol == "ETHUSDTM"
+    np.testing.assert_array_equal(out[4].bids, [[99.0, 1.0], [98.0, 2.0]])
+    assert out[4].asks.shape == (1, 2)
+    assert out[5] == Funding("XBTUSDTM", 1704067200700, 0.0001)
+    assert decoder.stats() == {"decoded": 5, "dropped": 1}
+
+
+def test_unrequested_topics_are_dropped_unparsed():
+    decoder = TopicDecoder(["/contractMarket/fundingRate"])
+    broken = '{"type":"message","topic":"/contractMarket/level2:XBTUSDTM","data":{not json'
+    assert decoder.decode(broken) is None
+    assert [type(decoder.decode(json.dumps(f))) for f in FRAMES[1:]].count(Funding) == 1
+    assert decoder.stats() == {"decoded": 1, "dropped": 5}
+    assert peek_topic('{"id": 1, "type": "ack"}') is None
+    with pytest.raises(ValueError):
+        TopicDecoder(["/contractMarket/tickerV2"])
+
+
+def test_stream_events(tmp_path):
+    with TickRecorder(str(tmp_path)) as rec:
+        for frame in FRAMES:
+            rec.record(json.dumps(frame))
+    stream = KucoinDataStream(["XBTUSDTM"])
+    stream.websocket = LogReplayer(str(tmp_path))
+    assert stream.decoder is None
+
+    async def _collect():
+        return [e async for e in stream.events(["/contractMarket/execution", "/contractMarket/level2"])]
+
+    events = asyncio.run(_collect())
+    assert [type(e) for e in events] == [Trade, BookChange, BookSnapshot]
+    assert stream.decoder.stats() == {"decoded": 3, "dropped": 3}
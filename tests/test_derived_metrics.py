@@ -1,28 +1,142 @@
 import sys, os
 sys.path.insert(0, os.path.abspath("src"))
-from trading.derived_metrics import DerivedMetrics
+import numpy as np
+import pandas as pd
+from trading.derived_metrics import COLUMNS, CROSS_COLUMNS, DerivedMetrics, batch_metrics
+from trading.metrics_engine import MetricsEngine
 from datetime import datetime
 
 
-def test_basic_metrics():
-    dm = DerivedMetrics(store_path="test_metrics.h5")
+def test_basic_metrics(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "metrics"))
     ts = int(datetime.utcnow().timestamp() * 1000)
 
     raw1 = {"ts": ts, "symbol": "BTCUSDTM", "price": 100.0, "size": 2.0, "side": "buy"}
     ob1 = {"bids": [[99.5, 5.0]], "asks": [[100.5, 5.0]], "spot_price": 100.0}
     fund1 = {"fundingRate": 0.0001}
     oi1 = {"openInterest": 1000, "longQty": 600, "shortQty": 400, "marketCap": 10000}
-    dm.update(raw1, ob1, fund1, oi1, [])
+    first = dm.update(raw1, ob1, fund1, oi1, [])
+    assert isinstance(first, pd.Series)
 
     raw2 = {"ts": ts + 60000, "symbol": "BTCUSDTM", "price": 102.0, "size": 2.0, "side": "buy"}
     ob2 = {"bids": [[101.5, 5.0]], "asks": [[102.5, 5.0]], "spot_price": 101.0}
     fund2 = {"fundingRate": 0.0002}
     oi2 = {"openInterest": 1200, "longQty": 700, "shortQty": 500, "marketCap": 10000}
-    df = dm.update(raw2, ob2, fund2, oi2, [])
+    row = dm.update(raw2, ob2, fund2, oi2, [])
+    df = dm.master
 
     last = df.loc["BTCUSDTM"].iloc[-1]
+    assert row.name == df.loc["BTCUSDTM"].index[-1]
     assert abs(last.VWAP - 101.0) < 1e-6
     assert abs(last.AnnualizedFunding - 0.0002 * 3 * 365) < 1e-9
     assert "MomentumScore" in df.columns
     for key in ["RSI", "BollingerBandwidth", "ChaikinMoneyFlow", "AggressorVolumeDelta", "DepthAt0_1pct", "BidAskSpread", "TWAPDeviation"]:
         assert key in df.columns
+
+    dm.close()
+    stored = dm.store.read("BTCUSDTM")
+    assert len(stored) == 1  # only the finished first bar
+    assert abs(stored.VWAP.iloc[0] - 100.0) < 1e-6
+
+
+def test_capacity_bounds_table_memory(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "metrics"), capacity=100)
+    ts = int(datetime.utcnow().timestamp() * 1000)
+    for i in range(3):
+        dm.update({"ts": ts + i * 60000, "symbol": "BTCUSDTM", "price": 100.0 + i, "size": 1.0, "side": "buy"},
+                  {"bids": [[99.5, 5.0]], "asks": [[100.5, 5.0]], "spot_price": 100.0}, {}, {}, [])
+    table = dm.tables["BTCUSDTM"]
+    assert table.capacity == 100
+    assert table.nbytes == 2 * 100 * (8 + sum(np.dtype(t).itemsize for t in dm.schema.values()))
+    dm.close()
+
+
+def test_master_is_cached_and_invalidated_per_symbol(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "metrics"))
+    ts = int(pd.Timestamp("2024-01-01", tz="UTC").value // 10**6)
+    book = {"bids": [[99.5, 5.0]], "asks": [[100.5, 5.0]], "spot_price": 100.0}
+    for i, symbol in enumerate(["BTCUSDTM", "ETHUSDTM", "BTCUSDTM"]):
+        tick = {"ts": ts + i * 60000, "symbol": symbol, "price": 100.0 + i, "size": 1.0, "side": "buy"}
+        dm.update(tick, book, {}, {}, [])
+    master = dm.master
+    assert dm.master is master
+    assert list(master.index.get_level_values("symbol")) == ["BTCUSDTM", "BTCUSDTM", "ETHUSDTM"]
+    eth = dm._parts["ETHUSDTM"]
+
+    dm.update({"ts": ts + 3 * 60000, "symbol": "BTCUSDTM", "price": 104.0, "size": 1.0}, book, {}, {}, [])
+    assert dm._master is None
+    assert len(dm.master.loc["BTCUSDTM"]) == 3
+    assert dm._parts["ETHUSDTM"] is eth
+
+    latest = dm.latest()
+    assert list(latest.index) == ["BTCUSDTM", "ETHUSDTM"]
+    assert latest.loc["BTCUSDTM", "LastPrice"] == 104.0
+    assert latest.loc["ETHUSDTM", "ts"] == pd.Timestamp("2024-01-01 00:01", tz="UTC")
+    part = dm.between(pd.Timestamp("2024-01-01 00:01", tz="UTC"), pd.Timestamp("2024-01-01 00:02", tz="UTC"))
+    assert list(part.index.get_level_values("symbol")) == ["BTCUSDTM", "ETHUSDTM"]
+    assert part.loc["BTCUSDTM"].LastPrice.tolist() == [102.0]
+
+
+def _random_ticks(n_bars, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp("2024-01-01", tz="UTC")
+    price = 100.0
+    for i in range(n_bars):
+        for j in range(int(rng.integers(1, 4))):
+            price *= 1 + rng.normal(0, 0.002)
+            spread = abs(rng.normal(0.05, 0.01))
+            book = {
+                "bids": [[price - spread - k * 0.1, float(rng.uniform(0.5, 5))] for k in range(5)],
+                "asks": [[price + spread + k * 0.1, float(rng.uniform(0.5, 5))] for k in range(5)],
+                "spot_price": price * (1 + rng.normal(0, 1e-4)),
+            }
+            liqs = [
+                {"side": str(rng.choice(["buy", "sell"])), "size": float(rng.uniform(0, 2)), "price": price}
+                for _ in range(int(rng.integers(0, 2)))
+            ]
+            tick = {
+                "ts": int((base + pd.Timedelta(minutes=i, seconds=10 * j)).value // 10**6),
+                "symbol": "ETHUSDTM",
+                "price": price,
+                "size": float(rng.uniform(0.1, 3)),
+                "side": str(rng.choice(["buy", "sell"])),
+            }
+            fund = {"fundingRate": float(rng.normal(1e-4, 5e-5))}
+            oi = {
+                "openInterest": float(rng.uniform(900, 1100)),
+                "longQty": float(rng.uniform(400, 600)),
+                "shortQty": float(rng.uniform(400, 600)),
+                "marketCap": 1e6,
+            }
+            yield tick, book, fund, oi, liqs
+
+
+def test_streaming_matches_batch(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "metrics"))
+    engine = MetricsEngine()
+    rows = {}
+    for tick, book, fund, oi, liqs in _random_ticks(1500):
+        ts = pd.to_datetime(tick["ts"], unit="ms", utc=True).floor("1min")
+        fields = {
+            "price": tick["price"],
+            "size": tick["size"],
+            "side": 1.0 if tick["side"] == "buy" else -1.0,
+            "micro": dm.book(book, tick["price"])["MicroPrice"],
+            "SpotPrice": book["spot_price"],
+            "FundingRate": fund["fundingRate"],
+            "OpenInterest": oi["openInterest"],
+            "LongOI": oi["longQty"],
+            "ShortOI": oi["shortQty"],
+            "MarketCap": oi["marketCap"],
+            "liq_buy": sum(l["size"] for l in liqs if l["side"] == "buy"),
+            "liq_sell": sum(l["size"] for l in liqs if l["side"] == "sell"),
+            "liq_density": len(liqs) / 1e-9 if liqs else 0.0,
+        }
+        rows[ts] = engine.update(ts, fields, dm.book(book, tick["price"]))
+    streamed = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=COLUMNS)
+    expected = batch_metrics(streamed)
+    checked = [c for c in COLUMNS if c not in CROSS_COLUMNS]
+    assert expected["ValueAtRisk_95"].notna().sum() > 0
+    np.testing.assert_allclose(
+        streamed[checked].to_numpy(float), expected[checked].to_numpy(float), rtol=1e-6, atol=1e-9
+    )
@@ -0,0 +1,74 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import threading
+import time
+import pandas as pd
+import pytest
+from trading.derived_metrics import DerivedMetrics
+from trading.fanout import Subscription
+
+BOOK = {"bids": [[99.5, 5.0]], "asks": [[100.5, 5.0]], "spot_price": 100.0}
+
+
+def _row(i):
+    return pd.Series({"LastPrice": float(i), "VWAP": float(i)})
+
+
+def test_all_policy_delivers_in_order_and_drops_when_full():
+    gate = threading.Event()
+    seen = []
+    sub = Subscription(lambda sym, row: (gate.wait(), seen.append((sym, row["LastPrice"]))), max_queue=3)
+    sub.offer("BTC", _row(0))
+    time.sleep(0.05)
+    for i in range(1, 6):
+        sub.offer("BTC", _row(i))
+    gate.set()
+    assert sub.flush(timeout=5)
+    # the first row was taken by the worker before the queue filled up
+    assert seen == [("BTC", 0.0), ("BTC", 1.0), ("BTC", 2.0), ("BTC", 3.0)]
+    assert sub.stats()["dropped"] == 2 and sub.delivered == 4
+    sub.close()
+
+
+def test_latest_policy_conflates_per_symbol():
+    gate = threading.Event()
+    seen = []
+    sub = Subscription(lambda sym, row: (gate.wait(), seen.append((sym, row["LastPrice"]))), policy="latest")
+    sub.offer("BTC", _row(0))
+    time.sleep(0.05)
+    for i in range(1, 5):
+        sub.offer("BTC", _row(i))
+        sub.offer("ETH", _row(10 + i))
+    gate.set()
+    sub.close(timeout=5)
+    assert seen == [("BTC", 0.0), ("BTC", 4.0), ("ETH", 14.0)]
+    assert sub.conflated == 6 and sub.dropped == 0
+
+
+def test_batch_policy_and_slow_subscriber_does_not_block(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "m"))
+    batches = []
+    batch = dm.subscribe(batches.append, columns=["LastPrice"], policy="batch", batch_ms=50)
+    slow = dm.subscribe(lambda sym, row: time.sleep(0.2))
+    start = time.perf_counter()
+    for i in range(5):
+        dm.update({"ts": i * 1000, "symbol": "BTCUSDTM", "price": 100.0 + i, "size": 1.0}, BOOK, {}, {}, [])
+    assert time.perf_counter() - start < 0.2
+    assert batch.flush(timeout=5)
+    assert [sym for b in batches for sym, _ in b] == ["BTCUSDTM"] * 5
+    assert [row["LastPrice"] for b in batches for _, row in b] == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert list(batches[0][0][1].index) == ["LastPrice"]
+    stats = {s["name"]: s for s in dm.subscriber_stats()}
+    assert stats["<lambda>"]["queue_depth"] > 0
+    dm.close()
+    assert slow.delivered == 5 and slow.max_lag > 0
+
+
+def test_errors_are_counted_and_policy_checked():
+    sub = Subscription(lambda sym, row: 1 / 0)
+    sub.offer("BTC", _row(0))
+    sub.close(timeout=5)
+    assert sub.errors == 1 and sub.delivered == 1
+    assert not sub.offer("BTC", _row(1)) and sub.dropped == 1
+    with pytest.raises(ValueError):
+        Subscription(print, policy="sometimes")
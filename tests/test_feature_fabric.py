@@ -1,5 +1,12 @@
 import sys, os; sys.path.insert(0, os.path.abspath("src"))
-from feature_fabric import FeatureFabric
+import asyncio
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from feature_fabric import FeatureFabric, load_analyzer
 
 
 def test_funding_rate_zscore():
@@ -9,8 +16,79 @@ def test_funding_rate_zscore():
     assert scores[-1] != 0
 
 
+def test_funding_horizons_match_pandas():
+    rates = pd.Series(np.random.default_rng(5).normal(1e-4, 3e-5, 300)).cumsum() * 0.01 + 1e-4
+    ff = FeatureFabric(window=50, funding_horizons={"short": 10, "long": 120})
+    rows = pd.DataFrame([ff.update({"topic": "/contractMarket/fundingRate:XBTUSDTM", "data": {"fundingRate": r}})
+                         for r in rates])
+    assert set(rows.columns) == {
+        "funding_rate_zscore",
+        *(f"funding_{k}_{h}" for k in ("zscore", "ewm", "ewm_vol") for h in ("short", "long")),
+    }
+    for name, n in (("rate", 50), ("short", 10), ("long", 120)):
+        roll = rates.rolling(n, min_periods=2)
+        expected = ((rates - roll.mean()) / (roll.std() + 1e-8)).fillna(0.0)
+        column = "funding_rate_zscore" if name == "rate" else f"funding_zscore_{name}"
+        np.testing.assert_allclose(rows[column], expected, rtol=1e-6, atol=1e-6)
+    for name, n in (("short", 10), ("long", 120)):
+        ewm = rates.ewm(span=n, adjust=False)
+        np.testing.assert_allclose(rows[f"funding_ewm_{name}"], ewm.mean(), rtol=1e-9)
+        np.testing.assert_allclose(rows[f"funding_ewm_vol_{name}"], np.sqrt(ewm.var(bias=True)), rtol=1e-6, atol=1e-12)
+
+
 def test_depth_weighted_mid_price():
     bids = [[100.0, 2], [99.5, 1]]
     asks = [[100.5, 2], [101.0, 1]]
     price = FeatureFabric.depth_weighted_mid_price(bids, asks)
     assert 99.0 < price < 101.0
+
+
+class CountingAnalyzer:
+    def __init__(self):
+        self.calls = []
+
+    def polarity_scores(self, text):
+        self.calls.append(text)
+        return {"compound": len(text) / 100}
+
+
+def test_sentiment_is_batched_and_cached():
+    analyzer = CountingAnalyzer()
+    ff = FeatureFabric(sentiment_cache=2, analyzer=analyzer)
+    assert ff.sentiment_scores(["up", "down", "up"]) == [0.02, 0.04, 0.02]
+    assert analyzer.calls == ["up", "down"]
+    assert ff.sentiment_score(["down", "flat"]) == pytest.approx(0.04)
+    assert analyzer.calls == ["up", "down", "flat"]
+    # "up" was least recently used
+    ff.sentiment_scores(["up"])
+    assert analyzer.calls[-1] == "up"
+    assert ff.update({"sentiment_texts": []}) == {}
+
+
+def test_sentiment_off_the_event_loop():
+    threads = []
+
+    class Recording(CountingAnalyzer):
+        def polarity_scores(self, text):
+            threads.append(threading.get_ident())
+            return super().polarity_scores(text)
+
+    ff = FeatureFabric(analyzer=Recording())
+    loop_thread = threading.get_ident()
+    msg = {"topic": "/contractMarket/fundingRate:XBTUSDTM", "data": {"fundingRate": 0.01}, "sentiment_texts": ["moon"]}
+    features = asyncio.run(ff.update_async(msg))
+    ff.close()
+    assert features["sentiment_score"] == pytest.approx(0.04)
+    assert "funding_rate_zscore" in features
+    assert threads and loop_thread not in threads
+
+
+def test_analyzer_is_lazy_and_fabric_pickles(tmp_path):
+    ff = FeatureFabric(window=3, lexicon_dir=str(tmp_path))
+    assert ff._analyzer is None
+    ff.funding_rate_zscore(0.01)
+    clone = pickle.loads(pickle.dumps(ff))
+    assert clone.funding_features(0.03) == ff.funding_features(0.03)
+    assert clone._analyzer is None
+    with pytest.raises(LookupError):
+        load_analyzer(str(tmp_path), download=False)
@@ -1,6 +1,8 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
 import numpy as np
 import pandas as pd
-from trading.features import hurst_exponent, FeatureFabric
+from trading.features import hurst_exponent, return_entropy, FeatureFabric, RollingEntropy, RollingHurst
 from datetime import datetime, timedelta
 
 
@@ -8,6 +10,31 @@ def test_hurst_range():
     data = pd.Series(np.cumsum(np.random.randn(500)))
     h = hurst_exponent(data)
     assert 0 <= h <= 2
+    assert h == hurst_exponent(data.to_numpy())
+
+
+def test_rolling_hurst_matches_batch():
+    rng = np.random.default_rng(0)
+    closes = 100 + np.cumsum(rng.normal(0, 0.1, 400))
+    hurst = RollingHurst(window=120)
+    for t, x in enumerate(closes):
+        got = hurst.peek(x)
+        if t < 19:
+            assert np.isnan(got)
+        else:
+            assert np.isclose(got, hurst_exponent(closes[max(0, t - 119): t + 1]), rtol=1e-9, atol=1e-12)
+        hurst.push(x)
+
+
+def test_rolling_entropy_matches_batch():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0, 4e-4, 300)
+    edges = np.linspace(-1e-3, 1e-3, 11)
+    ent = RollingEntropy(window=60, edges=edges)
+    for t, r in enumerate(returns):
+        window = np.clip(returns[max(0, t - 59): t + 1], edges[0], edges[-1])
+        assert np.isclose(ent.peek(r), return_entropy(window, bins=edges), rtol=1e-9)
+        ent.push(r)
 
 
 def test_feature_keys():
@@ -35,3 +62,95 @@ def test_feature_keys():
     features = fab.update(tick2)
     for key in ["trend_strength", "volatility_state", "order_flow_bias", "last_move"]:
         assert key in features
+
+
+class _BatchFabric:
+    """The DataFrame implementation FeatureFabric replaced, kept as a reference.
+
+    ``entropy`` and ``hurst`` are checked against the batch functions below.
+    """
+
+    def __init__(self, vol_window=30):
+        self.df = pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
+        self.last_ts = None
+        self.vol_window = vol_window
+        self.surf_windows = [10, 30, 60]
+
+    def update(self, tick):
+        ts = pd.to_datetime(tick.get("ts"), unit="ms", utc=True)
+        price = float(tick.get("price"))
+        size = float(tick.get("size") or 0.0)
+        ts_sec = ts.floor("1s")
+        if self.last_ts is not None and ts_sec > self.last_ts:
+            while self.last_ts + pd.Timedelta(seconds=1) < ts_sec and (ts_sec - self.last_ts).total_seconds() <= 60:
+                self.last_ts += pd.Timedelta(seconds=1)
+                self.df.loc[self.last_ts] = self.df.iloc[-1]
+        if ts_sec not in self.df.index:
+            self.df.loc[ts_sec] = [price, price, price, price, size]
+        else:
+            row = self.df.loc[ts_sec]
+            row["high"] = max(row["high"], price)
+            row["low"] = min(row["low"], price)
+            row["close"] = price
+            row["volume"] += size
+            self.df.loc[ts_sec] = row
+        self.last_ts = ts_sec
+        df = self.df.sort_index().astype(float)
+        df["return"] = df["close"].pct_change().fillna(0)
+        df["vol"] = df["return"].rolling(self.vol_window, min_periods=1).std().fillna(0)
+        df["ma10"] = df["close"].rolling(10, min_periods=1).mean()
+        df["ma60"] = df["close"].rolling(60, min_periods=1).mean()
+        for w in self.surf_windows:
+            df[f"vol_{w}"] = df["return"].rolling(w, min_periods=1).std().fillna(0)
+        df["tr"] = np.maximum.reduce([
+            (df["high"] - df["low"]).abs(),
+            (df["high"] - df["close"].shift(1)).abs(),
+            (df["low"] - df["close"].shift(1)).abs(),
+        ])
+        df["atr"] = df["tr"].rolling(14, min_periods=1).mean()
+        df["trend_strength"] = ((df["ma10"] - df["ma60"]).abs() / (df["atr"] + 1e-9)).rolling(5, min_periods=1).mean()
+        df["trend_strength"] = 1 / (1 + np.exp(-df["trend_strength"]))
+        vol_median = df["vol"].rolling(60, min_periods=1).median()
+        df["volatility_state"] = (df["vol"] / (vol_median + 1e-9)).clip(0, None)
+        df["volatility_state"] = 1 / (1 + np.exp(-(df["volatility_state"] - 1)))
+        features = df.iloc[-1].to_dict()
+        if len(df) > 1:
+            for col in ["open", "high", "low", "close", "volume"]:
+                features[f"d_{col}"] = df.iloc[-1][col] - df.iloc[-2][col]
+        return features
+
+
+def test_streaming_matches_batch():
+    rng = np.random.default_rng(3)
+    stream, batch = FeatureFabric(), _BatchFabric()
+    ts = 1_700_000_000_000
+    price = 100.0
+    for i in range(250):
+        step = rng.choice([0, 300, 1000, 2500, 15_000, 90_000], p=[0.2, 0.3, 0.3, 0.1, 0.07, 0.03])
+        ts += int(step)
+        if rng.random() < 0.7:
+            price *= 1 + rng.normal(0, 1e-3)
+        tick = {"ts": ts, "price": price, "size": float(rng.uniform(0.1, 2)), "symbol": "BTC"}
+        got, expected = stream.update(tick), batch.update(tick)
+        assert [k for k in got if k in expected] == list(expected)
+        for key, value in expected.items():
+            assert np.isclose(got[key], value, rtol=1e-6, atol=1e-9, equal_nan=True), (i, key, got[key], value)
+    assert len(batch.df) > 300 and stream.bars == len(batch.df)
+
+
+def test_late_ticks_are_skipped():
+    fab = FeatureFabric()
+    fab.update({"ts": 10_000, "price": 100.0, "size": 1.0})
+    fab.update({"ts": 12_000, "price": 101.0, "size": 1.0})
+    features = fab.update({"ts": 10_500, "price": 50.0, "size": 1.0})
+    assert fab.late == 1 and features["close"] == 101.0 and fab.bars == 3
+
+
+def test_long_silences_are_not_filled():
+    fab = FeatureFabric()
+    fab.update({"ts": 1_000, "price": 100.0, "size": 1.0})
+    fab.update({"ts": 6_000, "price": 100.0, "size": 1.0})
+    assert fab.bars == 6
+    # a day and 30s later: the day-wrapped gap must not fill 86,430 bars
+    fab.update({"ts": 6_000 + 86_430_000, "price": 101.0, "size": 1.0})
+    assert fab.bars == 7
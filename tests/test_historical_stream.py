@@ -1,5 +1,6 @@
 import sys, os, asyncio
 sys.path.insert(0, os.path.abspath("src"))
+from trading.clock import SimulatedClock
 from trading.ingestion import HistoricalDataStream
 
 
@@ -17,3 +18,25 @@ def test_historical_stream(tmp_path):
     rows = asyncio.run(_collect())
     assert rows[0]["close"] == 100
     assert rows[1]["close"] == 101
+
+
+def test_historical_stream_keeps_symbols_apart(tmp_path):
+    csv = tmp_path / "ticks.csv"
+    csv.write_text(
+        "ts,symbol,price,size\n"
+        "1000,AAA,100,1\n"
+        "1100,BBB,50,2\n"
+        "1200,AAA,101,1\n"
+        "2000,BBB,51,1\n"
+    )
+    stream = HistoricalDataStream(str(csv), clock=SimulatedClock())
+
+    async def _collect():
+        return [row async for row in stream.stream()]
+
+    rows = asyncio.run(_collect())
+    assert [(r["symbol"], r["open"], r["close"], r["volume"]) for r in rows] == [
+        ("AAA", 100, 100, 1), ("BBB", 50, 50, 2), ("AAA", 100, 101, 2), ("BBB", 51, 51, 1),
+    ]
+    assert sorted(stream.features) == ["AAA", "BBB"]
+    assert stream.features["BBB"].bars == 2
@@ -0,0 +1,76 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import math
+import pytest
+import pandas as pd
+from trading.derived_metrics import DerivedMetrics
+from trading.metric_registry import MetricRegistry
+from trading.metrics_engine import MetricsEngine
+from trading.rolling import RollingSum
+
+
+def test_plan_orders_dependencies_and_follows_prev_inputs():
+    reg = MetricRegistry()
+    reg.register("c", "b", "prev:d")(lambda b, d: b)
+    reg.register("b", "a")(lambda a: a)
+    reg.register("d", "x")(lambda x: x)
+    names = [m.name for m in reg.plan(["c"])]
+    assert names.index("b") < names.index("c")
+    assert set(names) == {"b", "c", "d"}
+    assert [m.name for m in reg.plan(["d"])] == ["d"]
+
+
+def test_plan_rejects_cycles():
+    reg = MetricRegistry()
+    reg.register("a", "b")(lambda b: b)
+    reg.register("b", "a")(lambda a: a)
+    with pytest.raises(ValueError):
+        reg.plan(["a"])
+
+
+def _tick(price):
+    return {"price": price, "size": 1.0, "side": 1.0, "micro": price, "SpotPrice": price, "FundingRate": 1e-4,
+            "OpenInterest": 10.0, "LongOI": 5.0, "ShortOI": 5.0, "MarketCap": 1e3,
+            "liq_buy": 0.0, "liq_sell": 0.0, "liq_density": 0.0}
+
+
+BOOK = {"OrderBookImbalance": 0.0, "DepthAt0_1pct": 1.0, "DepthAt0_5pct": 2.0, "LiquiditySlope": 0.0,
+        "BidAskSpread": 0.1, "QuotedSpread": 1e-3, "MicroPrice": 100.0, "SlippageCost1kUSD": 0.0}
+
+
+def test_engine_computes_only_requested_closure():
+    full = MetricsEngine()
+    rsi = MetricsEngine(columns=["RSI"])
+    assert "RSI" in rsi.outputs and "VWAP" not in rsi.outputs
+    assert set(rsi.states) == {"_roll_up", "_roll_down"}
+    base = pd.Timestamp("2024-01-01", tz="UTC")
+    for i in range(40):
+        ts = base + pd.Timedelta(minutes=i)
+        price = 100 + math.sin(i)
+        a = full.update(ts, _tick(price), BOOK)
+        b = rsi.update(ts, _tick(price), BOOK)
+        assert b["RSI"] == a["RSI"] or (math.isnan(a["RSI"]) and math.isnan(b["RSI"]))
+    assert "HV20d" not in b
+
+
+def test_custom_registry_metric():
+    reg = MetricRegistry()
+    reg.register("Mean3", "LastPrice", state=lambda engine: RollingSum(3))(lambda acc, x: acc.mean(x))
+    engine = MetricsEngine(registry=reg)
+    base = pd.Timestamp("2024-01-01", tz="UTC")
+    rows = [engine.update(base + pd.Timedelta(minutes=i), _tick(float(i)), {}) for i in range(4)]
+    assert math.isnan(rows[1]["Mean3"]) and rows[3]["Mean3"] == 2.0
+
+
+def test_subscribers_declare_columns(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "m"), columns=[])
+    seen = []
+    sub = dm.subscribe(lambda sym, row: seen.append(row), columns=["VWAP", "BetaBTC"])
+    book = {"bids": [[99.5, 5.0]], "asks": [[100.5, 5.0]], "spot_price": 100.0}
+    dm.update({"ts": 0, "symbol": "BTCUSDTM", "price": 100.0, "size": 2.0}, book, {}, {}, [])
+    assert sub.flush(timeout=5)
+    assert list(seen[-1].index) == ["VWAP", "BetaBTC"]
+    assert seen[-1]["VWAP"] == 100.0 and seen[-1]["BetaBTC"] == 1.0
+    assert "RSI" not in dm.engines["BTCUSDTM"].outputs
+    with pytest.raises(KeyError):
+        dm.require(["NotAMetric"])
@@ -0,0 +1,87 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from trading.metrics_store import BackgroundWriter, ColumnStore
+
+SCHEMA = {"price": np.float64, "count": np.int32}
+
+
+def _frame(start, n):
+    index = pd.date_range(start, periods=n, freq="1h", tz="UTC")
+    return pd.DataFrame({"price": np.arange(n, dtype=float), "count": np.arange(n)}, index=index)
+
+
+def test_store_partitions_by_day_and_reads_slices(tmp_path):
+    store = ColumnStore(str(tmp_path), SCHEMA)
+    store.append("ETHUSDTM", _frame("2024-01-01 20:00", 3))
+    store.append("ETHUSDTM", _frame("2024-01-01 23:00", 2))
+    assert sorted(os.listdir(tmp_path / "ETHUSDTM")) == ["2024-01-01", "2024-01-02"]
+    df = store.read("ETHUSDTM")
+    assert list(df.price) == [0.0, 1.0, 2.0, 0.0, 1.0]
+    assert df["count"].dtype == np.int32
+    part = store.read("ETHUSDTM", start=pd.Timestamp("2024-01-02", tz="UTC"))
+    assert len(part) == 1 and part.index[0] == pd.Timestamp("2024-01-02", tz="UTC")
+
+
+def test_store_trims_torn_append(tmp_path):
+    store = ColumnStore(str(tmp_path), SCHEMA)
+    store.append("ETHUSDTM", _frame("2024-01-01", 3))
+    with open(tmp_path / "ETHUSDTM" / "2024-01-01" / "price.bin", "ab") as fh:
+        fh.write(np.float64(9.0).tobytes())
+    assert len(store.read("ETHUSDTM")) == 3
+
+
+def test_append_after_torn_write_keeps_rows_aligned(tmp_path):
+    store = ColumnStore(str(tmp_path), SCHEMA)
+    store.append("ETHUSDTM", _frame("2024-01-01", 3))
+    part = tmp_path / "ETHUSDTM" / "2024-01-01"
+    # a crash wrote the 4th row's index and price but not its count
+    with open(part / "_index.bin", "ab") as fh:
+        fh.write(np.int64(pd.Timestamp("2024-01-01 03:00").value).tobytes())
+    with open(part / "price.bin", "ab") as fh:
+        fh.write(np.float64(9.0).tobytes())
+    restarted = ColumnStore(str(tmp_path), SCHEMA)
+    restarted.append("ETHUSDTM", _frame("2024-01-01 04:00", 2) + 10)
+    df = restarted.read("ETHUSDTM")
+    assert list(df.index.hour) == [0, 1, 2, 4, 5]
+    assert list(df.price) == [0.0, 1.0, 2.0, 10.0, 11.0]
+    assert list(df["count"]) == [0, 1, 2, 10, 11]
+
+
+def test_append_with_other_columns_widens_partition(tmp_path):
+    ColumnStore(str(tmp_path), SCHEMA).append("ETHUSDTM", _frame("2024-01-01", 2))
+    frame = _frame("2024-01-01 02:00", 2).drop(columns="count").assign(size=[5.0, 6.0])
+    store = ColumnStore(str(tmp_path), {"price": np.float64, "size": np.float64})
+    store.append("ETHUSDTM", frame)
+    df = store.read("ETHUSDTM")
+    assert list(df.price) == [0.0, 1.0, 0.0, 1.0]
+    assert list(df["count"]) == [0, 1, 0, 0]
+    assert np.isnan(df["size"][:2]).all() and list(df["size"][2:]) == [5.0, 6.0]
+    with pytest.raises(ValueError):
+        ColumnStore(str(tmp_path), {"price": np.float32}).append("ETHUSDTM", frame)
+
+
+def test_writer_batches_and_counts_drops(tmp_path):
+    store = ColumnStore(str(tmp_path), SCHEMA)
+    gate = threading.Event()
+    append = store.append
+
+    def slow_append(symbol, frame):
+        gate.wait()
+        append(symbol, frame)
+
+    store.append = slow_append
+    writer = BackgroundWriter(store, flush_interval=0.01, flush_rows=1, max_rows=5, fsync="close")
+    accepted = sum(writer.submit("ETHUSDTM", _frame("2024-01-01", 1)) for _ in range(10))
+    assert writer.dropped == 10 - accepted > 0
+    # the bound is in rows: a 3-row frame does not fit beside the queued ones
+    assert 0 < writer.queue_depth <= 5 and not writer.submit("ETHUSDTM", _frame("2024-01-02", 3))
+    assert writer.dropped == 13 - accepted
+    gate.set()
+    writer.close(timeout=5)
+    stats = writer.stats()
+    assert stats["written"] == accepted and stats["queue_depth"] == 0
+    assert len(store.read("ETHUSDTM")) == accepted
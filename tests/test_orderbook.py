@@ -0,0 +1,122 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pytest
+from feature_fabric import FeatureFabric
+from trading.book_metrics import BookMetrics
+from trading.decoders import BookChange
+from trading.orderbook import OrderBook, OrderBooks
+
+TICK = 0.5
+
+
+def _reference_levels(ref, depth):
+    bids = sorted(((p, s) for (side, p), s in ref.items() if side == "buy" and s > 0), reverse=True)[:depth]
+    asks = sorted((p, s) for (side, p), s in ref.items() if side == "sell" and s > 0)[:depth]
+    return np.array(bids).reshape(-1, 2), np.array(asks).reshape(-1, 2)
+
+
+def _snapshot(rng, mid=1000.0, n=30):
+    bids = [[mid - TICK * (k + 1), float(rng.uniform(1, 5))] for k in range(n)]
+    asks = [[mid + TICK * (k + 1), float(rng.uniform(1, 5))] for k in range(n)]
+    return bids, asks
+
+
+def _deltas(rng, start_seq, n, mid=1000.0):
+    out = []
+    for k in range(n):
+        side = "buy" if rng.random() < 0.5 else "sell"
+        offset = int(rng.integers(1, 60)) * TICK
+        price = mid - offset if side == "buy" else mid + offset
+        size = 0.0 if rng.random() < 0.3 else float(rng.uniform(0.1, 5))
+        out.append((start_seq + k, price, side, size))
+    return out
+
+
+def test_deltas_match_reference_book():
+    rng = np.random.default_rng(0)
+    bids, asks = _snapshot(rng)
+    book = OrderBook(TICK, levels=1024)
+    assert not book.apply(5, 999.0, "buy", 1.0)
+    book.load_snapshot(10, bids, asks)
+    ref = {("buy", p): s for p, s in bids}
+    ref.update({("sell", p): s for p, s in asks})
+    for seq, price, side, size in _deltas(rng, 11, 2000):
+        assert book.apply(seq, price, side, size)
+        ref[(side, price)] = size
+        if seq % 97 == 0:
+            rb, ra = _reference_levels(ref, 10)
+            got = book.levels(10)
+            np.testing.assert_allclose(got["bids"], rb)
+            np.testing.assert_allclose(got["asks"], ra)
+            assert book.best_bid() == tuple(rb[0]) and book.best_ask() == tuple(ra[0])
+            assert book.depth("buy", rb[-1, 0]) == pytest.approx(rb[:, 1].sum())
+            assert book.depth("sell", 1e9) == pytest.approx(sum(s for (side, _), s in ref.items() if side == "sell"))
+    assert book.mid() == pytest.approx((book.best_bid()[0] + book.best_ask()[0]) / 2)
+    view = book.view("buy")
+    with pytest.raises(ValueError):
+        view[0] = 1.0
+    assert view[book._index(book.best_bid()[0])] == book.best_bid()[1]
+
+
+def test_gap_buffers_until_snapshot():
+    rng = np.random.default_rng(1)
+    bids, asks = _snapshot(rng)
+    book = OrderBook(TICK, levels=1024)
+    book.load_snapshot(100, bids, asks)
+    assert book.apply(101, 1000.5, "sell", 9.0)
+    assert book.apply(101, 1000.5, "sell", 1.0)  # duplicate, ignored
+    assert not book.apply(103, 999.5, "buy", 7.0)
+    assert not book.synced and book.gaps == 1
+    assert not book.apply(104, 999.5, "buy", 8.0)
+    book.load_snapshot(103, bids, asks)
+    assert book.synced and book.sequence == 104
+    assert book.best_bid() == (999.5, 8.0)
+    assert book.best_ask() == (1000.5, asks[0][1])
+
+
+def test_far_levels_are_clipped_and_touch_recentres():
+    book = OrderBook(1.0, levels=64)
+    book.load_snapshot(1, [[99.0, 1.0]], [[101.0, 1.0]])
+    assert book.apply(2, 10.0, "buy", 5.0) and book.clipped == 1
+    assert book.best_bid() == (99.0, 1.0)
+    assert book.apply(3, 150.0, "buy", 2.0) and book.recentres == 1
+    assert book.best_bid() == (150.0, 2.0) and book.best_ask() is None
+
+
+def test_order_books_resync_from_snapshots():
+    rng = np.random.default_rng(2)
+    bids, asks = _snapshot(rng)
+    fetched = []
+
+    async def snapshot(symbol):
+        fetched.append(symbol)
+        await asyncio.sleep(0)
+        return {"sequence": 50, "bids": bids, "asks": asks}
+
+    async def run():
+        books = OrderBooks(snapshot, tick=TICK)
+        for seq in (49, 50, 51, 52):
+            books.apply(BookChange("XBTUSDTM", 0, seq, 999.5, "buy", float(seq)))
+        await books.wait_synced()
+        return books["XBTUSDTM"]
+
+    book = asyncio.run(run())
+    assert fetched == ["XBTUSDTM"]
+    assert book.synced and book.sequence == 52 and book.best_bid() == (999.5, 52.0)
+
+
+def test_levels_feed_book_metrics_and_fabric():
+    rng = np.random.default_rng(3)
+    bids, asks = _snapshot(rng)
+    book = OrderBook(TICK, levels=1024)
+    book.load_snapshot(1, bids, asks)
+    metrics = BookMetrics()
+    assert metrics(book.levels(30), 1000.0) == pytest.approx(metrics({"bids": bids, "asks": asks}, 1000.0))
+
+    ff = FeatureFabric(book_tick=TICK)
+    topic = "/contractMarket/level2:XBTUSDTM"
+    first = ff.update({"topic": topic, "data": {"sequence": 1, "bids": bids, "asks": asks}})
+    moved = ff.update({"topic": topic, "data": {"sequence": 2, "change": "999.5,buy,500"}})
+    assert moved["depth_weighted_mid"] > first["depth_weighted_mid"]
+    assert ff.update({"topic": topic, "data": {"sequence": 9, "change": "999.5,buy,1"}}) == {}
@@ -0,0 +1,42 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+import json
+
+import pytest
+from trading.checkpoint import Checkpointer
+from trading.config import Config
+from trading.features import FeatureFabric
+from trading.platform import TradingPlatform
+
+
+async def _feed(n):
+    for i in range(n):
+        symbol = ("BTCUSDTM", "ETHUSDTM")[i % 2]
+        tick = {"symbol": symbol, "ts": 1_704_067_200_000 + i * 1000, "price": 100.0 + i, "size": 1.0}
+        yield json.dumps({"type": "message", "topic": f"/contractMarket/tickerV2:{symbol}", "data": tick})
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_run_leaves_a_checkpoint_behind(tmp_path, monkeypatch, fail):
+    monkeypatch.chdir(tmp_path)
+    ckpt = str(tmp_path / "ckpt")
+    platform = TradingPlatform(Config(mode="paper", risk={}, pairs=[], kucoin={}, checkpoint_dir=ckpt))
+    platform.stream.ws = _feed(40)
+    seen = []
+
+    async def handle_slice(data):
+        seen.append(data)
+        if fail and len(seen) == 10:
+            raise RuntimeError("boom")
+
+    platform.handle_slice = handle_slice
+    if fail:
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(platform.run())
+    else:
+        asyncio.run(platform.run())
+    assert len(seen) == (10 if fail else 40)
+    assert platform.stream.ws is None
+    reader = Checkpointer(ckpt)
+    assert reader.keys() == sorted(platform.stream.features)
+    assert all(isinstance(reader.load(symbol), FeatureFabric) for symbol in reader.keys())
@@ -0,0 +1,136 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import asyncio
+import numpy as np
+import pytest
+from trading.features import FeatureFabric
+from trading.sharding import SharedRing, ShardedFeatures
+
+
+def _ticks(n, symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = {sym: 100.0 * (i + 1) for i, sym in enumerate(symbols)}
+    ts = 1_700_000_000_000
+    for _ in range(n):
+        ts += int(rng.integers(50, 1500))
+        sym = symbols[int(rng.integers(len(symbols)))]
+        prices[sym] *= 1 + rng.normal(0, 1e-3)
+        yield {"ts": ts, "symbol": sym, "price": prices[sym], "size": float(rng.uniform(0.1, 2)),
+               "bestBidSize": float(rng.uniform(1, 5)), "bestAskSize": float(rng.uniform(1, 5))}
+
+
+def _same(got, expected):
+    assert list(got) == list(expected)
+    for key, value in expected.items():
+        if isinstance(value, str):
+            assert got[key] == value
+        else:
+            assert got[key] == value or (got[key] != got[key] and value != value), key
+
+
+def test_ring_wraps_and_reports_full():
+    ring = SharedRing(slots=4, width=2)
+    try:
+        for i in range(4):
+            assert ring.put([i, -i])
+        assert not ring.put([9, 9])
+        assert ring.take()[:, 0].tolist() == [0, 1, 2, 3]
+        assert ring.put([4, -4]) and ring.put([5, -5])
+        assert ring.take().tolist() == [[4, -4], [5, -5]]
+        assert len(ring) == 0 and ring.written == 6
+    finally:
+        ring.close(unlink=True)
+
+
+def test_sharded_matches_in_process():
+    symbols = ["BTC", "ETH", "SOL"]
+    ticks = list(_ticks(300, symbols))
+    sharded = ShardedFeatures(symbols, workers=2)
+    try:
+        for tick in ticks:
+            assert sharded.submit(tick)
+        got = sharded.drain(timeout=30)
+        assert sharded.stats()["pending"] == 0
+    finally:
+        sharded.close()
+    fabrics = {sym: FeatureFabric() for sym in symbols}
+    for sym in symbols:
+        expected = [fabrics[sym].update(t) for t in ticks if t["symbol"] == sym]
+        mine = [f for f in got if f["symbol"] == sym]
+        assert len(mine) == len(expected)
+        for a, b in zip(mine, expected):
+            _same(a, b)
+    assert sharded.shard_of("BTC") != sharded.shard_of("ETH")
+
+
+def test_stream_yields_every_tick():
+    async def source():
+        for tick in _ticks(50, ["BTC", "ETH"], seed=1):
+            yield tick
+            await asyncio.sleep(0)
+
+    async def collect(sharded):
+        return [f async for f in sharded.stream(source())]
+
+    sharded = ShardedFeatures(workers=2)
+    try:
+        out = asyncio.run(collect(sharded))
+    finally:
+        sharded.close()
+    assert len(out) == 50 and {f["symbol"] for f in out} == {"BTC", "ETH"}
+
+
+
+def test_dead_worker_is_reported():
+    ticks = list(_ticks(20, ["BTC", "ETH"], seed=2))
+
+    async def source():
+        for tick in ticks:
+            yield tick
+            await asyncio.sleep(0.01)
+
+    async def collect(sharded):
+        return [f async for f in sharded.stream(source())]
+
+    sharded = ShardedFeatures(["BTC", "ETH"], workers=2)
+    try:
+        for tick in ticks[:5]:
+            sharded.submit(tick)
+        sharded.drain(timeout=30)
+        victim = sharded.shards[sharded.shard_of("BTC")].process
+        victim.kill()
+        victim.join(5)
+        sharded.submit(dict(ticks[5], symbol="BTC"))
+        with pytest.raises(RuntimeError, match="died"):
+            sharded.drain()
+        with pytest.raises(RuntimeError, match="died"):
+            asyncio.run(collect(sharded))
+    finally:
+        sharded.close()
+
+def test_workers_resume_from_checkpoints(tmp_path):
+    symbols = ["BTC", "ETH"]
+    ticks = list(_ticks(200, symbols, seed=2))
+    first = ShardedFeatures(symbols, workers=2, checkpoint_dir=str(tmp_path))
+    try:
+        for tick in ticks[:120]:
+            first.submit(tick)
+        first.drain(timeout=30)
+    finally:
+        first.close()
+    assert sorted(os.listdir(tmp_path)) == ["BTC.ckpt", "ETH.ckpt"]
+
+    second = ShardedFeatures(symbols, workers=2, checkpoint_dir=str(tmp_path))
+    try:
+        for tick in ticks[120:]:
+            second.submit(tick)
+        got = second.drain(timeout=30)
+    finally:
+        second.close()
+    fabric = FeatureFabric()
+    resumed_at = sum(t["symbol"] == "ETH" for t in ticks[:120])
+    expected = [fabric.update(t) for t in ticks if t["symbol"] == "ETH"][resumed_at:]
+    mine = [f for f in got if f["symbol"] == "ETH"]
+    assert len(mine) == len(expected)
+    for a, b in zip(mine, expected):
+        _same(a, b)
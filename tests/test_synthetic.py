@@ -0,0 +1,67 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import json
+import subprocess
+
+import numpy as np
+import pytest
+from trading.derived_metrics import DerivedMetrics
+from trading.synthetic import SyntheticMarket
+
+
+def test_stream_is_deterministic_and_well_formed():
+    market = SyntheticMarket(["BTCUSDTM", "ETHUSDTM", "SOLUSDTM"], seed=7, levels=5, chunk=64)
+    events = list(market.events(500))
+    assert events == list(SyntheticMarket(["BTCUSDTM", "ETHUSDTM", "SOLUSDTM"], seed=7, levels=5, chunk=64).events(500))
+    assert [e.tick for e in events] == list(market.ticks(500))
+    assert events != list(SyntheticMarket(3, seed=8, levels=5).events(500))
+
+    stamps = [e.tick["ts"] for e in events]
+    assert stamps == sorted(stamps)
+    assert {e.tick["symbol"] for e in events} == {"BTCUSDTM", "ETHUSDTM", "SOLUSDTM"}
+    for e in events:
+        bids, asks = e.book["bids"], e.book["asks"]
+        assert len(bids) == len(asks) == 5
+        assert bids[0][0] < e.tick["price"] < asks[0][0]
+        assert [p for p, _ in bids] == sorted((p for p, _ in bids), reverse=True)
+        assert e.oi["longQty"] + e.oi["shortQty"] == pytest.approx(e.oi["openInterest"])
+    assert any(e.liquidations for e in events)
+
+    other = SyntheticMarket(["BTCUSDTM", "ETHUSDTM", "SOLUSDTM"], seed=7, levels=5, chunk=100)
+    prices = [t["price"] for t in other.ticks(500)]
+    np.testing.assert_allclose(prices, [e.tick["price"] for e in events], rtol=1e-12)
+
+
+def test_messages_alternate_books_and_funding():
+    topics = [m["topic"].split(":")[0] for m in SyntheticMarket(2).messages(20, funding_every=5)]
+    assert topics.count("/contractMarket/fundingRate") == 4
+    assert topics.count("/contractMarket/level2") == 16
+
+
+def test_events_drive_derived_metrics(tmp_path):
+    dm = DerivedMetrics(store_path=str(tmp_path / "m"))
+    for event in SyntheticMarket(2, tick_ms=5_000).events(400):
+        row = dm.update(*event)
+    dm.close()
+    assert len(dm.tables["SYM00USDTM"]) > 20
+    assert np.isfinite(row["VWAP"]) and np.isfinite(row["RSI"])
+
+
+def test_benchmark_cli_saves_and_checks(tmp_path):
+    baseline = str(tmp_path / "baseline.json")
+    cmd = [sys.executable, "-m", "benchmarks", "features", "unified_index", "--ticks", "300", "--symbols", "2",
+           "--baseline", baseline]
+    saved = subprocess.run(cmd + ["--save"], capture_output=True, text=True)
+    assert saved.returncode == 0, saved.stderr
+    assert "features" in saved.stdout
+    with open(baseline) as fh:
+        data = json.load(fh)
+    assert set(data["results"]) == {"features", "unified_index"} and data["ticks"] == 300
+    assert data["results"]["features"]["peak_mb"] > 0
+
+    data["results"]["features"]["ticks_per_s"] *= 100
+    with open(baseline, "w") as fh:
+        json.dump(data, fh)
+    checked = subprocess.run(cmd[:5] + ["--no-memory", "--baseline", baseline, "--check"], capture_output=True, text=True)
+    assert checked.returncode == 1
+    assert "REGRESSION features" in checked.stderr
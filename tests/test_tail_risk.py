@@ -0,0 +1,67 @@
+import sys, os
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pandas as pd
+from trading.tail_risk import OrderStatistics, RollingDrawdown, TailRisk
+
+
+def _mae(x):
+    cum = (1 + x).cumprod()
+    return float(((cum - cum.cummax()) / cum.cummax()).min())
+
+
+def _stream(estimator, values):
+    out = []
+    for v in values:
+        out.append(estimator.peek(v))
+        estimator.push(v)
+    return out
+
+
+def test_exact_matches_pandas():
+    returns = pd.Series(np.random.default_rng(1).normal(0, 0.01, 600))
+    window = returns.rolling(100)
+    var = window.quantile(0.05)
+    es = window.apply(lambda x: x[x <= x.quantile(0.05)].mean(), raw=False)
+    mae = window.apply(_mae, raw=False)
+    got = np.array(_stream(TailRisk(100), returns))
+    np.testing.assert_allclose(got[:, 0], var, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(got[:, 1], es, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(got[:, 2], mae, rtol=1e-9, atol=1e-12)
+
+
+
+def test_order_statistics_tail_sum_with_ties():
+    # rounded values give many ties; several peeks per push move the cursor about
+    rng = np.random.default_rng(4)
+    values = np.round(rng.normal(0, 0.01, 2000), 3)
+    stats = OrderStatistics(50)
+    for t, v in enumerate(values):
+        for probe in (v, -0.05, 0.05):
+            window = np.append(values[max(0, t - 49):t], probe)
+            got = stats.peek(probe)
+            if len(window) < 50:
+                assert np.isnan(got.var)
+                continue
+            var = np.quantile(window, 0.05)
+            assert np.isclose(got.var, var, rtol=1e-12)
+            assert np.isclose(got.es, window[window <= var].mean(), rtol=1e-9, atol=1e-15)
+        stats.push(v)
+
+
+def test_sketch_is_within_accuracy():
+    returns = np.random.default_rng(2).normal(0, 0.01, 3000)
+    exact = np.array(_stream(TailRisk(1440), returns))
+    sketch = np.array(_stream(TailRisk(1440, mode="sketch", accuracy=0.01), returns))
+    valid = ~np.isnan(exact[:, 0])
+    assert valid.sum() > 1000
+    # one rank of slack on top of the bucket error
+    np.testing.assert_allclose(sketch[valid, 0], exact[valid, 0], rtol=0.03)
+    np.testing.assert_allclose(sketch[valid, 1], exact[valid, 1], rtol=0.03)
+
+
+def test_drawdown_window_slides():
+    values = _stream(RollingDrawdown(3), [0.5, -0.2, 0.0, 0.1])
+    assert np.isnan(values[0]) and np.isnan(values[1])
+    assert abs(values[2] - (-0.2)) < 1e-12
+    assert values[3] == 0.0
@@ -0,0 +1,82 @@
+import sys, os, asyncio
+sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
+import pandas as pd
+import pytest
+from trading.ingestion import HistoricalDataStream
+from trading.synthetic import SyntheticMarket
+from trading.tickfile import TickFile, TickFileWriter, convert_csv, read_chunks
+
+START = pd.Timestamp("2024-01-01", tz="UTC").value // 10**6
+
+
+@pytest.fixture
+def ticks(tmp_path):
+    frame = pd.DataFrame(SyntheticMarket(["BTCUSDTM", "ETHUSDTM", "SOLUSDTM"], seed=1).ticks(1000))
+    path = tmp_path / "ticks.csv"
+    frame.to_csv(path, index=False)
+    return frame, str(path)
+
+
+def test_csv_and_columnar_chunks_agree(ticks, tmp_path):
+    frame, csv = ticks
+    root = str(tmp_path / "ticks")
+    assert convert_csv(csv, root, chunksize=300) == 1000
+    lo, hi = int(frame.ts.iloc[100]), int(frame.ts.iloc[700])
+    expected = frame[(frame.ts >= lo) & (frame.ts <= hi) & frame.symbol.isin(["ETHUSDTM", "SOLUSDTM"])]
+    for path in (csv, root):
+        chunks = list(read_chunks(path, 128, start=lo, end=hi, symbols=["ETHUSDTM", "SOLUSDTM"]))
+        assert all(len(c) <= 128 for c in chunks)
+        got = pd.concat(chunks, ignore_index=True)
+        pd.testing.assert_frame_equal(got, expected.reset_index(drop=True), check_dtype=False)
+
+    with TickFile(root) as tf:
+        assert len(tf) == 1000 and tf.span(lo, hi) == slice(100, 701)
+        assert list(tf.chunks(symbols=["XBTUSDTM"])) == []
+        stamp = pd.Timestamp(lo, unit="ms", tz="UTC")
+        assert len(next(tf.chunks(start=stamp))) == 900
+
+
+def test_writer_appends_and_reader_trims_torn_rows(tmp_path):
+    root = str(tmp_path / "ticks")
+    writer = TickFileWriter(root)
+    writer.append(pd.DataFrame({"ts": [1, 2], "price": [1.0, 2.0], "side": ["buy", "sell"]}))
+    writer = TickFileWriter(root)
+    writer.append(pd.DataFrame({"ts": [3], "side": ["hold"]}))
+    with pytest.raises(ValueError):
+        writer.append(pd.DataFrame({"ts": [0], "price": [1.0]}))
+    with pytest.raises(ValueError):
+        writer.append(pd.DataFrame({"ts": [9], "qty": [1.0]}))
+    with open(os.path.join(root, "price.bin"), "ab") as fh:
+        fh.write(np.float64(9.0).tobytes())
+    got = pd.concat(read_chunks(root))
+    assert got.side.tolist() == ["buy", "sell", "hold"]
+    np.testing.assert_array_equal(got.price, [1.0, 2.0, np.nan])
+
+
+def test_writer_truncates_torn_append_before_appending(tmp_path):
+    root = str(tmp_path / "ticks")
+    TickFileWriter(root).append(pd.DataFrame({"ts": [1, 2, 3], "price": [1.0, 2.0, 3.0]}))
+    # a crash wrote the 4th row's ts but not its price
+    with open(os.path.join(root, "ts.bin"), "ab") as fh:
+        fh.write(np.int64(4).tobytes())
+    writer = TickFileWriter(root)
+    assert writer.last_ts == 3
+    writer.append(pd.DataFrame({"ts": [5, 6], "price": [5.0, 6.0]}))
+    got = pd.concat(read_chunks(root))
+    assert got.ts.tolist() == [1, 2, 3, 5, 6]
+    assert got.price.tolist() == [1.0, 2.0, 3.0, 5.0, 6.0]
+
+
+def test_historical_stream_replays_columnar_range(ticks, tmp_path):
+    frame, csv = ticks
+    root = str(tmp_path / "ticks")
+    convert_csv(csv, root)
+    lo, hi = int(frame.ts.iloc[10]), int(frame.ts.iloc[12])
+    stream = HistoricalDataStream(root, chunksize=2, start=lo, end=hi)
+
+    async def _collect():
+        return [row async for row in stream.stream()]
+
+    rows = asyncio.run(_collect())
+    assert [r["close"] for r in rows] == frame.price.iloc[10:13].tolist()
@@ -1,5 +1,7 @@
 import sys, os; sys.path.insert(0, os.path.abspath("src"))
+import numpy as np
 import pandas as pd
+import pytest
 from kucoin_stream import UnifiedIndex
 
 
@@ -11,5 +13,45 @@ def test_gap_handling():
     assert idx.index[0] == first
     assert idx.index[1] == second
     big_gap = idx.add(70000)
-    assert idx.index[-1] is big_gap
+    assert idx.index[-1] == big_gap
     assert idx.index[-2] is pd.NaT
+
+
+def _reference(stamps):
+    """The deque-of-Timestamps index UnifiedIndex replaced."""
+    index, last = [], None
+    for ts in stamps:
+        timestamp = pd.to_datetime(ts, unit="ms")
+        if last is not None:
+            if (timestamp - last).total_seconds() > 60:
+                index.append(pd.NaT)
+            else:
+                index.extend(pd.date_range(last + pd.Timedelta(seconds=1), timestamp, freq="s")[:-1])
+        index.append(timestamp)
+        last = timestamp
+    return pd.DatetimeIndex(index)
+
+
+def test_matches_reference_and_stays_bounded():
+    rng = np.random.default_rng(2)
+    steps = rng.choice([0, 250, 999, 1000, 1500, 2500, 7000, 60_000, 61_000, -3000], size=400)
+    stamps = [int(t) for t in 1_700_000_000_000 + np.cumsum(steps)]
+    expected = _reference(stamps)
+    full = UnifiedIndex(capacity=len(expected))
+    ring = UnifiedIndex(capacity=200)
+    for ts in stamps:
+        assert full.add(ts) == ring.add(ts) == pd.to_datetime(ts, unit="ms")
+    assert full.index.equals(expected)
+    assert ring.index.equals(expected[-200:]) and len(ring) == 200
+    assert ring.last_ts == expected[-1]
+
+
+def test_locate_slots():
+    idx = UnifiedIndex(capacity=64)
+    for ts in (0, 3000, 3500, 100_000, 90_000):
+        idx.push(ts)
+    assert [idx.locate(ts) for ts in (0, 1000, 2000, 3000, 3500)] == [0, 1, 2, 3, 4]
+    assert idx.locate(100_000) == 6 and pd.isna(idx.index[5])
+    assert idx.locate(1500) == -1
+    with pytest.raises(ValueError):
+        UnifiedIndex(capacity=10)